@@ -0,0 +1,245 @@
+"""
+ai.py
+
+Computer opponent for when nobody else is queueing, including:
+ - heat_map(): probability-density targeting, counting for every cell how many placements of the
+   still-afloat ships could cover it given the known hits and misses
+ - BotPlayer: a client_info-compatible player that the lobby can drop into an empty player slot.
+   It reads the same messages a human client would and answers through its input_queue, including
+   salvo prompts (the hottest cells, one per shot it is allowed)
+
+The heat map walks the shared placement tables (variants.placement_table()) rather than the grid:
+with NumPy, as one matrix product per ship length against a cached placements x cells matrix, and
+otherwise as bit-mask tests of each placement against the blocked and hit cells.
+"""
+
+import random
+import threading
+from collections import Counter, deque
+from queue import Queue
+
+import battleship
+import variants
+from battleship import Board, HIT as HIT_MARK, MISS as MISS_MARK
+from records import ClientInfo
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, the bot just gets a little slower without it
+    np = None
+
+BOT_NAME = "Bot"
+HIT_WEIGHT = 20  # placements passing through unresolved hits are this much more likely
+
+# Cell states of the bot's view of the opponent's board
+UNKNOWN, MISS, HIT, SUNK = 0, 1, 2, 3
+
+
+# (size, length) -> placements x cells 0/1 matrix, built from variants.placement_table().
+# Two bots building the same one at once just build it twice.
+_matrices = {}
+
+
+def _placement_matrix(size, length):
+    matrix = _matrices.get((size, length))
+    if matrix is None:
+        placements = variants.placement_table(size, length).placements
+        matrix = np.zeros((len(placements), size * size), dtype=np.float64)
+        for i, placement in enumerate(placements):
+            for r, c in placement.cells:
+                matrix[i, r * size + c] = 1.0
+        _matrices[(size, length)] = matrix
+    return matrix
+
+
+def _heat_map_numpy(grid, lengths):
+    """
+    grid: 2-D int array of cell states. Returns a float array of placement counts per cell.
+    """
+    size = grid.shape[0]
+    flat = grid.reshape(-1)
+    blocked = ((flat == MISS) | (flat == SUNK)).astype(np.float64)
+    hits = (flat == HIT).astype(np.float64)
+    heat = np.zeros(size * size, dtype=np.float64)
+
+    # One matrix product per ship length: blocked and hit cells under every placement, then each
+    # open placement's weight spread back over its cells. Ships of the same length count together.
+    for length, count in Counter(lengths).items():
+        if length > size:
+            continue
+        matrix = _placement_matrix(size, length)
+        weight = np.where(matrix @ blocked == 0, 1.0 + HIT_WEIGHT * (matrix @ hits), 0.0)
+        heat += count * (weight @ matrix)
+
+    return heat.reshape(size, size)
+
+
+def _heat_map_python(grid, lengths):
+    size = len(grid)
+    blocked = hits = 0
+    for r, row in enumerate(grid):
+        for c, state in enumerate(row):
+            if state == MISS or state == SUNK:
+                blocked |= 1 << (r * size + c)
+            elif state == HIT:
+                hits |= 1 << (r * size + c)
+
+    heat = [[0.0] * size for _ in range(size)]
+    for length, count in Counter(lengths).items():
+        if length > size:
+            continue
+        for placement in variants.placement_table(size, length).placements:
+            if placement.mask & blocked:
+                continue
+            weight = count * (1.0 + HIT_WEIGHT * bin(placement.mask & hits).count('1'))
+            for r, c in placement.cells:
+                heat[r][c] += weight
+    return heat
+
+
+def heat_map(grid, lengths):
+    """
+    For every cell, the (hit-weighted) number of ways the remaining ships could lie across it.
+    grid is a list of rows of cell states (UNKNOWN, MISS, HIT, SUNK), lengths the unsunk ship sizes.
+    """
+    if np is not None:
+        return _heat_map_numpy(np.asarray(grid, dtype=np.int8), lengths).tolist()
+    return _heat_map_python(grid, lengths)
+
+
+class BotWriter:
+    """
+    Stands in for a socket wfile: the game writes to it, the bot reads it line by line.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.buffer = ""
+
+    def write(self, text):
+        self.buffer += text
+        while '\n' in self.buffer:
+            line, self.buffer = self.buffer.split('\n', 1)
+            self.bot.on_line(line.strip())
+
+    def flush(self):
+        pass
+
+
+class BotPlayer:
+    """
+    Plays through the same interface as a human: it answers prompts by putting the parsed answer
+    (as handle_client would) on its input_queue, and learns shot results from the server's messages.
+    Its view of the opponent is a shadow Board, whose display_grid holds the known hits and misses.
+    """
+
+    def __init__(self, client_id, size=None, ships=None, rng=None):
+        # Read at creation time so the bot plays whatever board and variant the server is configured for
+        size = size or battleship.BOARD_SIZE
+        ships = ships or variants.fleet(variants.VARIANT, battleship.SHIPS)
+        self.size = size
+        self.rng = rng or random.Random()
+        self.view = Board(size)
+        self.sunk = set()                              # cells of ships known to be sunk
+        self.ship_lengths = {name: length for name, length in ships}
+        self.remaining = [length for _, length in ships]
+        self.pending = deque()                         # our shots whose results have not arrived yet, in order
+
+        self.client_info = ClientInfo(client_id, BOT_NAME, Queue(), threading.Event(),
+                                      wfile=BotWriter(self), bot=self)
+
+    def _answer(self, text):
+        self.client_info.input_queue.put(text)
+
+    def on_line(self, line):
+        # Prompts
+        if line.startswith("Place ships manually (M) or randomly (R)?"):
+            self._answer('R')
+        elif line.startswith("Enter coordinate to fire at"):
+            row, col = self.choose_shot()
+            self.pending = deque([(row, col)])
+            self._answer((row, col))
+        elif line.startswith("Enter up to "):
+            # "Enter up to N coordinates to fire at ...": a salvo, answered as a tuple of cells
+            volley = tuple(self.choose_shots(int(line.split()[3])))
+            self.pending = deque(volley)
+            self._answer(volley)
+
+        # Results of our own shots, in the order fired (the opponent's results are prefixed with "Player N")
+        elif not self.pending:
+            return
+        elif line.startswith("HIT! You sank the "):
+            shot = self._record(HIT_MARK)
+            self._record_sunk(line[len("HIT! You sank the "):].rstrip('!'), shot)
+        elif line == "HIT!":
+            self._record(HIT_MARK)
+        elif line == "MISS!":
+            self._record(MISS_MARK)
+        elif line == "You've already fired at that location.":
+            self.pending.popleft()
+
+    def _record(self, mark):
+        row, col = shot = self.pending.popleft()
+        self.view.display_grid[row][col] = mark
+        return shot
+
+    def _record_sunk(self, name, shot):
+        length = self.ship_lengths.get(name)
+        if length in self.remaining:
+            self.remaining.remove(length)
+        if length is None:
+            return
+
+        # Find a straight run of 'length' unresolved hits through the sinking shot and mark it sunk
+        row, col = shot
+        for dr, dc in ((0, 1), (1, 0)):
+            for start in range(length):
+                cells = [(row + (i - start) * dr, col + (i - start) * dc) for i in range(length)]
+                if all(0 <= r < self.size and 0 <= c < self.size
+                       and self.view.display_grid[r][c] == HIT_MARK and (r, c) not in self.sunk
+                       for r, c in cells):
+                    self.sunk.update(cells)
+                    return
+
+    def state_grid(self):
+        grid = []
+        for r in range(self.size):
+            row = []
+            for c in range(self.size):
+                mark = self.view.display_grid[r][c]
+                if mark == MISS_MARK:
+                    row.append(MISS)
+                elif mark == HIT_MARK:
+                    row.append(SUNK if (r, c) in self.sunk else HIT)
+                else:
+                    row.append(UNKNOWN)
+            grid.append(row)
+        return grid
+
+    def choose_shot(self):
+        grid = self.state_grid()
+        heat = heat_map(grid, self.remaining)
+
+        best, choices = -1.0, []
+        for r in range(self.size):
+            for c in range(self.size):
+                if grid[r][c] != UNKNOWN:
+                    continue
+                if heat[r][c] > best:
+                    best, choices = heat[r][c], [(r, c)]
+                elif heat[r][c] == best:
+                    choices.append((r, c))
+        return self.rng.choice(choices)
+
+    def choose_shots(self, count):
+        """
+        The 'count' hottest unknown cells, ties broken at random, for a salvo.
+        """
+        if count == 1:
+            return [self.choose_shot()]
+        grid = self.state_grid()
+        heat = heat_map(grid, self.remaining)
+        cells = [(heat[r][c], self.rng.random(), (r, c))
+                 for r in range(self.size) for c in range(self.size) if grid[r][c] == UNKNOWN]
+        cells.sort(reverse=True)
+        return [cell for _, _, cell in cells[:count]]
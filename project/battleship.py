@@ -4,13 +4,29 @@ battleship.py
 Contains core data structures and logic for Battleship, including:
  - Board class for storing ship positions, hits, misses
  - Utility function parse_coordinate for translating e.g. 'B5' -> (row, col)
+ - parse_move(): the reader-side check of a player's answer against what their prompt expects,
+   so the online game loop only ever receives parsed values ((row, col), 'M'/'R', 0/1 or QUIT)
+ - run_two_player_game_online(): the networked match, played under a variant from variants.py
+   (e.g. salvo turns fire several shots as one batch)
  - A test harness run_single_player_game() to demonstrate the logic in a local, single-player mode
 
 """
 
 import random
+import threading
+import time
+
+import profiling
+import variants
+from clocks import Expired, PlayerClock
 
 BOARD_SIZE = 10
+TURN_TIMEOUT = 30        # seconds a player has for each move before drawing on their time bank
+TIME_BANK = 60           # extra seconds per player per match, used up by moves that run over
+PLACEMENT_TIMEOUT = 120  # seconds a player has to place their fleet before it is placed randomly
+RANDOM_PICKS = 8         # blind picks per ship in place_ships_randomly() before it lists the open placements
+SEED = None              # fixed seed for the sequence of match seeds (see new_seed), None for fresh ones
+BOT_SALT = 0x5EED_B07    # mixed into the match seed for a bot's own generator
 SHIPS = [
    ("Carrier", 5),
    ("Battleship", 4),
@@ -19,45 +35,133 @@ SHIPS = [
     ("Destroyer", 2)
 ]
 
-# Sends a message to all spectators (p=0)
-def send_to_all_p0_clients(clients, message):
-    for client in clients:
-        if client.get('p') == 0:
-            send(client['wfile'], message)
-
-# Sends the board to all spectators (p=0)
-def send_board_to_all_p0_clients(clients, board):
-    for client in clients:
-        if client.get('p') == 0:
-            send_board(client['wfile'], board)
+# What a player's prompt expects. recv() stores it on the player's ClientInfo before accepting
+# input, and the server's reader thread parses each line against it (see parse_move)
+EXPECT_CHOICE = 'choice'            # M (manual placement) or R (random)
+EXPECT_CELL = 'cell'                # a coordinate such as B5
+EXPECT_ORIENTATION = 'orientation'  # H or V
+EXPECT_SHOT = 'shot'                # a coordinate, or quit
+EXPECT_SALVO = 'salvo'              # (EXPECT_SALVO, n): up to n distinct coordinates, or quit
+QUIT = 'quit'
+DISCONNECTED = '__DISCONNECTED__'   # queued by the server when a player's connection goes away
+
+# Draws match seeds, created from SEED on first use
+_seed_source = None
+_seed_lock = threading.Lock()
+
+# A seed for one match's random generator (fleet placement, bot play). With SEED set, the seeds
+# come from a generator seeded with it, so the same sequence of matches is dealt on every run
+def new_seed():
+    global _seed_source
+    with _seed_lock:
+        if _seed_source is None:
+            _seed_source = random.Random(SEED)
+        return _seed_source.getrandbits(64)
+
+# Cell values stored in the bytearray grids
+WATER = ord('.')
+SHIP = ord('S')
+HIT = ord('X')
+MISS = ord('o')
+
+# Sends a message to all spectators (p=0) through the match's Broadcaster
+def send_to_all_p0_clients(spectators, message):
+    with profiling.phase("spectators.publish"):
+        spectators.publish(message + '\n')
+
+# Sends the board to all spectators (p=0), rendered once and shared by every broadcast worker
+def send_board_to_all_p0_clients(spectators, board):
+    with profiling.phase("render_board"):
+        frame = render_board(board)
+    with profiling.phase("spectators.publish"):
+        spectators.publish(frame)
+
+# Renders both boards, whose turn it is and the score into one block for late-joining spectators
+def render_snapshot(board1, board2, status):
+    hits1 = sum(row.count(HIT) for row in board2.display_grid)
+    hits2 = sum(row.count(HIT) for row in board1.display_grid)
+    sunk1 = sum(1 for ship in board2.placed_ships if not ship.positions)
+    sunk2 = sum(1 for ship in board1.placed_ships if not ship.positions)
+    return (f"[SNAPSHOT] {status}\n"
+            f"[SNAPSHOT] Score: Player 1 {hits1} hits, {sunk1} sunk | Player 2 {hits2} hits, {sunk2} sunk\n"
+            f"[SNAPSHOT] Player 1's board:\n{render_board(board1)}"
+            f"[SNAPSHOT] Player 2's board:\n{render_board(board2)}")
+
+# Refreshes the cached snapshot that new spectators receive on join
+def update_spectator_snapshot(spectators, board1, board2, status):
+    with profiling.phase("snapshot"):
+        spectators.set_snapshot(render_snapshot(board1, board2, status))
 
 # Sends a message to client
 def send(wfile, msg):
-    wfile.write(msg + '\n')
-    wfile.flush()
-
-import queue  # for catching queue.Empty exception
+    with profiling.phase("players.write"):
+        wfile.write(msg + '\n')
+        wfile.flush()
 
-# Gets input from player client timeout 30seconds
-def recv(player_info):
-    player_info['input_flag'].set()
-    try:
-        result = player_info['input_queue'].get(timeout=30)
-    except queue.Empty:
-        result = ""
-    player_info['input_flag'].clear()
+# Gets input from player client, already parsed as 'expect' says (see parse_move). With a clock the
+# prompt expires after 'allowance' seconds (TURN_TIMEOUT by default, plus the time bank if use_bank)
+# and "" is returned with clock.timed_out set. The expiry arrives on the input queue from the timer wheel.
+def recv(player_info, clock=None, allowance=None, use_bank=True, expect=EXPECT_SHOT):
+    player_info.expect = expect
+    player_info.input_flag.set()
+    if clock:
+        clock.start(TURN_TIMEOUT if allowance is None else allowance, use_bank)
+    with profiling.phase("recv.wait"):
+        while True:
+            result = player_info.input_queue.get()
+            if not isinstance(result, Expired):
+                if result == DISCONNECTED or answers(expect, result):
+                    break
+                # Otherwise an answer to an earlier prompt that expired just as it was sent
+                continue
+            if clock and result is clock.token:
+                clock.timed_out = True
+                result = ""
+                break
+            # Otherwise a stale expiry from a prompt that was answered just in time
+    if clock:
+        clock.stop()
+    player_info.input_flag.clear()
     return result
 
-# Sends board message to client
-def send_board(wfile, board):
-    wfile.write("GRID\n")
-    wfile.write("  " + " ".join(str(i + 1).rjust(2) for i in range(board.size)) + '\n')
+# Seconds left until a deadline (time.monotonic()), or None when there is no deadline
+def remaining(deadline):
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+# Places a fleet randomly once a player has run out of placement time
+def place_randomly_after_timeout(board, wfile, ships):
+    board.reset()
+    board.place_ships_randomly(ships)
+    send(wfile, "Placement time is up, your ships have been placed randomly.")
+
+# Renders the GRID block for a board into a single string
+def render_board(board):
+    lines = ["GRID", "  " + " ".join(str(i + 1).rjust(2) for i in range(board.size))]
     for r in range(board.size):
         row_label = chr(ord('A') + r)
-        row_str = " ".join(board.display_grid[r][c] for c in range(board.size))
-        wfile.write(f"{row_label:2} {row_str}\n")
-    wfile.write('\n')
-    wfile.flush()
+        row_str = " ".join(board.display_grid[r].decode())
+        lines.append(f"{row_label:2} {row_str}")
+    return "\n".join(lines) + "\n\n"
+
+# Sends board message to client
+def send_board(wfile, board):
+    with profiling.phase("render_board"):
+        frame = render_board(board)
+    with profiling.phase("players.write"):
+        wfile.write(frame)
+        wfile.flush()
+
+class Ship:
+    """
+    A placed ship: its name and the set of (r, c) positions that have not been hit yet.
+    Slotted, as every active game holds two fleets of these.
+    """
+    __slots__ = ('name', 'positions')
+
+    def __init__(self, name, positions):
+        self.name = name
+        self.positions = positions
+
 
 class Board:
     """
@@ -65,55 +169,76 @@ class Board:
     We store:
       - self.hidden_grid: tracks real positions of ships ('S'), hits ('X'), misses ('o')
       - self.display_grid: the version we show to the player ('.' for unknown, 'X' for hits, 'o' for misses)
-      - self.placed_ships: a list of dicts, each dict with:
-          {
-             'name': <ship_name>,
-             'positions': set of (r, c),
-          }
+      - self.placed_ships: a list of Ship records (name and remaining positions),
         used to determine when a specific ship has been fully sunk.
 
+    Each grid row is a bytearray holding one byte per cell (WATER, SHIP, HIT or MISS),
+    so grid[r][c] is an int and a row renders with row.decode().
+
     In a full 2-player networked game:
       - Each player has their own Board instance.
       - When a player fires at their opponent, the server calls
         opponent_board.fire_at(...) and sends back the result.
     """
 
-    def __init__(self, size=BOARD_SIZE):
-        self.size = size
+    def __init__(self, size=None, rules=None, rng=None):
+        self.size = size or (rules.size if rules else BOARD_SIZE)
+        # The match's compiled variant (see variants.py); classic rules for boards outside a match
+        self.rules = rules or variants.classic(self.size)
+        # The match's seeded random.Random for random placement; the global generator otherwise
+        self.rng = rng or random
+        self.reset()
+
+    def reset(self):
+        """
+        Empty the board, e.g. to start over after a half-finished manual placement.
+        """
+        size = self.size
         # '.' for empty water
-        self.hidden_grid = [['.' for _ in range(size)] for _ in range(size)]
+        self.hidden_grid = [bytearray(b'.' * size) for _ in range(size)]
         # display_grid is what the player or an observer sees (no 'S')
-        self.display_grid = [['.' for _ in range(size)] for _ in range(size)]
-        self.placed_ships = []  # e.g. [{'name': 'Destroyer', 'positions': {(r, c), ...}}, ...]
+        self.display_grid = [bytearray(b'.' * size) for _ in range(size)]
+        self.placed_ships = []  # e.g. [Ship('Destroyer', {(r, c), ...}), ...]
+        self.blocked = 0        # bit r * size + c set for every cell no further ship may use
 
-    def place_ships_randomly(self, ships=SHIPS):
+    def place_ships_randomly(self, ships=None):
         """
         Randomly place each ship in 'ships' on the hidden_grid, storing positions for each ship.
         In a networked version, you might parse explicit placements from a player's commands
         (e.g. "PLACE A1 H BATTLESHIP") or prompt the user for board coordinates and placement orientations; 
         the self.place_ships_manually() can be used as a guide.
         """
-        for ship_name, ship_size in ships:
-            placed = False
-            while not placed:
-                orientation = random.randint(0, 1)  # 0 => horizontal, 1 => vertical
-                row = random.randint(0, self.size - 1)
-                col = random.randint(0, self.size - 1)
+        ships = ships or SHIPS
+        while not self._place_fleet_randomly(ships):
+            # The earlier ships left no room for one (possible with no-touch and large fleets): start over
+            self.reset()
 
-                if self.can_place_ship(row, col, ship_size, orientation):
-                    occupied_positions = self.do_place_ship(row, col, ship_size, orientation)
-                    self.placed_ships.append({
-                        'name': ship_name,
-                        'positions': occupied_positions
-                    })
-                    placed = True
+    def _place_fleet_randomly(self, ships):
+        for ship_name, ship_size in ships:
+            # Pick uniformly among the placements still open in the precomputed table: a few blind
+            # picks first, as the board is mostly empty, then from the list of those that are left
+            placements = self.rules.table(ship_size).placements
+            blocked = self.blocked
+            for _ in range(RANDOM_PICKS):
+                placement = self.rng.choice(placements)
+                if not placement.mask & blocked:
+                    break
+            else:
+                free = [p for p in placements if not p.mask & blocked]
+                if not free:
+                    return False
+                placement = self.rng.choice(free)
+            self._mark(placement)
+            self.placed_ships.append(Ship(ship_name, set(placement.cells)))
+        return True
 
-    def place_ships_manually(self, ships=SHIPS):
+    def place_ships_manually(self, ships=None):
         """
         Prompt the user for each ship's starting coordinate and orientation (H or V).
         Validates the placement; if invalid, re-prompts.
         """
         print("\nPlease place your ships manually on the board.")
+        ships = ships or SHIPS
         for ship_name, ship_size in ships:
             while True:
                 self.print_display_grid(show_hidden_board=True)
@@ -139,20 +264,19 @@ class Board:
                 # Check if we can place the ship
                 if self.can_place_ship(row, col, ship_size, orientation):
                     occupied_positions = self.do_place_ship(row, col, ship_size, orientation)
-                    self.placed_ships.append({
-                        'name': ship_name,
-                        'positions': occupied_positions
-                    })
+                    self.placed_ships.append(Ship(ship_name, occupied_positions))
                     break
                 else:
                     print(f"  [!] Cannot place {ship_name} at {coord_str} (orientation={orientation_str}). Try again.")
 
-    def place_ships_manually_online(self, rfile, wfile, game, ships=SHIPS):
+    def place_ships_manually_online(self, rfile, wfile, game, ships=None, clock=None, deadline=None):
         """
         Prompt the user for each ship's starting coordinate and orientation (H or V).
         Validates the placement; if invalid, re-prompts.
+        If 'deadline' passes first, the whole fleet is placed randomly instead.
         """
         send(wfile, "\nPlease place your ships manually on the board.")
+        ships = ships or SHIPS
         for ship_name, ship_size in ships:
             while True:
                 self.print_display_grid_online(wfile, show_hidden_board=True)
@@ -160,40 +284,32 @@ class Board:
                 send(wfile, "Enter starting coordinate (e.g. A1): ")
 
                 if not game.is_set(): return #Check if game is over
-                coord_str = recv(rfile)
+                cell = recv(rfile, clock, remaining(deadline), use_bank=False, expect=EXPECT_CELL)
                 if not game.is_set(): return #Check if game is over
+                if clock and clock.timed_out:
+                    place_randomly_after_timeout(self, wfile, ships)
+                    return
 
                 send(wfile, "  Orientation? Enter 'H' (horizontal) or 'V' (vertical): ")
 
                 if not game.is_set(): return #Check if game is over
-                orientation_str = recv(rfile).upper()
+                orientation = recv(rfile, clock, remaining(deadline), use_bank=False, expect=EXPECT_ORIENTATION)
                 if not game.is_set(): return #Check if game is over
+                if clock and clock.timed_out:
+                    place_randomly_after_timeout(self, wfile, ships)
+                    return
 
-                try:
-                    row, col = parse_coordinate(coord_str)
-                except ValueError as e:
-                    send(wfile, f"  [!] Invalid coordinate: {e}")
-                    continue
-
-                # Convert orientation_str to 0 (horizontal) or 1 (vertical)
-                if orientation_str == 'H':
-                    orientation = 0
-                elif orientation_str == 'V':
-                    orientation = 1
-                else:
-                    send(wfile, "  [!] Invalid orientation. Please enter 'H' or 'V'.")
-                    continue
+                # Both answers were validated by the reader: a (row, col) and 0 (horizontal) or 1 (vertical)
+                row, col = cell
 
                 # Check if we can place the ship
                 if self.can_place_ship(row, col, ship_size, orientation):
                     occupied_positions = self.do_place_ship(row, col, ship_size, orientation)
-                    self.placed_ships.append({
-                        'name': ship_name,
-                        'positions': occupied_positions
-                    })
+                    self.placed_ships.append(Ship(ship_name, occupied_positions))
                     break
                 else:
-                    send(wfile, f"  [!] Cannot place {ship_name} at {coord_str} (orientation={orientation_str}). Try again.")
+                    send(wfile, f"  [!] Cannot place {ship_name} at {format_coordinate(row, col)} "
+                                f"(orientation={'HV'[orientation]}). Try again.")
 
 
     def can_place_ship(self, row, col, ship_size, orientation):
@@ -201,35 +317,24 @@ class Board:
         Check if we can place a ship of length 'ship_size' at (row, col)
         with the given orientation (0 => horizontal, 1 => vertical).
         Returns True if the space is free, False otherwise.
+        The variant decides what "free" means: its placement table holds every in-bounds
+        placement, and under no-touch self.blocked also covers the cells around placed ships.
         """
-        if orientation == 0:  # Horizontal
-            if col + ship_size > self.size:
-                return False
-            for c in range(col, col + ship_size):
-                if self.hidden_grid[row][c] != '.':
-                    return False
-        else:  # Vertical
-            if row + ship_size > self.size:
-                return False
-            for r in range(row, row + ship_size):
-                if self.hidden_grid[r][col] != '.':
-                    return False
-        return True
+        placement = self.rules.placement(ship_size, row, col, orientation)
+        return placement is not None and not placement.mask & self.blocked
 
     def do_place_ship(self, row, col, ship_size, orientation):
         """
         Place the ship on hidden_grid by marking 'S', and return the set of occupied positions.
         """
-        occupied = set()
-        if orientation == 0:  # Horizontal
-            for c in range(col, col + ship_size):
-                self.hidden_grid[row][c] = 'S'
-                occupied.add((row, c))
-        else:  # Vertical
-            for r in range(row, row + ship_size):
-                self.hidden_grid[r][col] = 'S'
-                occupied.add((r, col))
-        return occupied
+        placement = self.rules.placement(ship_size, row, col, orientation)
+        self._mark(placement)
+        return set(placement.cells)
+
+    def _mark(self, placement):
+        self.blocked |= placement.block
+        for r, c in placement.cells:
+            self.hidden_grid[r][c] = SHIP
 
     def fire_at(self, row, col):
         """
@@ -243,22 +348,22 @@ class Board:
         The server can use this result to inform the firing player.
         """
         cell = self.hidden_grid[row][col]
-        if cell == 'S':
+        if cell == SHIP:
             # Mark a hit
-            self.hidden_grid[row][col] = 'X'
-            self.display_grid[row][col] = 'X'
+            self.hidden_grid[row][col] = HIT
+            self.display_grid[row][col] = HIT
             # Check if that hit sank a ship
             sunk_ship_name = self._mark_hit_and_check_sunk(row, col)
             if sunk_ship_name:
                 return ('hit', sunk_ship_name)  # A ship has just been sunk
             else:
                 return ('hit', None)
-        elif cell == '.':
+        elif cell == WATER:
             # Mark a miss
-            self.hidden_grid[row][col] = 'o'
-            self.display_grid[row][col] = 'o'
+            self.hidden_grid[row][col] = MISS
+            self.display_grid[row][col] = MISS
             return ('miss', None)
-        elif cell == 'X' or cell == 'o':
+        elif cell == HIT or cell == MISS:
             return ('already_shot', None)
         else:
             # In principle, this branch shouldn't happen if 'S', '.', 'X', 'o' are all possibilities
@@ -271,10 +376,10 @@ class Board:
         Otherwise return None.
         """
         for ship in self.placed_ships:
-            if (row, col) in ship['positions']:
-                ship['positions'].remove((row, col))
-                if len(ship['positions']) == 0:
-                    return ship['name']
+            if (row, col) in ship.positions:
+                ship.positions.remove((row, col))
+                if len(ship.positions) == 0:
+                    return ship.name
                 break
         return None
 
@@ -283,7 +388,7 @@ class Board:
         Check if all ships are sunk (i.e. every ship's positions are empty).
         """
         for ship in self.placed_ships:
-            if len(ship['positions']) > 0:
+            if len(ship.positions) > 0:
                 return False
         return True
 
@@ -310,7 +415,7 @@ class Board:
         # Each row labeled with A, B, C, ...
         for r in range(self.size):
             row_label = chr(ord('A') + r)
-            row_str = " ".join(grid_to_print[r][c] for c in range(self.size))
+            row_str = " ".join(grid_to_print[r].decode())
             print(f"{row_label:2} {row_str}")
     
     def print_display_grid_online(self, wfile, show_hidden_board=False):
@@ -336,7 +441,7 @@ class Board:
         # Each row labeled with A, B, C, ...
         for r in range(self.size):
             row_label = chr(ord('A') + r)
-            row_str = " ".join(grid_to_print[r][c] for c in range(self.size))
+            row_str = " ".join(grid_to_print[r].decode())
             send(wfile, f"{row_label:2} {row_str}")
 
 
@@ -362,6 +467,85 @@ def parse_coordinate(coord_str):
     return (row, col)
 
 
+def format_coordinate(row, col):
+    return f"{chr(ord('A') + row)}{col + 1}"
+
+
+# Every valid coordinate of a board size, e.g. {"B5": (1, 4)}, so a good answer costs one dict lookup
+_cell_tables = {}
+
+def cell_table(size):
+    table = _cell_tables.get(size)
+    if table is None:
+        table = {format_coordinate(r, c): (r, c) for r in range(size) for c in range(size)}
+        _cell_tables[size] = table
+    return table
+
+
+# Answers accepted for single-letter prompts
+_LETTERS = {
+    EXPECT_CHOICE: ({'M': 'M', 'R': 'R'}, "Invalid input"),
+    EXPECT_ORIENTATION: ({'H': 0, 'V': 1}, "  [!] Invalid orientation. Please enter 'H' or 'V'."),
+}
+
+# Whether 'value' is something parse_move could have returned for a prompt expecting 'expect'
+def answers(expect, value):
+    if expect == EXPECT_CHOICE:
+        return value in ('M', 'R')
+    if expect == EXPECT_ORIENTATION:
+        return type(value) is int and value in (0, 1)
+    if type(expect) is tuple:  # a salvo: a tuple of (row, col)
+        return value == QUIT or (type(value) is tuple and type(value[0]) is tuple)
+    return (type(value) is tuple and type(value[0]) is int) or (expect == EXPECT_SHOT and value == QUIT)
+
+
+# Parses a player's answer to a prompt that expects 'expect'. Returns (value, None) or (None, error message).
+# Runs on the reader thread, so the game thread never sees malformed input.
+def parse_move(expect, text):
+    text = text.strip().upper()
+    letters = _LETTERS.get(expect)
+    if letters:
+        choices, error = letters
+        value = choices.get(text)
+        return (value, None) if value is not None else (None, error)
+
+    if type(expect) is tuple:
+        return parse_salvo(expect[1], text)
+    if expect == EXPECT_SHOT and text == 'QUIT':
+        return QUIT, None
+    cell = cell_table(BOARD_SIZE).get(text)
+    if cell is not None:
+        return cell, None
+
+    # Anything unusual (e.g. "A01") goes through parse_coordinate, which also explains what is wrong
+    try:
+        return parse_coordinate(text), None
+    except ValueError as e:
+        reason = str(e)
+    if expect == EXPECT_CELL:
+        return None, f"  [!] Invalid coordinate: {reason}"
+    return None, f"Invalid input: {reason}"
+
+
+# Parses a salvo of up to 'count' distinct coordinates separated by spaces or commas, e.g. "B5 C7", or QUIT
+def parse_salvo(count, text):
+    if text == 'QUIT':
+        return QUIT, None
+    volley = []
+    for word in text.replace(',', ' ').split():
+        cell, error = parse_move(EXPECT_CELL, word)
+        if error:
+            return None, f"Invalid input: {error.split(': ', 1)[1]}"
+        if cell in volley:
+            return None, f"Invalid input: {word} is in the salvo twice"
+        volley.append(cell)
+    if not volley:
+        return None, "Invalid input: enter at least one coordinate"
+    if len(volley) > count:
+        return None, f"Invalid input: you have {count} shot{'s' if count != 1 else ''} this turn"
+    return tuple(volley), None
+
+
 def run_single_player_game_locally():
     """
     A test harness for local single-player mode, demonstrating two approaches:
@@ -432,7 +616,7 @@ def run_single_player_game_online(rfile, wfile):
         wfile.write("  " + " ".join(str(i + 1).rjust(2) for i in range(board.size)) + '\n')
         for r in range(board.size):
             row_label = chr(ord('A') + r)
-            row_str = " ".join(board.display_grid[r][c] for c in range(board.size))
+            row_str = " ".join(board.display_grid[r].decode())
             wfile.write(f"{row_label:2} {row_str}\n")
         wfile.write('\n')
         wfile.flush()
@@ -485,63 +669,97 @@ def run_single_player_game_online(rfile, wfile):
 
 
 
-def run_two_player_game_online(game, p1, p2, clients):
+def run_two_player_game_online(game, p1, p2, spectators, recorder=None, wheel=None, rules=None, seed=None):
+    # The match's variant, compiled once here so turns and placement only do table lookups
+    rules = rules or variants.load(variants.VARIANT, BOARD_SIZE, SHIPS)
+    ships = rules.ships
+
+    # Everything random in the match comes from its own generator, so its seed reproduces it
+    seed = new_seed() if seed is None else seed
+    rng = random.Random(seed)
+    if recorder: recorder.seed = seed
+
+    # A bot's shots come from the match seed too, so the recorded seed replays a bot match as well
+    for seat, (player, _) in enumerate((p1, p2), 1):
+        if getattr(player, 'bot', None) is not None:
+            player.bot.rng.seed((seed ^ BOT_SALT) + seat)
+
     # Unpack the read/write file objects for each player
     rfile1, wfile1 = p1
     rfile2, wfile2 = p2
 
+    # Turn clocks and time banks run on the shared timer wheel; without one, prompts never expire
+    clock1 = PlayerClock(wheel, rfile1, TIME_BANK) if wheel else None
+    clock2 = PlayerClock(wheel, rfile2, TIME_BANK) if wheel else None
+
     # Inform players of their roles
     send(wfile1, "You are Player 1.")
     send(wfile2, "You are Player 2.")
-    send_to_all_p0_clients(clients, "Game has started")
+    send_to_all_p0_clients(spectators, "Game has started")
+    if rules.name != 'classic':
+        send(wfile1, f"Variant: {rules.name} ({rules.describe()})")
+        send(wfile2, f"Variant: {rules.name} ({rules.describe()})")
+        send_to_all_p0_clients(spectators, f"Variant: {rules.name} ({rules.describe()})")
 
     # Initialize boards for each player
-    board1 = Board(BOARD_SIZE)
-    board2 = Board(BOARD_SIZE)
+    board1 = Board(rules=rules, rng=rng)
+    board2 = Board(rules=rules, rng=rng)
+    update_spectator_snapshot(spectators, board1, board2, "Players are placing their ships.")
 
     # Player 1 places ships
-    send_to_all_p0_clients(clients, "Wait for Player 1 to place their ships.")
+    send_to_all_p0_clients(spectators, "Wait for Player 1 to place their ships.")
     send(wfile2, "Wait for Player 1 to place their ships...")
     send(wfile1, "Place ships manually (M) or randomly (R)? [M/R]: ")
+    deadline = time.monotonic() + PLACEMENT_TIMEOUT
     while True:
         
         if not game.is_set(): return # Exit if game was ended
-        Place = recv(rfile1).upper()
+        Place = recv(rfile1, clock1, remaining(deadline), use_bank=False, expect=EXPECT_CHOICE)
         if not game.is_set(): return # Exit if game was ended
 
-        if Place == 'M':
-            board1.place_ships_manually_online(rfile1, wfile1, game, SHIPS)
+        if clock1 and clock1.timed_out:
+            place_randomly_after_timeout(board1, wfile1, ships)
+            break
+        elif Place == 'M':
+            board1.place_ships_manually_online(rfile1, wfile1, game, ships, clock1, deadline)
             break
         elif Place == 'R':
-            board1.place_ships_randomly(SHIPS)
+            board1.place_ships_randomly(ships)
             break
         else:
             send(wfile1, "Invalid input")
     
     # Notify all clients that Player 1 is done placing ships
     if not game.is_set(): return
-    send_to_all_p0_clients(clients, "Player 1 has placed their ships")
+    send_to_all_p0_clients(spectators, "Player 1 has placed their ships")
     send(wfile1, "Wait for Player 2 to place their ships...")
     send(wfile2, "Place ships manually (M) or randomly (R)? [M/R]: ")
 
     # Player 2 places ships
+    deadline = time.monotonic() + PLACEMENT_TIMEOUT
     while True:
 
         if not game.is_set(): return # Exit if game was ended
-        Place = recv(rfile2).upper()
+        Place = recv(rfile2, clock2, remaining(deadline), use_bank=False, expect=EXPECT_CHOICE)
         if not game.is_set(): return # Exit if game was ended
 
-        if Place == 'M':
-            board2.place_ships_manually_online(rfile2, wfile2, game, SHIPS)
+        if clock2 and clock2.timed_out:
+            place_randomly_after_timeout(board2, wfile2, ships)
+            break
+        elif Place == 'M':
+            board2.place_ships_manually_online(rfile2, wfile2, game, ships, clock2, deadline)
             break
         elif Place == 'R':
-            board2.place_ships_randomly(SHIPS)
+            board2.place_ships_randomly(ships)
             break
         else:
             send(wfile2, "Invalid input")
 
+    # Both fleets are final, start recording the match for replays
+    if recorder and game.is_set(): recorder.start(board1, board2)
+
     # Clients are notified that the game has begun
-    send_to_all_p0_clients(clients, "Player 2 has placed their ships")
+    send_to_all_p0_clients(spectators, "Player 2 has placed their ships")
     send(wfile1, "Welcome to Online Single-Player Battleship! Try to sink all the ships. Type 'quit' to exit.")
     send(wfile2, "Welcome to Online Single-Player Battleship! Try to sink all the ships. Type 'quit' to exit.")
 
@@ -551,123 +769,165 @@ def run_two_player_game_online(game, p1, p2, clients):
         if not game.is_set(): return # Exit if game was ended
 
         # === Player 1's Turn ===
+        update_spectator_snapshot(spectators, board1, board2, "Turn: Player 1")
         send_board(wfile1, board2)
-        send_to_all_p0_clients(clients, "Waiting for player 1 turn...")
+        send_to_all_p0_clients(spectators, "Waiting for player 1 turn...")
         send(wfile2, "Wait for player 1 turn...")
-        send(wfile1, "Enter coordinate to fire at (e.g. B5):")
+        if clock1 and TIME_BANK > 0:
+            send(wfile1, f"[CLOCK] {TURN_TIMEOUT:g}s for this move, {clock1.bank:.0f}s left in your time bank")
+        shots = rules.shots(board1)
+        if rules.salvo:
+            send(wfile1, f"Enter up to {shots} coordinate{'s' if shots != 1 else ''} to fire at, separated by spaces (e.g. B5 C7):")
+        else:
+            send(wfile1, "Enter coordinate to fire at (e.g. B5):")
 
         if not game.is_set(): return # Exit if game was ended
-        guess = recv(rfile1)
+        guess = recv(rfile1, clock1, expect=(EXPECT_SALVO, shots) if rules.salvo else EXPECT_SHOT)
         if not game.is_set(): return # Exit if game was ended
         
-        send(wfile2, f"Player 1 Inputs: {guess}")
-        send_to_all_p0_clients(clients, f"Player 1 Inputs: {guess}")
-
-        if guess.lower() == 'quit':
-            # Player 1 quits the game
-            send(wfile1, "Thanks for playing. Goodbye.")
-            send(wfile2, "Player 1 quit the game.")
-            send_to_all_p0_clients(clients, "Player 1 quit the game.")
-            game.clear()
-            return
-
-        # Handle Player 1's guess
-        try:
-            row, col = parse_coordinate(guess)
-            result, sunk_name = board2.fire_at(row, col)
-            moves += 1
-
-            if result == 'hit':
-                if sunk_name:
-                    # Player 1 sank a ship
-                    send_to_all_p0_clients(clients, f"HIT! Player 1 sank the {sunk_name}!")
-                    send(wfile1, f"HIT! You sank the {sunk_name}!")
-                    send(wfile2, f"HIT! Player 1 sank the {sunk_name}!")
-                else:
-                    send_to_all_p0_clients(clients, "Player 1: HIT!")
-                    send(wfile1, "HIT!")
-                    send(wfile2, "Player 1: HIT!")
-
-                # Check if all ships are sunk
-                if board2.all_ships_sunk():
-                    send_board(wfile1, board2)
-                    send_board(wfile2, board2)
-                    send_board_to_all_p0_clients(clients, board2)
-                    send_to_all_p0_clients(clients, f"Player 2 sank all ships in {moves} moves.")
-                    send(wfile1, f"Congratulations! You sank all ships in {moves} moves.")
-                    send(wfile2, f"You lose! Player 2 sank all ships in {moves} moves.")
-                    game.clear()
-                    return
-            elif result == 'miss':
-                    send(wfile1, "MISS!")
-                    send(wfile2, "Player 1: MISS!")
-                    send_to_all_p0_clients(clients, "Player 1: MISS!")
-            elif result == 'already_shot':
-                send(wfile1, "You've already fired at that location.")
-                send(wfile2, "Player 1: You've already fired at that location.")
-                send_to_all_p0_clients(clients, "Player 1: You've already fired at that location.")
-        except ValueError as e:
-            send(wfile1, f"Invalid input: {e}")
+        if clock1 and clock1.timed_out:
+            # Out of move time and time bank: the turn passes
+            send(wfile1, "Time's up! Your turn has been skipped.")
+            send(wfile2, "Player 1 ran out of time.")
+            send_to_all_p0_clients(spectators, "Player 1 ran out of time.")
+        else:
+            # guess is QUIT, a (row, col) or for a salvo a tuple of them, all validated by the reader thread
+            volley = guess if rules.salvo and guess != QUIT else (guess,)
+            label = QUIT if guess == QUIT else " ".join(format_coordinate(*cell) for cell in volley)
+            send(wfile2, f"Player 1 Inputs: {label}")
+            send_to_all_p0_clients(spectators, f"Player 1 Inputs: {label}")
+
+            if guess == QUIT:
+                # Player 1 quits the game
+                send(wfile1, "Thanks for playing. Goodbye.")
+                send(wfile2, "Player 1 quit the game.")
+                send_to_all_p0_clients(spectators, "Player 1 quit the game.")
+                if recorder: recorder.finish(2)
+                game.clear()
+                return
+
+            # Handle Player 1's guess. A salvo is fired as one batch, then the results are reported in order.
+            # Each shot is recorded as soon as it lands, so a replay snapshot never includes later shots
+            results = []
+            for row, col in volley:
+                with profiling.phase("fire_at"):
+                    result, sunk_name = board2.fire_at(row, col)
+                if recorder: recorder.shot(1, row, col, result, sunk_name)
+                results.append((result, sunk_name))
+            moves += len(volley)
+
+            for result, sunk_name in results:
+                if result == 'hit':
+                    if sunk_name:
+                        # Player 1 sank a ship
+                        send_to_all_p0_clients(spectators, f"HIT! Player 1 sank the {sunk_name}!")
+                        send(wfile1, f"HIT! You sank the {sunk_name}!")
+                        send(wfile2, f"HIT! Player 1 sank the {sunk_name}!")
+                    else:
+                        send_to_all_p0_clients(spectators, "Player 1: HIT!")
+                        send(wfile1, "HIT!")
+                        send(wfile2, "Player 1: HIT!")
+                elif result == 'miss':
+                        send(wfile1, "MISS!")
+                        send(wfile2, "Player 1: MISS!")
+                        send_to_all_p0_clients(spectators, "Player 1: MISS!")
+                elif result == 'already_shot':
+                    send(wfile1, "You've already fired at that location.")
+                    send(wfile2, "Player 1: You've already fired at that location.")
+                    send_to_all_p0_clients(spectators, "Player 1: You've already fired at that location.")
+
+            # Check if all ships are sunk
+            if board2.all_ships_sunk():
+                send_board(wfile1, board2)
+                send_board(wfile2, board2)
+                send_board_to_all_p0_clients(spectators, board2)
+                send_to_all_p0_clients(spectators, f"Player 2 sank all ships in {moves} moves.")
+                send(wfile1, f"Congratulations! You sank all ships in {moves} moves.")
+                send(wfile2, f"You lose! Player 2 sank all ships in {moves} moves.")
+                if recorder: recorder.finish(1)
+                game.clear()
+                return
         
-        send_board_to_all_p0_clients(clients, board2)
+        send_board_to_all_p0_clients(spectators, board2)
 
         # === Player 2's Turn ===
+        update_spectator_snapshot(spectators, board1, board2, "Turn: Player 2")
         send_board(wfile2, board1)
-        send_to_all_p0_clients(clients, "Waiting for player 2 turn...")
+        send_to_all_p0_clients(spectators, "Waiting for player 2 turn...")
         send(wfile1, "Wait for player 2 turn...")
-        send(wfile2, "Enter coordinate to fire at (e.g. B5):")
+        if clock2 and TIME_BANK > 0:
+            send(wfile2, f"[CLOCK] {TURN_TIMEOUT:g}s for this move, {clock2.bank:.0f}s left in your time bank")
+        shots = rules.shots(board2)
+        if rules.salvo:
+            send(wfile2, f"Enter up to {shots} coordinate{'s' if shots != 1 else ''} to fire at, separated by spaces (e.g. B5 C7):")
+        else:
+            send(wfile2, "Enter coordinate to fire at (e.g. B5):")
 
         if not game.is_set(): return #Check if game is over
-        guess = recv(rfile2)
+        guess = recv(rfile2, clock2, expect=(EXPECT_SALVO, shots) if rules.salvo else EXPECT_SHOT)
         if not game.is_set(): return #Check if game is over
 
-        send(wfile1, f"Player 2 Inputs: {guess}")
-        send_to_all_p0_clients(clients, f"Player 2 Inputs: {guess}")
-        if guess.lower() == 'quit':
-            # Player 2 quits the game
-            send(wfile2, "Thanks for playing. Goodbye.")
-            send(wfile1, "Player 2 quit the game.")
-            send_to_all_p0_clients(clients, "Player 2 quit the game.")
-            return
+        if clock2 and clock2.timed_out:
+            # Out of move time and time bank: the turn passes
+            send(wfile2, "Time's up! Your turn has been skipped.")
+            send(wfile1, "Player 2 ran out of time.")
+            send_to_all_p0_clients(spectators, "Player 2 ran out of time.")
+        else:
+            # guess is QUIT, a (row, col) or for a salvo a tuple of them, all validated by the reader thread
+            volley = guess if rules.salvo and guess != QUIT else (guess,)
+            label = QUIT if guess == QUIT else " ".join(format_coordinate(*cell) for cell in volley)
+            send(wfile1, f"Player 2 Inputs: {label}")
+            send_to_all_p0_clients(spectators, f"Player 2 Inputs: {label}")
+            if guess == QUIT:
+                # Player 2 quits the game
+                send(wfile2, "Thanks for playing. Goodbye.")
+                send(wfile1, "Player 2 quit the game.")
+                send_to_all_p0_clients(spectators, "Player 2 quit the game.")
+                if recorder: recorder.finish(1)
+                return
         
-        # Handle Player 2's guess
-        try:
-            row, col = parse_coordinate(guess)
-            result, sunk_name = board1.fire_at(row, col)
-
-            if result == 'hit':
-                if sunk_name:
-                    # Player 2 sank a ship
-                    send(wfile2, f"HIT! You sank the {sunk_name}!")
-                    send(wfile1, f"HIT! Player 2 sank the {sunk_name}!")
-                    send_to_all_p0_clients(clients,f"HIT! Player 2 sank the {sunk_name}!")
-                else:
-                    send(wfile2, "HIT!")
-                    send(wfile1, "Player 2: HIT!")
-                    send_to_all_p0_clients(clients, "Player 2: HIT!")
-                
-                # Check if all ships are sunk
-                if board1.all_ships_sunk():
-                    send_board(wfile2, board1)
-                    send_board(wfile1, board1)
-                    send_board_to_all_p0_clients(clients, board1)
-                    send(wfile2, f"Congratulations! You sank all ships in {moves} moves.")
-                    send(wfile1, f"You lose! Player 1 sank all ships in {moves} moves.")
-                    send_to_all_p0_clients(clients, f"Player 1 sank all ships in {moves} moves.")
-                    game.clear()
-                    return
-            elif result == 'miss':
-                    send(wfile2, "MISS!")
-                    send(wfile1, "Player 2: MISS!")
-                    send_to_all_p0_clients(clients, "Player 2: MISS!")
-            elif result == 'already_shot':
-                send(wfile2, "You've already fired at that location.")
-                send(wfile1, "Player 2: You've already fired at that location.")
-                send_to_all_p0_clients(clients, "Player 2: You've already fired at that location.")
-        except ValueError as e:
-            send(wfile2, f"Invalid input: {e}")
+            # Handle Player 2's guess. A salvo is fired as one batch, then the results are reported in order.
+            # Each shot is recorded as soon as it lands, so a replay snapshot never includes later shots
+            results = []
+            for row, col in volley:
+                with profiling.phase("fire_at"):
+                    result, sunk_name = board1.fire_at(row, col)
+                if recorder: recorder.shot(2, row, col, result, sunk_name)
+                results.append((result, sunk_name))
+
+            for result, sunk_name in results:
+                if result == 'hit':
+                    if sunk_name:
+                        # Player 2 sank a ship
+                        send(wfile2, f"HIT! You sank the {sunk_name}!")
+                        send(wfile1, f"HIT! Player 2 sank the {sunk_name}!")
+                        send_to_all_p0_clients(spectators,f"HIT! Player 2 sank the {sunk_name}!")
+                    else:
+                        send(wfile2, "HIT!")
+                        send(wfile1, "Player 2: HIT!")
+                        send_to_all_p0_clients(spectators, "Player 2: HIT!")
+                elif result == 'miss':
+                        send(wfile2, "MISS!")
+                        send(wfile1, "Player 2: MISS!")
+                        send_to_all_p0_clients(spectators, "Player 2: MISS!")
+                elif result == 'already_shot':
+                    send(wfile2, "You've already fired at that location.")
+                    send(wfile1, "Player 2: You've already fired at that location.")
+                    send_to_all_p0_clients(spectators, "Player 2: You've already fired at that location.")
+
+            # Check if all ships are sunk
+            if board1.all_ships_sunk():
+                send_board(wfile2, board1)
+                send_board(wfile1, board1)
+                send_board_to_all_p0_clients(spectators, board1)
+                send(wfile2, f"Congratulations! You sank all ships in {moves} moves.")
+                send(wfile1, f"You lose! Player 1 sank all ships in {moves} moves.")
+                if recorder: recorder.finish(2)
+                send_to_all_p0_clients(spectators, f"Player 1 sank all ships in {moves} moves.")
+                game.clear()
+                return
         
-        send_board_to_all_p0_clients(clients, board1)
+        send_board_to_all_p0_clients(spectators, board1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,119 @@
+"""
+bench_memory.py
+
+Memory benchmark for the per-connection and per-match records, comparing the current slotted /
+bytearray representation with the original dict / list-of-str one.
+
+Measures, with tracemalloc:
+ - bytes per idle connection: the client record plus its input Queue, which is now only created
+   for players (socket objects excluded, they are the same either way)
+ - bytes per active match: both Boards with placed fleets, plus a MatchRecorder holding 100 shots
+
+Usage:
+    python bench_memory.py [--connections 10000] [--matches 1000] [--seed 0]
+"""
+
+import argparse
+import random
+import threading
+import tracemalloc
+from queue import Queue
+
+from battleship import Board, BOARD_SIZE, SHIPS
+from records import ClientInfo
+from replay import MatchRecorder
+
+SHOTS_PER_MATCH = 100
+
+
+def _measure(build, count):
+    """
+    Average traced bytes per object for 'count' objects made by build(i).
+    """
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    keep = [build(i) for i in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del keep
+    return total / count
+
+
+# --- Idle connections ---
+
+def _legacy_client(i, flag):
+    return {
+        'client_id': i,
+        'username': f"player{i}",
+        'p': 0,
+        'input_queue': Queue(),
+        'rfile': None,
+        'wfile': None,
+        'conn': None,
+        'input_flag': flag,
+    }
+
+
+def _slotted_client(i, flag):
+    return ClientInfo(i, f"player{i}", None, flag)
+
+
+# --- Active matches ---
+
+def _placed_board(rng):
+    board = Board(BOARD_SIZE, rng=rng)
+    board.place_ships_randomly(SHIPS)
+    return board
+
+
+def _legacy_match(rng):
+    """
+    The original layout: list-of-str grids, a dict per ship, a tuple per recorded shot.
+    """
+    boards = []
+    for _ in range(2):
+        board = _placed_board(rng)
+        boards.append({
+            'hidden_grid': [[chr(cell) for cell in row] for row in board.hidden_grid],
+            'display_grid': [['.' for _ in range(board.size)] for _ in range(board.size)],
+            'placed_ships': [{'name': ship.name, 'positions': set(ship.positions)} for ship in board.placed_ships],
+        })
+    shots = [(1 + n % 2, rng.randrange(BOARD_SIZE * BOARD_SIZE), n % 3) for n in range(SHOTS_PER_MATCH)]
+    return boards, shots
+
+
+def _slotted_match(rng):
+    board1, board2 = _placed_board(rng), _placed_board(rng)
+    recorder = MatchRecorder("bench", ("a", "b"))
+    recorder.start(board1, board2)
+    for n in range(SHOTS_PER_MATCH):
+        cell = rng.randrange(BOARD_SIZE * BOARD_SIZE)
+        recorder.shot(1 + n % 2, cell // BOARD_SIZE, cell % BOARD_SIZE, 'miss', None)
+    return recorder
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory per connection and per match")
+    parser.add_argument('--connections', type=int, default=10000)
+    parser.add_argument('--matches', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    flag = threading.Event()  # shared by every spectator, as in the server
+    legacy_conn = _measure(lambda i: _legacy_client(i, flag), args.connections)
+    slotted_conn = _measure(lambda i: _slotted_client(i, flag), args.connections)
+
+    rng = random.Random(args.seed)
+    legacy_match = _measure(lambda i: _legacy_match(rng), args.matches)
+    rng = random.Random(args.seed)
+    slotted_match = _measure(lambda i: _slotted_match(rng), args.matches)
+
+    print(f"{'':24}{'before':>10}{'after':>10}{'saved':>8}")
+    for label, before, after in (("bytes / idle connection", legacy_conn, slotted_conn),
+                                 ("bytes / active match", legacy_match, slotted_match)):
+        print(f"{label:24}{before:10.0f}{after:10.0f}{1 - after / before:8.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+"""
+bench_transport.py
+
+Benchmark for the optional TLS and compression layers (see transport.py).
+
+Measures:
+ - handshake time over loopback: plain TCP connect, full TLS handshake, resumed TLS handshake
+   (the client offers the session ticket from its previous connection)
+ - the full handshake against a real server.py process, through the client's own connect_to_server():
+   plain, zlib, TLS and TLS + zlib, each checked to reach the welcome line (so a broken negotiation
+   fails the run instead of going unnoticed)
+ - bytes on the wire per turn of a spectator's feed (the per-turn status lines and a GRID frame,
+   rendered by the game's own functions), plain, zlib, TLS and TLS + zlib
+
+Uses a throwaway self-signed certificate made with the openssl command unless --cert/--key are given.
+
+Usage:
+    python bench_transport.py [--connections 200] [--games 20] [--server-connections 20] [--seed 0] [--cert cert.pem --key key.pem]
+"""
+
+import argparse
+import os
+import random
+import socket
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+import client
+import transport
+from battleship import Board, BOARD_SIZE, SHIPS, render_board
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py')
+SERVER_START_TIMEOUT = 10
+
+
+def make_certificate(directory):
+    cert = os.path.join(directory, 'cert.pem')
+    key = os.path.join(directory, 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-keyout', key, '-out', cert,
+                    '-days', '1', '-subj', '/CN=localhost', '-addext', 'subjectAltName=DNS:localhost,IP:127.0.0.1'],
+                   check=True, capture_output=True)
+    return cert, key
+
+
+# --- Handshakes ---
+
+def _serve(listener, context):
+    while True:
+        try:
+            conn, _ = listener.accept()
+        except OSError:
+            return
+        try:
+            if context:
+                conn = context.wrap_socket(conn, server_side=True)
+            conn.sendall(b"Enter your username:\n")
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+
+def _time_connections(port, context, count, resume):
+    """
+    Milliseconds from connect() until the first line arrives, for 'count' connections.
+    """
+    times, session, reused = [], None, 0
+    for _ in range(count):
+        start = time.perf_counter()
+        sock = transport.connect('127.0.0.1', port, context, session if resume else None)
+        sock.recv(64)
+        times.append((time.perf_counter() - start) * 1000)
+        if context:
+            reused += sock.session_reused
+            session = sock.session  # has its ticket now that data has arrived
+        sock.close()
+    return times, reused
+
+
+def bench_handshakes(cert, key, count):
+    results = []
+    for label, tls, resume in (("tcp", False, False), ("tls full", True, False), ("tls resumed", True, True)):
+        server_context = transport.server_context(cert, key) if tls else None
+        client_context = transport.client_context(cert) if tls else None
+        listener = socket.create_server(('127.0.0.1', 0))
+        threading.Thread(target=_serve, args=(listener, server_context), daemon=True).start()
+        times, reused = _time_connections(listener.getsockname()[1], client_context, count, resume)
+        listener.close()
+        results.append((label, times, reused))
+    return results
+
+
+# --- Handshake with the real server ---
+
+def _free_port():
+    with socket.create_server(('127.0.0.1', 0)) as probe:
+        return probe.getsockname()[1]
+
+
+def _start_server(directory, cert=None, key=None):
+    port = _free_port()
+    argv = [sys.executable, SERVER, '--port', str(port), '--workers', '1', '--bot-fill-delay', '-1',
+            '--stats-db', os.path.join(directory, 'stats.db'), '--replay-dir', directory]
+    if cert:
+        argv += ['--tls-cert', cert, '--tls-key', key]
+    process = subprocess.Popen(argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process, port
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("server.py did not start")
+
+
+def _server_handshake(port, context, compress, name):
+    """
+    Milliseconds from connect() until the server welcomes 'name'. Raises if the handshake goes wrong.
+    """
+    start = time.perf_counter()
+    sock, rfile, wfile = client.connect_to_server('127.0.0.1', port, context, compress)
+    with sock:
+        sock.settimeout(SERVER_START_TIMEOUT)
+        prompt = rfile.readline().strip()
+        if prompt != "Enter your username:":
+            raise RuntimeError(f"expected the username prompt, got {prompt!r}")
+        wfile.write(name + '\n')
+        wfile.flush()
+        welcome = rfile.readline().strip()
+        if welcome != f"Welcome, {name}!":
+            raise RuntimeError(f"expected the welcome line, got {welcome!r}")
+        return (time.perf_counter() - start) * 1000
+
+
+def bench_server_handshakes(cert, key, count):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for tls in (False, True):
+            process, port = _start_server(directory, cert if tls else None, key if tls else None)
+            try:
+                context = transport.client_context(cert) if tls else None
+                for compress in (False, True):
+                    label = ("tls" if tls else "plain") + ("+zlib" if compress else "")
+                    times = [_server_handshake(port, context, compress, f"bench{n}") for n in range(count)]
+                    results.append((label, times))
+            finally:
+                process.terminate()
+                process.wait()
+    return results
+
+
+# --- Bytes per turn ---
+
+def spectator_turns(games, rng):
+    """
+    The frames a spectator receives for each turn of 'games' random games.
+    """
+    turns = []
+    for _ in range(games):
+        boards = [Board(BOARD_SIZE, rng=rng), Board(BOARD_SIZE, rng=rng)]
+        for board in boards:
+            board.place_ships_randomly(SHIPS)
+
+        targets = [[(r, c) for r in range(BOARD_SIZE) for c in range(BOARD_SIZE)] for _ in range(2)]
+        for order in targets:
+            rng.shuffle(order)
+        player = 0
+        while True:
+            target = boards[1 - player]
+            row, col = targets[player].pop()
+            result, sunk_name = target.fire_at(row, col)
+            label = "HIT!" if result == 'hit' else "MISS!"
+            frames = [
+                f"Waiting for player {player + 1} turn...\n",
+                f"Player {player + 1} Inputs: {chr(ord('A') + row)}{col + 1}\n",
+                f"HIT! Player {player + 1} sank the {sunk_name}!\n" if sunk_name else f"Player {player + 1}: {label}\n",
+                render_board(target),
+            ]
+            turns.append([frame.encode() for frame in frames])
+            if target.all_ships_sunk():
+                break
+            player = 1 - player
+    return turns
+
+
+def _tls_pair(cert, key):
+    """
+    A connected TLS client/server pair over memory BIOs, so ciphertext can be counted exactly.
+    """
+    server_bios = (ssl.MemoryBIO(), ssl.MemoryBIO())
+    client_bios = (ssl.MemoryBIO(), ssl.MemoryBIO())
+    server = transport.server_context(cert, key).wrap_bio(*server_bios, server_side=True)
+    client = transport.client_context(cert).wrap_bio(*client_bios, server_hostname='localhost')
+    for _ in range(10):
+        for side in (client, server):
+            try:
+                side.do_handshake()
+            except ssl.SSLWantReadError:
+                pass
+        server_bios[0].write(client_bios[1].read())
+        client_bios[0].write(server_bios[1].read())
+        if server.version() and client.version():
+            break
+    server_bios[1].read()  # session tickets, sent once per connection
+    return server, server_bios[1]
+
+
+def bench_bytes(turns, cert, key):
+    results = []
+    for label, tls, compress in (("plain", False, False), ("zlib", False, True),
+                                 ("tls", True, False), ("tls+zlib", True, True)):
+        compressor = zlib.compressobj(transport.COMPRESSION_LEVEL)
+        server, outgoing = _tls_pair(cert, key) if tls else (None, None)
+        total = 0
+        for frames in turns:
+            for frame in frames:  # one write and flush per frame, as the server does
+                data = compressor.compress(frame) + compressor.flush(zlib.Z_SYNC_FLUSH) if compress else frame
+                if tls:
+                    server.write(data)
+                    total += len(outgoing.read())
+                else:
+                    total += len(data)
+        results.append((label, total / len(turns)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TLS handshake time and bytes per turn")
+    parser.add_argument('--connections', type=int, default=200)
+    parser.add_argument('--games', type=int, default=20)
+    parser.add_argument('--server-connections', type=int, default=20, help="logins per mode against server.py")
+    parser.add_argument('--cert')
+    parser.add_argument('--key')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        cert, key = (args.cert, args.key) if args.cert else make_certificate(directory)
+
+        print(f"{'handshake':16}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'resumed':>10}")
+        for label, times, reused in bench_handshakes(cert, key, args.connections):
+            p95 = sorted(times)[int(len(times) * 0.95)]
+            print(f"{label:16}{statistics.mean(times):10.3f}{statistics.median(times):10.3f}{p95:10.3f}"
+                  f"{reused:>10}")
+
+        print()
+        print(f"{'server login':16}{'mean ms':>10}{'p50 ms':>10}")
+        for label, times in bench_server_handshakes(cert, key, args.server_connections):
+            print(f"{label:16}{statistics.mean(times):10.3f}{statistics.median(times):10.3f}")
+
+        turns = spectator_turns(args.games, random.Random(args.seed))
+        print()
+        print(f"{'spectator feed':16}{'bytes/turn':>10}{'vs plain':>10}")
+        results = bench_bytes(turns, cert, key)
+        plain = results[0][1]
+        for label, per_turn in results:
+            print(f"{label:16}{per_turn:10.0f}{per_turn / plain:10.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""
+broadcast.py
+
+Spectator fan-out for live games, including:
+ - Broadcaster class that the game thread publishes frames to (a single topic per match)
+ - A pool of worker threads that each own a shard of the spectators and do the actual socket writes
+ - NullFeed, which stands in for a Broadcaster when a match has no audience
+
+Frames are encoded once by the publisher (e.g. a whole GRID block is rendered into one string),
+so the game thread only pays for one render and one queue put per worker, no matter how many
+spectators are watching.
+
+publish() never waits on a spectator for long. When a worker's queue is full and its current write
+has been stuck for STALL_TIMEOUT, that spectator has stopped reading: their connection is shut
+down, which fails the stuck write and lets the worker carry on with the rest of its shard. Either
+way the publisher waits at most EVICT_GRACE for room, then drops the frame for that shard (counted
+in 'dropped') rather than hold up the game.
+
+send() queues text for a single client on that client's worker, under the same stall rules. Chat and
+the server's notices to many clients at once go this way, so a stalled client holds none of them
+up. The game thread and the client's own handler still write directly; every client's wfile is a
+transport.LockedWriter, so those writes and the worker's never interleave.
+
+The Broadcaster also caches a pre-rendered snapshot of the whole match (both boards, turn, score),
+which is written to each new subscriber as they join, so late joiners never wait for the next move.
+Snapshots and joins travel through the worker queues like frames, so a newcomer gets the snapshot
+that matches their place in the feed, written by their worker before any frame that follows it.
+"""
+
+import socket
+import threading
+import time
+from queue import Queue, Full
+
+import profiling
+
+BROADCAST_WORKERS = 4
+BROADCAST_QUEUE_SIZE = 256  # frames a worker may fall behind before its stuck spectator is cut off
+STALL_TIMEOUT = 1.0         # seconds a single write may block before that spectator is cut off
+EVICT_GRACE = 0.05          # most seconds publish() waits for room in a full worker queue
+
+_STOP = None  # sentinel frame that shuts a worker down
+_SNAPSHOT = 'snapshot'  # (_SNAPSHOT, text) replaces the snapshot a worker catches newcomers up with
+_JOIN = 'join'          # (_JOIN, client) adds a subscriber and writes them that snapshot
+_SEND = 'send'          # (_SEND, (client, text)) writes text to that one client
+
+
+class _Worker:
+    """
+    One delivery thread and the spectators it is responsible for.
+    Subscribers are keyed by client_id so unsubscribe is O(1). Clients wait in 'joining' until
+    the worker reaches their join in the queue.
+    """
+
+    def __init__(self, index, queue_size):
+        self.frames = Queue(maxsize=queue_size)
+        self.subscribers = {}
+        self.joining = {}
+        self.snapshot = None  # as of the last item this worker has taken off its queue
+        self.lock = threading.Lock()
+        self.writing = None   # the spectator being written to right now, if any
+        self.write_started = 0.0
+        self.dropped = 0      # frames this shard missed because the worker could not keep up
+        self.thread = threading.Thread(target=self.run, name=f"broadcast-{index}", daemon=True)
+
+    def run(self):
+        while True:
+            frame = self.frames.get()
+            if frame is _STOP:
+                return
+            if isinstance(frame, tuple):
+                kind, value = frame
+                if kind == _SNAPSHOT:
+                    self.snapshot = value
+                elif kind == _SEND:
+                    self.write(*value)  # a failed write is cleaned up by the client's handler thread
+                else:
+                    self.join(value)
+                continue
+
+            # Copy so subscribe/unsubscribe don't block while we are writing
+            with self.lock:
+                targets = list(self.subscribers.values())
+
+            dead = []
+            with profiling.phase("spectators.deliver"):
+                for client in targets:
+                    # Only spectators (p=0) get the match feed
+                    if client.p != 0:
+                        continue
+                    if not self.write(client, frame):
+                        dead.append(client)
+
+            # Drop spectators whose connection is gone, their handler thread will clean up the rest
+            if dead:
+                with self.lock:
+                    for client in dead:
+                        self.subscribers.pop(client.client_id, None)
+
+    def write(self, client, frame):
+        self.write_started = time.monotonic()
+        self.writing = client
+        try:
+            client.wfile.write(frame)
+            client.wfile.flush()
+            return True
+        except Exception:
+            return False
+        finally:
+            self.writing = None
+
+    def join(self, client):
+        with self.lock:
+            if self.joining.pop(client.client_id, None) is None:
+                return  # unsubscribed before we got to them
+            self.subscribers[client.client_id] = client
+
+        # Catch the newcomer up, every frame after this point reaches them after the snapshot
+        snapshot = self.snapshot
+        if snapshot and client.p == 0 and not self.write(client, snapshot):
+            with self.lock:
+                self.subscribers.pop(client.client_id, None)
+
+    def offer(self, item):
+        """
+        Queue 'item' from the game thread without holding it up, see the module docstring.
+        """
+        try:
+            self.frames.put_nowait(item)
+        except Full:
+            self.evict_stalled()
+            try:
+                self.frames.put(item, timeout=EVICT_GRACE)
+            except Full:
+                self.dropped += 1
+
+    def evict_stalled(self):
+        """
+        Called by the publisher when this worker's queue is full: cut off the spectator whose
+        write it has been stuck in for STALL_TIMEOUT. Shutting the socket down fails that write at once.
+        """
+        client = self.writing
+        if client is None or time.monotonic() - self.write_started < STALL_TIMEOUT:
+            return
+        with self.lock:
+            self.subscribers.pop(client.client_id, None)
+        print(f"[INFO] Cutting off spectator {client.username}, who stopped reading the match feed")
+        try:
+            client.conn.shutdown(socket.SHUT_RDWR)
+        except (OSError, AttributeError):
+            pass
+
+
+class Broadcaster:
+    """
+    Publish/subscribe topic for everything spectators should see.
+
+    The game thread calls publish() with a pre-encoded frame (text ending in '\\n').
+    Each worker gets a reference to the same frame and writes it to its own shard of spectators,
+    so game-loop latency no longer grows with the size of the audience.
+    """
+
+    def __init__(self, workers=BROADCAST_WORKERS, queue_size=BROADCAST_QUEUE_SIZE):
+        self.workers = [_Worker(i, queue_size) for i in range(max(1, workers))]
+        for worker in self.workers:
+            worker.thread.start()
+
+    def _worker_for(self, client):
+        return self.workers[client.client_id % len(self.workers)]
+
+    def subscribe(self, client):
+        # The worker writes the snapshot, so it can't interleave with or trail the frames.
+        # This runs on the newcomer's own thread, which may wait for room in the queue.
+        worker = self._worker_for(client)
+        with worker.lock:
+            worker.joining[client.client_id] = client
+        worker.frames.put((_JOIN, client))
+
+    def set_snapshot(self, snapshot):
+        # Queued like a frame, so each worker switches snapshots at the same point in the feed
+        for worker in self.workers:
+            worker.offer((_SNAPSHOT, snapshot))
+
+    def unsubscribe(self, client):
+        worker = self._worker_for(client)
+        with worker.lock:
+            worker.subscribers.pop(client.client_id, None)
+            worker.joining.pop(client.client_id, None)
+
+    def publish(self, frame):
+        for worker in self.workers:
+            worker.offer(frame)
+
+    def send(self, client, text):
+        self._worker_for(client).offer((_SEND, (client, text)))
+
+    def subscriber_count(self):
+        return sum(len(worker.subscribers) + len(worker.joining) for worker in self.workers)
+
+    def close(self):
+        for worker in self.workers:
+            worker.frames.put(_STOP)
+
+
+class NullFeed:
+    """
+    Accepts a match's spectator frames and drops them. Used for matches that run alongside the
+    lobby's game (tournament matches), whose frames would otherwise interleave with it.
+    """
+
+    def publish(self, frame):
+        pass
+
+    def set_snapshot(self, snapshot):
+        pass
@@ -0,0 +1,184 @@
+"""
+chat.py
+
+Chat service used by the server's "CHAT" command, including:
+ - Channels: 'lobby' for every connected client, and one per match (match_channel()) for its two
+   players, opened when the game starts and closed when it ends. Players post to their own match's
+   channel as '#match', so the lobby game and tournament matches running alongside it never mix
+ - Per-user token-bucket rate limiting
+ - A bounded history ring buffer per channel, replayed to late joiners
+ - Batched delivery: messages are queued by the sender's reader thread and a single flusher thread
+   hands everything posted during a short window to 'deliver' as one write per recipient. The server
+   delivers through its Broadcaster (Broadcaster.send), so the writes happen on the broadcast workers
+   and a client who stops reading can't hold up the flusher or anyone else's chat
+"""
+
+import threading
+import time
+from collections import deque
+
+LOBBY = 'lobby'
+MATCH = 'match'  # what players call their current match's channel, and its label in chat lines
+
+CHAT_BATCH_WINDOW = 0.05  # seconds of messages coalesced into one delivery
+CHAT_RATE = 1.0           # tokens (messages) refilled per second
+CHAT_BURST = 5            # bucket size, i.e. messages allowed back to back
+CHAT_HISTORY = 50         # messages kept per channel for late joiners
+CHAT_MAX_LENGTH = 300     # characters, longer messages are truncated
+
+
+class TokenBucket:
+    """
+    Classic token bucket: 'rate' tokens per second, holding at most 'burst' tokens.
+    """
+
+    def __init__(self, rate=CHAT_RATE, burst=CHAT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class Channel:
+    def __init__(self, name, history=CHAT_HISTORY, label=None):
+        self.name = name
+        self.label = label or name           # shown before each line, e.g. "[match] "
+        self.members = {}                    # client_id -> client_info
+        self.history = deque(maxlen=history) # formatted lines
+        self.pending = []                    # (sender client_id, formatted line) since last flush
+
+
+# Name of the chat channel for one match, keyed by its match id
+def match_channel(match_id):
+    return f"{MATCH}:{match_id}"
+
+
+# Writes chat text straight to a client, for a ChatService that is not given a deliver function
+def write_to(client, text):
+    try:
+        client.wfile.write(text)
+        client.wfile.flush()
+    except Exception:
+        pass
+
+
+class ChatService:
+    """
+    Owns all channels and the flusher thread.
+    post() is called from a client's reader thread and never writes to other sockets itself.
+    deliver(client, text) sends one batch to one client and must not block on a slow one.
+    """
+
+    def __init__(self, window=CHAT_BATCH_WINDOW, rate=CHAT_RATE, burst=CHAT_BURST, history=CHAT_HISTORY,
+                 deliver=write_to):
+        self.deliver = deliver
+        self.window = window
+        self.rate = rate
+        self.burst = burst
+        self.history = history
+        self.channels = {LOBBY: Channel(LOBBY, history)}
+        self.buckets = {}  # client_id -> TokenBucket
+        self.lock = threading.Lock()
+        threading.Thread(target=self._flush_loop, name="chat-flusher", daemon=True).start()
+
+    def join(self, channel_name, client, replay_history=False):
+        with self.lock:
+            channel = self.channels[channel_name]
+            channel.members[client.client_id] = client
+            backlog = list(channel.history) if replay_history else []
+
+        # Late joiners catch up on recent conversation
+        if backlog:
+            self.deliver(client, "".join(backlog))
+
+    def leave(self, channel_name, client):
+        with self.lock:
+            self.channels[channel_name].members.pop(client.client_id, None)
+
+    def open(self, channel_name, label=None):
+        # Create a channel, e.g. a match's when its game starts; an existing one is left as it is
+        with self.lock:
+            if channel_name not in self.channels:
+                self.channels[channel_name] = Channel(channel_name, self.history, label)
+
+    def close(self, channel_name):
+        # Everyone leaves and the channel goes, e.g. a match's once its game ends. Messages still
+        # waiting for the flusher are delivered first
+        with self.lock:
+            channel = self.channels.pop(channel_name, None)
+            if channel is None or not channel.pending:
+                return
+            pending, members = channel.pending, list(channel.members.values())
+        self._deliver(pending, members)
+
+    def remove(self, client):
+        # Client disconnected: drop them from every channel and forget their bucket
+        with self.lock:
+            for channel in self.channels.values():
+                channel.members.pop(client.client_id, None)
+            self.buckets.pop(client.client_id, None)
+
+    def post(self, client, channel_name, message):
+        """
+        Queue a message for delivery. Returns None on success, or a reason string if rejected.
+        """
+        message = message.strip()[:CHAT_MAX_LENGTH]
+        if not message:
+            return "Empty message."
+
+        with self.lock:
+            channel = self.channels.get(channel_name)
+            if channel is None:
+                return f"Unknown channel '{channel_name}'."
+            if client.client_id not in channel.members:
+                return f"You are not in channel '{channel_name}'."
+
+            bucket = self.buckets.get(client.client_id)
+            if bucket is None:
+                bucket = self.buckets[client.client_id] = TokenBucket(self.rate, self.burst)
+            if not bucket.take():
+                return "You are sending messages too quickly."
+
+            prefix = "" if channel_name == LOBBY else f"[{channel.label}] "
+            line = f"{prefix}{client.username}: {message}\n"
+            channel.history.append(line)
+            channel.pending.append((client.client_id, line))
+        return None
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.window)
+            self.flush()
+
+    def flush(self):
+        # Grab everything pending under the lock, then deliver outside it
+        batches = []
+        with self.lock:
+            for channel in self.channels.values():
+                if channel.pending:
+                    batches.append((channel.pending, list(channel.members.values())))
+                    channel.pending = []
+
+        for pending, members in batches:
+            self._deliver(pending, members)
+
+    def _deliver(self, pending, members):
+        frame = "".join(line for _, line in pending)
+        senders = {sender for sender, _ in pending}
+        for client in members:
+            # Don't echo a user's own messages back to them
+            if client.client_id in senders:
+                text = "".join(line for sender, line in pending if sender != client.client_id)
+            else:
+                text = frame
+            if text:
+                self.deliver(client, text)
@@ -1,59 +1,188 @@
 
-import socket
+import argparse
+import sys
 import threading
+import time
+
+import screen
+import transport
 
 HOST = '127.0.0.1'
 PORT = 50046
 
+RECONNECT_ATTEMPTS = 5   # tries after the connection is lost, see stay_connected()
+RECONNECT_DELAY = 1.0    # seconds between them
+
 running = True  # Flag to control thread loop
+write_lock = threading.Lock()
+
+# TLS session of the last connection, offered again on the next connect so it can be resumed
+tls_session = None
+
+# Username the server welcomed us with, sent again after a reconnect
+username = None
+
+# Where user input goes, replaced (under write_lock) when the client reconnects
+server_wfile = None
+
 
+def send_line(wfile, text):
+    # The receiver thread answers heartbeats while the main thread sends user input
+    with write_lock:
+        wfile.write(text + '\n')
+        wfile.flush()
 
-def receive_messages(rfile):
-    """Continuously receive and display messages from the server."""
+
+def send_input(text):
+    # User input goes to whichever connection is current
+    with write_lock:
+        server_wfile.write(text + '\n')
+        server_wfile.flush()
+
+
+def receive_messages(rfile, wfile, sock=None, view=None):
+    """Continuously receive and display messages from the server.
+    With a view (screen.AnsiScreen) boards are redrawn in place instead of printed.
+    Returns True if the client should reconnect: the server asked it to, or the connection
+    dropped without the server saying goodbye."""
+    global tls_session, username
+    show = view.line if view else print
+    goodbye = False
     while running:
         try:
             line = rfile.readline()
             if not line:
-                print("[INFO] Server disconnected.")
+                show("[INFO] Server disconnected.")
                 break
 
+            # TLS 1.3 session tickets arrive after the handshake, along with the first data
+            session = getattr(sock, 'session', None)
+            if tls_session is None and session is not None and session.has_ticket:
+                tls_session = session
+
             line = line.strip()
 
-            if line == "GRID":
-                print("\n[Board]")
+            if line.startswith("Welcome, ") and line.endswith("!"):
+                username = line[len("Welcome, "):-1]
+            elif line.startswith("[SERVER]") and "Goodbye" in line:
+                goodbye = True
+
+            # Heartbeat from the server, answer it without showing anything
+            if line == "PING":
+                send_line(wfile, "PONG")
+            elif line == "GRID":
+                rows = []
                 while True:
                     board_line = rfile.readline()
                     if not board_line or board_line.strip() == "":
                         break
-                    print(board_line.strip())
+                    rows.append(board_line.rstrip())
+                if view:
+                    view.grid(rows)
+                else:
+                    print("\n[Board]")
+                    for row in rows:
+                        print(row.strip())
             else:
-                print(line)
+                show(line)
                 
         except Exception as e:
-            print(f"[ERROR] Exception in receiving messages: {e}")
+            show(f"[ERROR] Exception in receiving messages: {e}")
             break
+    return running and not goodbye
 
 
-def main():
-    global running
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.connect((HOST, PORT))
+def stay_connected(sock, rfile, wfile, reconnect, view=None):
+    """
+    Receiver thread: receive messages, and when the connection is lost (a server restart or drain
+    asks clients to reconnect, or it just drops) connect again with reconnect(), which offers the
+    saved TLS session, and log back in as the same user.
+    """
+    global server_wfile
+    show = view.line if view else print
+    while receive_messages(rfile, wfile, sock, view):
+        sock.close()
+        for attempt in range(RECONNECT_ATTEMPTS):
+            time.sleep(RECONNECT_DELAY)
+            try:
+                sock, rfile, wfile = reconnect()
+                break
+            except OSError as e:
+                show(f"[INFO] Reconnect attempt {attempt + 1} failed: {e}")
+        else:
+            show("[INFO] Could not reconnect, giving up.")
+            return
+        with write_lock:
+            server_wfile = wfile
+        resumed = " (TLS session resumed)" if getattr(sock, 'session_reused', False) else ""
+        show(f"[INFO] Reconnected{resumed}.")
+        if username:
+            send_line(wfile, username)
+
+
+def connect_to_server(host, port, tls=None, compress=False):
+    """
+    Connect, over TLS if 'tls' is an SSL context, resuming the previous TLS session if there is
+    one, and optionally negotiate compression. Returns (socket, rfile, wfile).
+    """
+    s = transport.connect(host, port, tls, tls_session)
+    if compress:
+        rfile, wfile, compressed = transport.offer_compression(s)
+        if not compressed:
+            print("[INFO] Server declined compression, continuing uncompressed.")
+    else:
         rfile = s.makefile('r')
         wfile = s.makefile('w')
+    return s, rfile, wfile
 
-        # Start receiver thread
-        receiver_thread = threading.Thread(target=receive_messages, args=(rfile,), daemon=True)
-        receiver_thread.start()
 
-        try:
-            while True:
-                user_input = input("")
-                wfile.write(user_input + '\n')
-                wfile.flush()
-        except KeyboardInterrupt:
-            print("\n[INFO] Client exiting.")
-        finally:
-            running = False  # Signal the receiver thread to stop
+def main():
+    global running, server_wfile
+    parser = argparse.ArgumentParser(description="Battleship client")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--tls', action='store_true', help="connect over TLS")
+    parser.add_argument('--cafile', help="certificate to trust, e.g. the server's self-signed one")
+    parser.add_argument('--insecure', action='store_true', help="with --tls, skip certificate checks")
+    parser.add_argument('--compress', action='store_true', help="ask the server for zlib compression")
+    parser.add_argument('--screen', action='store_true', help="redraw the boards in place (ANSI terminal)")
+    parser.add_argument('--refresh', type=float, default=screen.REFRESH_INTERVAL * 1000,
+                        help="with --screen, milliseconds between redraws")
+    args = parser.parse_args()
+
+    view = None
+    if args.screen:
+        if sys.stdout.isatty():
+            view = screen.AnsiScreen(screen.ScreenState(), interval=args.refresh / 1000)
+        else:
+            print("[INFO] Output is not a terminal, --screen ignored.")
+
+    tls = transport.client_context(args.cafile, verify=not args.insecure) if args.tls else None
+    def reconnect():
+        return connect_to_server(args.host, args.port, tls, args.compress)
+
+    s, rfile, server_wfile = reconnect()
+
+    # Start receiver thread
+    receiver_thread = threading.Thread(target=stay_connected, args=(s, rfile, server_wfile, reconnect, view),
+                                       daemon=True)
+    receiver_thread.start()
+
+    try:
+        while True:
+            user_input = input("")
+            if view:
+                view.input_done()
+            try:
+                send_input(user_input)
+            except (OSError, ValueError):
+                print("[INFO] Not connected, input dropped.")
+    except KeyboardInterrupt:
+        print("\n[INFO] Client exiting.")
+    finally:
+        running = False  # Signal the receiver thread to stop
+        if view:
+            view.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,61 @@
+"""
+clocks.py
+
+Per-player game clocks driven by the shared timer wheel (see timers.py), including:
+ - PlayerClock: a chess-style clock. Each prompt has an allowance (the turn timeout or what is left
+   of the placement deadline); time spent beyond the allowance comes out of the player's time bank
+ - Expired tokens: when a clock runs out, the wheel puts its token on the player's input queue,
+   so the game thread waiting for input is woken by an event instead of sitting in a timed get()
+
+A late expiry (the player answered just before the timer fired) leaves a stale token on the queue;
+battleship.recv() recognises it because it is not the running clock's token and skips it.
+"""
+
+import time
+
+
+class Expired:
+    """
+    Put on an input queue when a clock runs out. Each prompt gets its own instance.
+    """
+    __slots__ = ()
+
+
+class PlayerClock:
+    __slots__ = ('wheel', 'player', 'bank', 'allowance', 'use_bank', 'started', 'token', 'timer', 'timed_out')
+
+    def __init__(self, wheel, player, bank):
+        self.wheel = wheel
+        self.player = player        # ClientInfo (or bot) whose input_queue is woken on expiry
+        self.bank = float(bank)     # seconds left in the time bank
+        self.allowance = 0.0
+        self.use_bank = True
+        self.started = 0.0
+        self.token = None
+        self.timer = None
+        self.timed_out = False
+
+    def start(self, allowance, use_bank=True):
+        """
+        Start timing a prompt: it expires after 'allowance' seconds, plus the bank if use_bank.
+        """
+        self.allowance = max(0.0, allowance)
+        self.use_bank = use_bank
+        self.timed_out = False
+        self.token = Expired()
+        self.started = time.monotonic()
+        limit = self.allowance + (self.bank if use_bank else 0.0)
+        self.timer = self.wheel.schedule(limit, self.player.input_queue.put, self.token)
+
+    def stop(self):
+        """
+        The prompt was answered (or expired): cancel the timer and charge any overrun to the bank.
+        """
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        if self.use_bank:
+            overrun = time.monotonic() - self.started - self.allowance
+            if overrun > 0:
+                self.bank = max(0.0, self.bank - overrun)
+        self.token = None
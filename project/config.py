@@ -0,0 +1,273 @@
+"""
+config.py
+
+Server configuration, loaded once at startup, including:
+ - OPTIONS: every tunable, its type, the module constant it sets and its valid range
+ - PROFILES: presets (e.g. 'low-latency', 'high-fanout') that set related tunables together
+ - load(): merges defaults < profile < config file < environment < command line and validates
+ - apply(): writes the result into the module constants the rest of the server reads
+
+The defaults are the module constants themselves (server.PORT, chat.CHAT_BATCH_WINDOW, ...), so
+running without any configuration behaves exactly as before.
+
+Config files are JSON objects keyed by option name, e.g.
+    {"profile": "high-fanout", "port": 6000, "ships": [["Carrier", 5], ["Destroyer", 2]]}
+Environment variables are the upper-cased names with a BATTLESHIP_ prefix (BATTLESHIP_PORT=6000),
+and command-line flags use dashes (--port 6000, --chat-batch-window 0.02).
+"""
+
+import argparse
+import importlib
+import json
+import os
+
+import variants
+
+ENV_PREFIX = 'BATTLESHIP_'
+
+
+class ConfigError(ValueError):
+    pass
+
+
+def parse_ships(value):
+    """
+    Ships from JSON ([["Carrier", 5], ...]) or from text ("Carrier:5,Battleship:4,...").
+    """
+    if isinstance(value, str):
+        ships = []
+        for part in value.split(','):
+            name, _, length = part.strip().partition(':')
+            if not name or not length:
+                raise ConfigError(f"Ship '{part.strip()}' should look like Name:length")
+            ships.append((name, int(length)))
+        return ships
+    return [(str(name), int(length)) for name, length in value]
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ('1', 'true', 'yes', 'on'):
+        return True
+    if text in ('0', 'false', 'no', 'off'):
+        return False
+    raise ConfigError(f"expected true or false, got {value!r}")
+
+
+class Option:
+    __slots__ = ('name', 'module', 'attr', 'parse', 'minimum', 'maximum', 'help')
+
+    def __init__(self, name, module, attr, parse, minimum=None, maximum=None, help=""):
+        self.name = name
+        self.module = module
+        self.attr = attr
+        self.parse = parse
+        self.minimum = minimum
+        self.maximum = maximum
+        self.help = help
+
+    def current(self):
+        return getattr(importlib.import_module(self.module), self.attr)
+
+
+OPTIONS = [
+    # Network and admission control
+    Option('host', 'server', 'HOST', str, help="address to listen on"),
+    Option('port', 'server', 'PORT', int, 0, 65535, "port to listen on"),
+    Option('workers', 'server', 'WORKERS', int, 1, help="worker processes to shard games across"),
+    Option('pair_wait', 'shard', 'PAIR_WAIT', float, 0,
+           help="with workers, seconds a new connection waits in the acceptor for an opponent"),
+    Option('listen_backlog', 'server', 'LISTEN_BACKLOG', int, 1, help="listen() backlog"),
+    Option('max_connections', 'server', 'MAX_CONNECTIONS', int, 1, help="connected clients per process"),
+    Option('max_pending_handshakes', 'server', 'MAX_PENDING_HANDSHAKES', int, 1,
+           help="connections that have not sent a username yet"),
+    Option('handshake_timeout', 'server', 'HANDSHAKE_TIMEOUT', float, 0.1, help="seconds to send a username"),
+    Option('heartbeat_interval', 'server', 'HEARTBEAT_INTERVAL', float, 0.1, help="idle seconds before a PING"),
+    Option('dead_peer_timeout', 'server', 'DEAD_PEER_TIMEOUT', float, 0.1, help="silent seconds before reaping"),
+    Option('timer_tick', 'timers', 'TICK', float, 0.001, 1.0, help="timer wheel resolution in seconds"),
+    Option('tls_cert', 'server', 'TLS_CERT', str, help="PEM certificate, enables TLS together with tls_key"),
+    Option('tls_key', 'server', 'TLS_KEY', str, help="PEM private key for tls_cert"),
+    Option('compression', 'server', 'COMPRESSION', parse_bool, help="allow clients to negotiate zlib (true/false)"),
+    Option('drain_timeout', 'server', 'DRAIN_TIMEOUT', float, 0,
+           help="seconds running matches get to finish on shutdown or restart"),
+
+    # Lobby and game
+    Option('announce_interval', 'server', 'ANNOUNCE_INTERVAL', float, 0.1,
+           help="seconds between next-game announcements"),
+    Option('bot_fill_delay', 'server', 'BOT_FILL_DELAY', float,
+           help="seconds before a bot fills player 2 (negative disables bots)"),
+    Option('turn_timeout', 'battleship', 'TURN_TIMEOUT', float, 1, help="seconds a player has for each move"),
+    Option('time_bank', 'battleship', 'TIME_BANK', float, 0, help="extra seconds per player per match"),
+    Option('placement_timeout', 'battleship', 'PLACEMENT_TIMEOUT', float, 1,
+           help="seconds to place a fleet before it is placed randomly"),
+    Option('board_size', 'battleship', 'BOARD_SIZE', int, 5, 26, "rows and columns of the board"),
+    Option('ships', 'battleship', 'SHIPS', parse_ships, help="fleet, e.g. Carrier:5,Battleship:4,Destroyer:2"),
+    Option('seed', 'battleship', 'SEED', int, 0,
+           help="fixed seed, so every run deals the same sequence of matches (placements, bot play)"),
+    Option('variant', 'variants', 'VARIANT', variants.parse,
+           help=f"rules of new matches, {', '.join(variants.VARIANTS)} or a combination such as salvo+no-touch"),
+
+    Option('tournament_matches', 'tournament', 'MAX_PARALLEL_MATCHES', int, 1,
+           help="tournament matches played at the same time"),
+
+    # Fan-out
+    Option('broadcast_workers', 'broadcast', 'BROADCAST_WORKERS', int, 1, help="spectator delivery threads"),
+    Option('broadcast_queue_size', 'broadcast', 'BROADCAST_QUEUE_SIZE', int, 1,
+           help="frames a delivery thread may fall behind"),
+    Option('chat_batch_window', 'chat', 'CHAT_BATCH_WINDOW', float, 0.001, help="seconds of chat per delivery"),
+    Option('chat_rate', 'chat', 'CHAT_RATE', float, 0.001, help="chat messages per second per user"),
+    Option('chat_burst', 'chat', 'CHAT_BURST', int, 1, help="chat messages allowed back to back"),
+    Option('chat_history', 'chat', 'CHAT_HISTORY', int, 0, help="chat lines replayed to late joiners"),
+    Option('chat_max_length', 'chat', 'CHAT_MAX_LENGTH', int, 1, help="longest chat message"),
+
+    # Profiling
+    Option('profiling', 'profiling', 'ENABLED', parse_bool, help="time game and handler phases from startup"),
+    Option('admin_token', 'server', 'ADMIN_TOKEN', str, help="secret for ADMIN commands (unset disables them)"),
+    Option('profile_dir', 'server', 'PROFILE_DIR', str, help="where sampled stacks are written"),
+
+    # Stats
+    Option('stats_db', 'stats', 'STATS_DB', str, help="SQLite file for player stats"),
+    Option('stats_batch_window', 'stats', 'STATS_BATCH_WINDOW', float, 0,
+           help="seconds of finished matches written per transaction"),
+
+    # Replays
+    Option('replay_dir', 'replay', 'REPLAY_DIR', str, help="where finished matches are saved"),
+    Option('replay_speed', 'replay', 'REPLAY_SPEED', float, 0, help="default replay moves per second"),
+    Option('snapshot_interval', 'replay', 'SNAPSHOT_INTERVAL', int, 1, 255, "shots between replay snapshots"),
+]
+OPTIONS_BY_NAME = {option.name: option for option in OPTIONS}
+
+# Presets leave 'workers' alone: sharding changes how players are matched, so it is always asked for explicitly
+PROFILES = {
+    'default': {},
+    # Small batching windows and short queues and timeouts: every event goes out as soon as possible
+    'low-latency': {
+        'broadcast_workers': 8,
+        'broadcast_queue_size': 64,
+        'chat_batch_window': 0.01,
+        'turn_timeout': 15,
+        'time_bank': 30,
+        'placement_timeout': 60,
+        'heartbeat_interval': 5,
+        'dead_peer_timeout': 15,
+        'timer_tick': 0.02,
+    },
+    # Many spectators per match: wide delivery pools, deep queues, coarse batching
+    'high-fanout': {
+        'broadcast_workers': 32,
+        'broadcast_queue_size': 2048,
+        'chat_batch_window': 0.25,
+        'chat_history': 20,
+        'max_connections': 100000,
+        'max_pending_handshakes': 4096,
+        'listen_backlog': 4096,
+        'heartbeat_interval': 30,
+        'dead_peer_timeout': 90,
+        'tournament_matches': 256,
+    },
+}
+
+
+def _check(option, raw, source):
+    try:
+        value = option.parse(raw)
+    except (TypeError, ValueError) as e:
+        raise ConfigError(f"{source}: invalid value for {option.name}: {raw!r} ({e})")
+    if option.minimum is not None and value < option.minimum:
+        raise ConfigError(f"{source}: {option.name} must be at least {option.minimum}, got {value}")
+    if option.maximum is not None and value > option.maximum:
+        raise ConfigError(f"{source}: {option.name} must be at most {option.maximum}, got {value}")
+    return value
+
+
+def _merge(settings, values, source):
+    for name, raw in values.items():
+        option = OPTIONS_BY_NAME.get(name)
+        if option is None:
+            raise ConfigError(f"{source}: unknown option '{name}'")
+        settings[name] = _check(option, raw, source)
+
+
+def _validate(settings):
+    # Checks that involve more than one option
+    if settings['dead_peer_timeout'] <= settings['heartbeat_interval']:
+        raise ConfigError("dead_peer_timeout must be longer than heartbeat_interval")
+    if bool(settings['tls_cert']) != bool(settings['tls_key']):
+        raise ConfigError("tls_cert and tls_key must be given together")
+    for name in ('tls_cert', 'tls_key'):
+        if settings[name] and not os.path.isfile(settings[name]):
+            raise ConfigError(f"{name}: no such file {settings[name]}")
+    if not settings['ships']:
+        raise ConfigError("ships must contain at least one ship")
+    size = settings['board_size']
+    ships = variants.fleet(settings['variant'], settings['ships'])  # e.g. armada brings its own fleet
+    for name, length in ships:
+        if not 1 <= length <= size:
+            raise ConfigError(f"ship {name} of length {length} does not fit a {size} board")
+    if sum(length for _, length in ships) > size ** 2 // 2:
+        raise ConfigError("ships cover more than half of the board")
+    if not variants.load(settings['variant'], size, settings['ships']).placeable():
+        raise ConfigError(f"the {settings['variant']} fleet cannot be placed on a {size} board "
+                          f"(or no placement was found within {variants.PLACEABLE_STEPS} search steps)")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Battleship server")
+    parser.add_argument('--config', help=f"JSON config file (or {ENV_PREFIX}CONFIG)")
+    parser.add_argument('--profile', choices=sorted(PROFILES), help=f"preset (or {ENV_PREFIX}PROFILE)")
+    for option in OPTIONS:
+        parser.add_argument('--' + option.name.replace('_', '-'), dest=option.name, help=option.help)
+    return parser
+
+
+def load(argv=None, environ=None):
+    """
+    Resolve every option. Raises ConfigError with a readable message on any invalid input.
+    """
+    environ = os.environ if environ is None else environ
+    args = build_parser().parse_args(argv)
+
+    file_values = {}
+    path = args.config or environ.get(ENV_PREFIX + 'CONFIG')
+    if path:
+        try:
+            with open(path) as f:
+                file_values = json.load(f)
+        except (OSError, ValueError) as e:
+            raise ConfigError(f"cannot read config file {path}: {e}")
+        if not isinstance(file_values, dict):
+            raise ConfigError(f"{path}: expected a JSON object")
+
+    profile = args.profile or environ.get(ENV_PREFIX + 'PROFILE') or file_values.pop('profile', None) or 'default'
+    file_values.pop('profile', None)
+    if profile not in PROFILES:
+        raise ConfigError(f"unknown profile '{profile}', choose from {', '.join(sorted(PROFILES))}")
+
+    settings = current()  # the module constants are the defaults
+    _merge(settings, PROFILES[profile], f"profile {profile}")
+    _merge(settings, file_values, path)
+    _merge(settings, {option.name: environ[ENV_PREFIX + option.name.upper()]
+                      for option in OPTIONS if ENV_PREFIX + option.name.upper() in environ}, "environment")
+    _merge(settings, {name: value for name, value in vars(args).items()
+                      if name in OPTIONS_BY_NAME and value is not None}, "command line")
+    _validate(settings)
+    settings['profile'] = profile
+    return settings
+
+
+def current():
+    """
+    The values in effect right now, in the form load() returns.
+    """
+    return {option.name: option.current() for option in OPTIONS}
+
+
+def apply(settings):
+    """
+    Write resolved settings into the module constants. Also used by shard workers, which are
+    fresh processes and need the acceptor's settings.
+    """
+    for option in OPTIONS:
+        setattr(importlib.import_module(option.module), option.attr, settings[option.name])
@@ -0,0 +1,162 @@
+"""
+handoff.py
+
+Zero-downtime restarts, including:
+ - spawn_successor(): starts a new server process (same interpreter, script and arguments, so it
+   reads the configuration afresh) holding one end of a unix socketpair, and waits until it has
+   started its services
+ - send_listener()/send_client(): the old process then passes its listening socket and its idle
+   plain-TCP connections across as file descriptors, each connection with a small JSON record of
+   the client's session (username, tournament sign-up, and any input its reader had already
+   buffered, see take_unread())
+ - inherited_channel()/announce_ready()/receive(): the new process's side, and UnreadInput, which
+   gives the new handler that buffered input before anything else from the connection
+
+A socket keeps its connection when its descriptor moves to another process, so the client just
+carries on talking to the new server: no reconnect, no new handshake. TLS and compressed
+connections carry state (session keys, zlib streams) that cannot move with the descriptor, so
+those clients are asked to reconnect instead.
+"""
+
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+
+HANDOFF_ENV = 'BATTLESHIP_HANDOFF_FD'  # the successor's end of the channel, set in its environment
+READY_TIMEOUT = 30                     # seconds the successor has to start before the restart is called off
+MESSAGE_SIZE = 131072                  # largest session record
+UNREAD_LIMIT = 16384                   # characters of buffered input carried over per client
+
+READY = b'READY'
+
+
+def spawn_successor(script, argv):
+    """
+    Start 'script' with 'argv' as the new server. Returns the channel to it once it is ready,
+    or None if it failed to start (the old server then simply keeps running).
+    """
+    parent_end, child_end = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    env = dict(os.environ)
+    env[HANDOFF_ENV] = str(child_end.fileno())
+    try:
+        process = subprocess.Popen([sys.executable, script] + list(argv), pass_fds=[child_end.fileno()], env=env)
+    except OSError as e:
+        print(f"[ERROR] Could not start the new server process: {e}")
+        parent_end.close()
+        return None
+    finally:
+        child_end.close()
+
+    parent_end.settimeout(READY_TIMEOUT)
+    try:
+        ready = parent_end.recv(len(READY))
+    except OSError:
+        ready = b''
+    if ready != READY:
+        if process.poll() is None:
+            process.terminate()
+        parent_end.close()
+        return None
+    parent_end.settimeout(None)
+    print(f"[INFO] New server process {process.pid} is ready")
+    return parent_end
+
+
+def _send(channel, record, fds=()):
+    socket.send_fds(channel, [json.dumps(record).encode()], list(fds))
+
+
+def send_listener(channel, listener):
+    _send(channel, {'kind': 'listener'}, [listener.fileno()])
+
+
+def send_client(channel, conn, session):
+    """
+    session: JSON-able dict describing the client, handed to the successor with the connection.
+    """
+    _send(channel, dict(session, kind='client'), [conn.fileno()])
+
+
+def take_unread(rfile, conn, limit=UNREAD_LIMIT):
+    """
+    Everything 'rfile' has buffered past the line just handled, plus whatever has arrived on 'conn'
+    meanwhile, without waiting for more. Descriptors only carry what the kernel holds, so this goes
+    into the session record instead of being lost with this process's reader.
+    """
+    parts, size = [], 0
+    conn.setblocking(False)  # readline() then returns '' once nothing is left instead of waiting
+    try:
+        while size < limit:
+            line = rfile.readline()
+            if not line:
+                break
+            parts.append(line)
+            size += len(line)
+    except (OSError, ValueError, TypeError):
+        pass
+    finally:
+        conn.setblocking(True)  # the flag belongs to the connection, which the new process inherits
+    return "".join(parts)
+
+
+def send_done(channel):
+    _send(channel, {'kind': 'done'})
+    channel.close()
+
+
+# --- Successor side ---
+
+def inherited_channel():
+    """
+    The channel from the old server if this process was started by spawn_successor(), else None.
+    """
+    fd = os.environ.pop(HANDOFF_ENV, None)
+    if not fd:
+        return None
+    return socket.socket(fileno=int(fd))
+
+
+def announce_ready(channel):
+    channel.send(READY)
+
+
+def receive(channel):
+    """
+    The next (record, socket) from the old server, socket None for records without one.
+    (None, None) once the old server is done or has gone away.
+    """
+    try:
+        msg, fds, _flags, _addr = socket.recv_fds(channel, MESSAGE_SIZE, 1)
+    except OSError:
+        return None, None
+    if not msg:
+        return None, None
+    record = json.loads(msg)
+    if record['kind'] == 'done':
+        return None, None
+    return record, (socket.socket(fileno=fds[0]) if fds else None)
+
+
+class UnreadInput:
+    """
+    A handed-over client's reader: the input the old process had buffered (see take_unread()),
+    then the connection itself.
+    """
+
+    def __init__(self, text, rfile):
+        self.unread = io.StringIO(text)
+        self.rfile = rfile
+
+    def readline(self):
+        line = self.unread.readline()
+        if not line:
+            return self.rfile.readline()
+        if not line.endswith('\n'):
+            line += self.rfile.readline()  # the old process only got the start of this line
+        return line
+
+    def close(self):
+        self.rfile.close()
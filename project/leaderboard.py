@@ -0,0 +1,231 @@
+"""
+leaderboard.py
+
+The LEADERBOARD command's ranking, including:
+ - IndexableSkipList: a sorted list where insert, remove, "how many items are smaller" and "the
+   i-th item" are all O(log n). Every link also stores its width (how many items it skips), which
+   is what makes positions cheap to find
+ - Leaderboard: one entry per player, ordered by wins (then fewer losses, then name), updated by a
+   remove and an insert whenever one of their matches is written, and answering top-K and
+   "my rank" queries in O(log n + K)
+ - A cache of the rendered top-K text. An update only clears it when the player's old or new
+   position is inside the cached rows, so once the top is settled, thousands of spectators asking
+   for it are served the same string
+
+It is filled from the stats database at startup (see stats.py) and kept current from the stats
+writer thread, so finishing a match never touches it on the game thread.
+"""
+
+import random
+import threading
+
+LEADERBOARD_SIZE = 10    # rows shown by a plain LEADERBOARD
+LEADERBOARD_MAX = 100    # most rows a client may ask for
+MAX_LEVELS = 24          # enough for millions of players
+
+
+class _End:
+    """
+    Key of the sentinel after the last node: larger than any real key.
+    """
+    __slots__ = ()
+
+    def __lt__(self, other):
+        return False
+
+    def __le__(self, other):
+        return False
+
+
+class _Node:
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, next, width):
+        self.key = key
+        self.next = next     # following node on each level
+        self.width = width   # items skipped by the link on each level (1 on the bottom level)
+
+
+class IndexableSkipList:
+    def __init__(self, levels=MAX_LEVELS, seed=None):
+        self.levels = levels
+        self.end = _Node(_End(), [], [])
+        self.head = _Node(None, [self.end] * levels, [1] * levels)
+        self.size = 0
+        self.random = random.Random(seed)  # own generator, so game randomness is not disturbed
+
+    def __len__(self):
+        return self.size
+
+    def _level(self):
+        # Each level holds about half the nodes of the one below
+        level = 1
+        while level < self.levels and self.random.random() < 0.5:
+            level += 1
+        return level
+
+    def insert(self, key):
+        chain = [None] * self.levels
+        steps_at_level = [0] * self.levels
+        node = self.head
+        for level in reversed(range(self.levels)):
+            while node.next[level].key <= key:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        height = self._level()
+        new = _Node(key, [None] * height, [None] * height)
+        steps = 0
+        for level in range(height):
+            previous = chain[level]
+            new.next[level] = previous.next[level]
+            previous.next[level] = new
+            new.width[level] = previous.width[level] - steps
+            previous.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(height, self.levels):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, key):
+        chain = [None] * self.levels
+        node = self.head
+        for level in reversed(range(self.levels)):
+            while node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+        target = chain[0].next[0]
+        if target is self.end or target.key != key:
+            raise KeyError(key)
+
+        for level in range(len(target.next)):
+            previous = chain[level]
+            previous.width[level] += target.width[level] - 1
+            previous.next[level] = target.next[level]
+        for level in range(len(target.next), self.levels):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+    def index(self, key):
+        """
+        Number of keys smaller than 'key', i.e. its 0-based position if present.
+        """
+        position = 0
+        node = self.head
+        for level in reversed(range(self.levels)):
+            while node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        return position
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.size:
+            raise IndexError(i)
+        node = self.head
+        i += 1
+        for level in reversed(range(self.levels)):
+            while node.width[level] <= i:
+                i -= node.width[level]
+                node = node.next[level]
+        return node.key
+
+    def first(self, k):
+        """
+        The k smallest keys, in order.
+        """
+        keys = []
+        node = self.head.next[0]
+        while node is not self.end and len(keys) < k:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+
+def _key(username, wins, losses):
+    return (-wins, losses, username)
+
+
+class Leaderboard:
+    def __init__(self):
+        self.ranking = IndexableSkipList()
+        self.records = {}      # username -> (wins, losses)
+        self.lock = threading.Lock()
+        self.texts = {}        # k -> rendered top-k text
+        self.cached_rows = 0   # rows covered by self.texts
+
+    def load(self, rows):
+        """
+        rows: (username, wins, losses) for every player, e.g. StatsStore.all_players().
+        """
+        with self.lock:
+            for username, wins, losses in rows:
+                self._set(username, wins, losses)
+
+    def _set(self, username, wins, losses):
+        old = self.records.get(username)
+        lowest = None
+        if old is not None:
+            old_key = _key(username, *old)
+            lowest = self.ranking.index(old_key)
+            self.ranking.remove(old_key)
+        new_key = _key(username, wins, losses)
+        self.ranking.insert(new_key)
+        self.records[username] = (wins, losses)
+
+        # Rows above both positions did not move, so cached text that ends above them is still right
+        position = self.ranking.index(new_key)
+        lowest = position if lowest is None else min(lowest, position)
+        if lowest < self.cached_rows:
+            self.texts.clear()
+            self.cached_rows = 0
+
+    def apply(self, results):
+        """
+        Stats writer hook: results is a batch of committed stats.MatchResult.
+        """
+        with self.lock:
+            for result in results:
+                for index in (0, 1):
+                    if not result.rated[index]:
+                        continue
+                    username = result.usernames[index]
+                    wins, losses = self.records.get(username, (0, 0))
+                    outcome = result.outcome(index)
+                    self._set(username, wins + (outcome == 'W'), losses + (outcome == 'L'))
+
+    def top(self, k):
+        """
+        [(rank, username, wins, losses)] for the k best players, rank counting from 1.
+        """
+        with self.lock:
+            keys = self.ranking.first(k)
+        return [(rank, username, -wins, losses) for rank, (wins, losses, username) in enumerate(keys, 1)]
+
+    def rank(self, username):
+        """
+        (rank counting from 1, or None if the player has no finished match, number of ranked players).
+        """
+        with self.lock:
+            record = self.records.get(username)
+            if record is None:
+                return None, len(self.ranking)
+            return self.ranking.index(_key(username, *record)) + 1, len(self.ranking)
+
+    def top_text(self, k=LEADERBOARD_SIZE):
+        """
+        The top k as '[LEADERBOARD] ...' lines, rendered once until one of those rows changes.
+        """
+        k = max(1, min(k, LEADERBOARD_MAX))
+        text = self.texts.get(k)
+        if text is not None:
+            return text
+
+        with self.lock:
+            keys = self.ranking.first(k)
+            lines = [f"[LEADERBOARD] {rank:>3}. {username}  {-wins} W / {losses} L"
+                     for rank, (wins, losses, username) in enumerate(keys, 1)]
+            text = "".join(line + "\n" for line in lines) or "[LEADERBOARD] No finished matches yet.\n"
+            self.texts[k] = text
+            self.cached_rows = max(self.cached_rows, k)
+        return text
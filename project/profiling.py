@@ -0,0 +1,206 @@
+"""
+profiling.py
+
+Opt-in profiling for the game loop, client handlers and spectator delivery, including:
+ - phase(name): a context manager that adds the time spent in a block to that phase's totals.
+   While phase timing is off it returns a shared no-op context, so the cost is one global lookup
+ - report()/reset(): the per-phase breakdown (calls, total, mean, max, share of the busy time)
+ - A sampling profiler thread that can be started and stopped at runtime. It periodically looks at
+   every other thread's stack and counts which functions are running, which also shows time spent
+   outside the timed phases
+
+Both are switched at runtime through the ADMIN command (see server.py), so the server never needs
+a restart to look at a slow match. Each process has its own numbers; with shard workers an admin
+connection sees the worker it landed on.
+"""
+
+import contextlib
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+ENABLED = False           # phase timing on at startup
+SAMPLE_INTERVAL = 0.005   # seconds between stack samples
+MIN_SAMPLE_INTERVAL = 0.001  # shorter requested intervals are raised to this, so sampling can't starve the server
+SAMPLE_DEPTH = 30         # frames kept per sampled stack
+
+_NOOP = contextlib.nullcontext()
+_lock = threading.Lock()
+_phases = {}              # name -> [calls, total seconds, max seconds]
+
+
+class _Phase:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+
+
+def phase(name):
+    """
+    Time a block as part of phase 'name':  with profiling.phase("fire_at"): ...
+    """
+    return _Phase(name) if ENABLED else _NOOP
+
+
+def record(name, seconds):
+    with _lock:
+        stats = _phases.get(name)
+        if stats is None:
+            _phases[name] = [1, seconds, seconds]
+        else:
+            stats[0] += 1
+            stats[1] += seconds
+            if seconds > stats[2]:
+                stats[2] = seconds
+
+
+def enable(on=True):
+    global ENABLED
+    ENABLED = on
+
+
+def reset():
+    with _lock:
+        _phases.clear()
+
+
+def report():
+    """
+    The per-phase breakdown as text, slowest total first.
+    """
+    with _lock:
+        rows = sorted(((name, *stats) for name, stats in _phases.items()), key=lambda row: -row[2])
+    if not rows:
+        return "No phases timed" + ("" if ENABLED else " (phase timing is off)") + ".\n"
+
+    # Share of busy time: '.wait' phases (e.g. waiting for a player's move) are idle, not work
+    busy_total = sum(row[2] for row in rows if not row[0].endswith('.wait')) or 1.0
+    lines = [f"{'phase':24}{'calls':>9}{'total s':>10}{'mean ms':>10}{'max ms':>10}{'share':>7}"]
+    for name, calls, total, longest in rows:
+        share = "" if name.endswith('.wait') else f"{total / busy_total:.1%}"
+        lines.append(f"{name:24}{calls:9}{total:10.3f}{total / calls * 1000:10.3f}{longest * 1000:10.3f}{share:>7}")
+    return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler:
+    """
+    Counts, for every sample, the function at the top of each thread's stack (self time) and every
+    function on it (inclusive time). Threads parked in a blocking call show up as that call.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL, depth=SAMPLE_DEPTH):
+        self.interval = interval
+        self.depth = depth
+        self.samples = 0
+        self.self_counts = Counter()
+        self.total_counts = Counter()
+        self.stacks = Counter()     # collapsed stacks, for flame graph tools
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self.started = time.monotonic()
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                names = []
+                while frame is not None and len(names) < self.depth:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if names:
+                    stacks.append(names)
+
+            with self.lock:
+                for names in stacks:
+                    self.self_counts[names[0]] += 1
+                    self.total_counts.update(set(names))
+                    self.stacks[";".join(reversed(names))] += 1
+                self.samples += 1
+
+    def report(self, top=15):
+        with self.lock:
+            lines = [f"{self.samples} samples every {self.interval * 1000:g} ms over "
+                     f"{time.monotonic() - self.started:.1f} s (counts are thread-samples)"]
+            for title, counts in (("self", self.self_counts), ("inclusive", self.total_counts)):
+                lines.append(f"{title:>9}  function")
+                for name, count in counts.most_common(top):
+                    lines.append(f"{count:9}  {name}")
+        return "\n".join(lines) + "\n"
+
+    def dump_stacks(self, path):
+        """
+        Write collapsed stacks ("a;b;c count" per line), the input format of flame graph tools.
+        """
+        with self.lock:
+            stacks = self.stacks.most_common()
+        with open(path, 'w') as f:
+            for stack, count in stacks:
+                f.write(f"{stack} {count}\n")
+
+
+_sampler = None
+
+
+def start_sampling(interval=None):
+    """
+    Start a fresh sampling profiler. Returns False if one is already running.
+    'interval' (seconds) must be finite and positive, raises ValueError otherwise.
+    """
+    global _sampler
+    if interval is not None:
+        if not math.isfinite(interval) or interval <= 0:
+            raise ValueError("sampling interval must be finite and positive")
+        interval = max(interval, MIN_SAMPLE_INTERVAL)
+    with _lock:
+        if _sampler is not None and not _sampler.stop_event.is_set():
+            return False
+        _sampler = SamplingProfiler(interval or SAMPLE_INTERVAL)
+        _sampler.start()
+    return True
+
+
+def stop_sampling():
+    """
+    Stop the running sampler (its results stay available to sampling_report()).
+    Returns False if none was running.
+    """
+    sampler = _sampler
+    if sampler is None or sampler.stop_event.is_set():
+        return False
+    sampler.stop()
+    return True
+
+
+def sampling_report(top=15):
+    if _sampler is None:
+        return "The sampling profiler has not been started.\n"
+    return _sampler.report(top)
+
+
+def dump_sampled_stacks(path):
+    if _sampler is None:
+        return False
+    _sampler.dump_stacks(path)
+    return True
@@ -0,0 +1,55 @@
+"""
+records.py
+
+Compact record types shared by the server modules, including:
+ - ClientInfo, one per connection, replacing the per-connection dict
+
+Slotted classes have no per-instance __dict__, which matters when the server holds
+tens of thousands of mostly idle connections.
+"""
+
+
+class ClientInfo:
+    """
+    Everything the server keeps about one connected client:
+      - client_id:    unique id (negative for bots)
+      - username:     given username
+      - p:            0 is a spectator, 1 is player1, 2 is player2
+      - input_queue:  queue of client inputs, created when the client takes a player slot
+      - rfile:        read socket connection
+      - wfile:        write socket connection
+      - conn:         connection object
+      - input_flag:   set when server expects and accepts input from clients
+      - bot:          the BotPlayer driving this client, None for humans
+      - last_seen:    time.monotonic() of the last line received
+      - heartbeat:    the client's pending heartbeat Timer
+      - transport:    'tcp', 'tls', 'tcp+zlib' or 'tls+zlib'
+      - match:        the running flag (Event) of the game the client is playing in, None otherwise
+      - match_chat:   the chat channel of that game ("CHAT #match ..." posts there), None otherwise
+      - expect:       what the client's current prompt expects (battleship.EXPECT_*), see parse_move
+      - handoff:      set during a restart to move the client to the new server at its next line
+    """
+    __slots__ = ('client_id', 'username', 'p', 'input_queue', 'rfile', 'wfile', 'conn', 'input_flag', 'bot',
+                 'last_seen', 'heartbeat', 'transport', 'match', 'match_chat', 'expect', 'handoff')
+
+    def __init__(self, client_id, username, input_queue, input_flag, rfile=None, wfile=None, conn=None, p=0, bot=None,
+                 transport='tcp'):
+        self.client_id = client_id
+        self.username = username
+        self.p = p
+        self.input_queue = input_queue
+        self.rfile = rfile
+        self.wfile = wfile
+        self.conn = conn
+        self.input_flag = input_flag
+        self.bot = bot
+        self.last_seen = 0.0
+        self.heartbeat = None
+        self.transport = transport
+        self.match = None
+        self.match_chat = None
+        self.expect = None
+        self.handoff = False
+
+    def __repr__(self):
+        return f"ClientInfo({self.client_id}, {self.username!r}, p={self.p})"
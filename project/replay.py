@@ -0,0 +1,328 @@
+"""
+replay.py
+
+Recording and playback of finished two-player games, including:
+ - MatchRecorder, which the game loop feeds with both fleets and every shot
+ - A compact, indexed on-disk format (one .bsr file per match, layout below)
+ - Replay, which can rebuild the boards at any move and stream a match to a client at any speed
+   without starting a live game thread
+
+File layout (all integers little-endian):
+    header     magic b'BSR2', board size, snapshot interval, shot count, winner, offsets of the
+               shots and snapshots sections, then both usernames (length-prefixed utf-8) and the
+               seed of the match's random generator (8 bytes; BSR1 files have no seed)
+    fleets     for each player: ship count, then per ship its name and its cells (r * size + c)
+    shots      fixed 4-byte records: shooter, cell, result code
+    snapshots  both hidden grids (size * size bytes each) after every SNAPSHOT_INTERVAL shots
+
+Because shots and snapshots are fixed-size records, seeking to move N means reading one
+snapshot and at most SNAPSHOT_INTERVAL - 1 shots, no matter how long the match was.
+"""
+
+import os
+import struct
+import threading
+import time
+
+from battleship import Board, Ship, render_board, SHIP, WATER
+
+REPLAY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'replays')
+REPLAY_EXT = '.bsr'
+SNAPSHOT_INTERVAL = 16
+REPLAY_SPEED = 2.0  # moves per second when streaming, 0 means as fast as possible
+
+MAGIC = b'BSR2'
+MAGIC_NO_SEED = b'BSR1'               # replays written before seeds were recorded
+HEADER = struct.Struct('<4sBBHBII')   # magic, size, interval, shots, winner, shots offset, snapshots offset
+SEED = struct.Struct('<Q')
+SHOT = struct.Struct('<BHB')          # shooter, cell, result
+
+# Shot result codes
+RESULT_MISS = 0
+RESULT_HIT = 1
+RESULT_SUNK = 2
+RESULT_ALREADY_SHOT = 3
+
+_match_counter = 0
+_counter_lock = threading.Lock()
+
+
+def new_match_id():
+    """
+    Unique per process and sortable by start time, e.g. '20250412153000-4242-3'.
+    """
+    global _match_counter
+    with _counter_lock:
+        _match_counter += 1
+        count = _match_counter
+    return f"{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}-{count}"
+
+
+def _pack_str(text):
+    data = text.encode('utf-8')[:255]
+    return struct.pack('<B', len(data)) + data
+
+
+def _unpack_str(buf, offset):
+    length = buf[offset]
+    return buf[offset + 1:offset + 1 + length].decode('utf-8'), offset + 1 + length
+
+
+def _result_code(result, sunk_name):
+    if result == 'hit':
+        return RESULT_SUNK if sunk_name else RESULT_HIT
+    if result == 'miss':
+        return RESULT_MISS
+    return RESULT_ALREADY_SHOT
+
+
+class MatchRecorder:
+    """
+    Collects one match as it is played. Nothing is written until save() is called.
+    Shots are packed straight into their on-disk 4-byte form, so a live match costs a few
+    hundred bytes of history rather than a tuple per shot.
+    """
+    __slots__ = ('match_id', 'usernames', 'seed', 'boards', 'fleets', 'shot_count', 'shots', 'snapshots',
+                 'winner')
+
+    def __init__(self, match_id, usernames):
+        self.match_id = match_id
+        self.usernames = usernames   # (player 1, player 2)
+        self.seed = 0                # seed of the match's random generator, set by the game
+        self.boards = None
+        self.fleets = None
+        self.shot_count = 0
+        self.shots = bytearray()     # packed SHOT records
+        self.snapshots = []          # bytes, both hidden grids
+        self.winner = 0              # 0 = unfinished, otherwise 1 or 2
+
+    def start(self, board1, board2):
+        """
+        Record both fleets once placement is done (before any shot removes positions).
+        """
+        self.boards = (board1, board2)
+        self.fleets = [
+            [(ship.name, sorted(r * board.size + c for r, c in ship.positions))
+             for ship in board.placed_ships]
+            for board in self.boards
+        ]
+
+    def shot(self, shooter, row, col, result, sunk_name):
+        size = self.boards[0].size
+        self.shots += SHOT.pack(shooter, row * size + col, _result_code(result, sunk_name))
+        self.shot_count += 1
+        if self.shot_count % SNAPSHOT_INTERVAL == 0:
+            self.snapshots.append(b''.join(_grid_bytes(board) for board in self.boards))
+
+    def finish(self, winner):
+        self.winner = winner
+
+    def totals(self):
+        """
+        ([shots by player 1, by player 2], [hits by player 1, by player 2]).
+        """
+        shots, hits = [0, 0], [0, 0]
+        for shooter, _, code in SHOT.iter_unpack(self.shots):
+            shots[shooter - 1] += 1
+            hits[shooter - 1] += code in (RESULT_HIT, RESULT_SUNK)
+        return shots, hits
+
+    def save(self, directory=None):
+        """
+        Write the match to disk. Matches that never got past ship placement are not kept.
+        Returns the path written, or None.
+        """
+        if self.fleets is None:
+            return None
+        directory = directory or REPLAY_DIR
+
+        body = bytearray(_pack_str(self.usernames[0]) + _pack_str(self.usernames[1]) + SEED.pack(self.seed))
+        for fleet in self.fleets:
+            body += struct.pack('<B', len(fleet))
+            for name, cells in fleet:
+                body += _pack_str(name)
+                body += struct.pack(f'<B{len(cells)}H', len(cells), *cells)
+
+        shots_offset = HEADER.size + len(body)
+        body += self.shots
+        snapshots_offset = HEADER.size + len(body)
+        for snapshot in self.snapshots:
+            body += snapshot
+
+        header = HEADER.pack(MAGIC, self.boards[0].size, SNAPSHOT_INTERVAL, self.shot_count,
+                             self.winner, shots_offset, snapshots_offset)
+
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, self.match_id + REPLAY_EXT)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(header)
+            f.write(body)
+        os.replace(tmp_path, path)  # readers never see a half-written replay
+        return path
+
+
+def _grid_bytes(board):
+    return b''.join(board.hidden_grid)
+
+
+class Replay:
+    """
+    Read-only view of a recorded match. Files are checked as they are opened, so a truncated or
+    corrupt one raises ValueError here rather than failing half way through a stream.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.buf = f.read()
+        try:
+            self._parse(path)
+        except (struct.error, IndexError, UnicodeDecodeError) as e:
+            raise ValueError(f"Corrupt replay file {os.path.basename(path)}: {e}") from None
+
+    def _parse(self, path):
+        (magic, self.size, self.interval, self.shot_count, self.winner,
+         self.shots_offset, self.snapshots_offset) = HEADER.unpack_from(self.buf, 0)
+        if magic not in (MAGIC, MAGIC_NO_SEED):
+            raise ValueError(f"Not a replay file: {path}")
+
+        offset = HEADER.size
+        name1, offset = _unpack_str(self.buf, offset)
+        name2, offset = _unpack_str(self.buf, offset)
+        self.usernames = (name1, name2)
+        self.seed = None
+        if magic == MAGIC:
+            (self.seed,) = SEED.unpack_from(self.buf, offset)
+            offset += SEED.size
+
+        self.fleets = []
+        for _ in range(2):
+            ship_count = self.buf[offset]
+            offset += 1
+            fleet = []
+            for _ in range(ship_count):
+                name, offset = _unpack_str(self.buf, offset)
+                cell_count = self.buf[offset]
+                cells = struct.unpack_from(f'<{cell_count}H', self.buf, offset + 1)
+                offset += 1 + 2 * cell_count
+                fleet.append((name, cells))
+            self.fleets.append(fleet)
+
+        self._check(path)
+
+    def _check(self, path):
+        # Everything stream() and boards_at() will index must be in range
+        cells = self.size * self.size
+        problem = None
+        if not 1 <= self.size <= 26 or self.interval < 1 or self.winner > 2:
+            problem = "bad header"
+        elif self.shots_offset + self.shot_count * SHOT.size > len(self.buf):
+            problem = "shots section is cut short"
+        elif self.snapshots_offset + (self.shot_count // self.interval) * 2 * cells > len(self.buf):
+            problem = "snapshots section is cut short"
+        elif any(cell >= cells for fleet in self.fleets for _, ship in fleet for cell in ship):
+            problem = "ship outside the board"
+        else:
+            for n in range(self.shot_count):
+                shooter, cell, code = SHOT.unpack_from(self.buf, self.shots_offset + n * SHOT.size)
+                if shooter not in (1, 2) or cell >= cells or code > RESULT_ALREADY_SHOT:
+                    problem = f"bad shot record {n}"
+                    break
+        if problem:
+            raise ValueError(f"Corrupt replay file {os.path.basename(path)}: {problem}")
+
+    def shot(self, n):
+        """
+        Shot number n (0-based) as (shooter, row, col, result code), read in O(1).
+        """
+        shooter, cell, code = SHOT.unpack_from(self.buf, self.shots_offset + n * SHOT.size)
+        return shooter, cell // self.size, cell % self.size, code
+
+    def _board_from_grid(self, fleet, grid):
+        board = Board(self.size)
+        for r in range(self.size):
+            row = bytearray(grid[r * self.size:(r + 1) * self.size])
+            board.hidden_grid[r] = row
+            board.display_grid[r] = row.replace(b'S', b'.')
+        for name, cells in fleet:
+            positions = {(cell // self.size, cell % self.size) for cell in cells}
+            # Cells already hit are no longer part of the ship's remaining positions
+            board.placed_ships.append(Ship(name, {(r, c) for r, c in positions if board.hidden_grid[r][c] == SHIP}))
+        return board
+
+    def boards_at(self, move):
+        """
+        Rebuild (board1, board2) as they were after 'move' shots.
+        Starts from the nearest snapshot, so the cost is bounded by the snapshot interval.
+        """
+        move = max(0, min(move, self.shot_count))
+        snap = move // self.interval
+        if snap == 0:
+            boards = []
+            for fleet in self.fleets:
+                grid = bytearray([WATER]) * (self.size * self.size)
+                for _, cells in fleet:
+                    for cell in cells:
+                        grid[cell] = SHIP
+                boards.append(self._board_from_grid(fleet, grid))
+        else:
+            grid_len = self.size * self.size
+            start = self.snapshots_offset + (snap - 1) * 2 * grid_len
+            data = self.buf[start:start + 2 * grid_len]
+            boards = [self._board_from_grid(self.fleets[0], data[:grid_len]),
+                      self._board_from_grid(self.fleets[1], data[grid_len:])]
+
+        for n in range(snap * self.interval, move):
+            shooter, row, col, _ = self.shot(n)
+            boards[2 - shooter].fire_at(row, col)  # player 1 fires at board 2 and vice versa
+        return boards[0], boards[1]
+
+    def stream(self, wfile, speed=None, start=0, stop_event=None):
+        """
+        Send the match to a client from move 'start', one shot at a time, 'speed' moves per second.
+        """
+        speed = REPLAY_SPEED if speed is None else speed
+        boards = list(self.boards_at(start))
+        seed = "" if self.seed is None else f", seed {self.seed}"
+        wfile.write(f"[REPLAY] {self.usernames[0]} vs {self.usernames[1]}, "
+                    f"{self.shot_count} shots{seed}, starting at move {start}\n")
+        wfile.flush()
+
+        delay = 1.0 / speed if speed > 0 else 0
+        names = {RESULT_MISS: "MISS", RESULT_HIT: "HIT", RESULT_SUNK: "HIT", RESULT_ALREADY_SHOT: "ALREADY SHOT"}
+        for n in range(start, self.shot_count):
+            if stop_event is not None and stop_event.is_set():
+                return
+            shooter, row, col, code = self.shot(n)
+            target = boards[2 - shooter]
+            _, sunk_name = target.fire_at(row, col)
+            line = f"[REPLAY] Move {n + 1}: Player {shooter} fires at {chr(ord('A') + row)}{col + 1}: {names[code]}"
+            if sunk_name:
+                line += f" (sank the {sunk_name})"
+            wfile.write(line + '\n' + render_board(target))
+            wfile.flush()
+            if delay:
+                time.sleep(delay)
+
+        if self.winner:
+            wfile.write(f"[REPLAY] Winner: Player {self.winner} ({self.usernames[self.winner - 1]})\n")
+        wfile.write("[REPLAY] End of replay.\n")
+        wfile.flush()
+
+
+def list_replays(directory=None):
+    """
+    Match ids of all saved replays, newest first.
+    """
+    directory = directory or REPLAY_DIR
+    if not os.path.isdir(directory):
+        return []
+    ids = [name[:-len(REPLAY_EXT)] for name in os.listdir(directory) if name.endswith(REPLAY_EXT)]
+    return sorted(ids, reverse=True)
+
+
+def open_replay(match_id, directory=None):
+    # Match ids come from clients, so never let them escape the replay directory
+    if os.path.basename(match_id) != match_id or not match_id:
+        raise ValueError(f"Invalid match id: {match_id}")
+    return Replay(os.path.join(directory or REPLAY_DIR, match_id + REPLAY_EXT))
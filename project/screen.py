@@ -0,0 +1,257 @@
+"""
+screen.py
+
+In-place terminal view for `client.py --screen`, including:
+ - ScreenState: what the server has told us so far (both boards, the match status and score, and
+   recent messages), fed one line or GRID block at a time by the client's receiver thread
+ - AnsiScreen: draws that state into a fixed layout with ANSI escape codes, writing only the
+   characters that changed since the previous frame instead of scrolling whole boards past
+ - A refresh thread that coalesces bursts of updates into at most one frame per REFRESH_INTERVAL,
+   so a busy spectator feed costs one small terminal write per interval however fast it arrives
+ - Messages live in a terminal scrolling region, so a new message is one line written at the
+   bottom of it rather than every message line redrawn one row higher
+
+Which board a GRID block belongs to is taken from the line before it when that says so
+(snapshots, a spectator's "Player N: HIT!", replays); otherwise, as for a player's own view, the
+block goes to the board it could have grown from with the fewest new shots.
+"""
+
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from collections import deque
+
+REFRESH_INTERVAL = 1 / 30   # seconds, at most one frame per interval
+MESSAGE_HISTORY = 200
+BOARD_GAP = 6               # columns between the two boards
+BOARD_ROWS = 10             # rows kept for a board before the first one arrives
+
+ESC = "\x1b["
+SAVE_CURSOR = "\x1b7"
+RESTORE_CURSOR = "\x1b8"
+
+_PLAYER_BOARD = re.compile(r"Player ([12])'s board")
+_SHOT_BY = re.compile(r"Player ([12])(?:: | fires at | sank the | ran out of time)")
+_YOU_ARE = re.compile(r"^You are Player ([12])\.")
+
+
+class ScreenState:
+    """
+    The model behind the screen. Boards are lists of rows of single-character cells.
+    All methods are called from the receiver thread; the renderer reads under the same lock.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.boards = {1: None, 2: None}
+        self.status = "Connecting..."
+        self.score = ""
+        self.messages = deque(maxlen=MESSAGE_HISTORY)
+        self.message_count = 0      # messages ever added, so the screen knows how many are new
+        self.me = None              # our player number while we are playing
+        self.next_board = None      # board number the next GRID block belongs to, if known
+
+    def line(self, text):
+        with self.lock:
+            self._line(text)
+
+    def _line(self, text):
+        if text.startswith("[SNAPSHOT] "):
+            body = text[len("[SNAPSHOT] "):]
+            label = _PLAYER_BOARD.search(body)
+            if label:
+                self.next_board = int(label.group(1))
+            elif body.startswith("Score:"):
+                self.score = body
+            else:
+                self.status = body
+            return
+
+        you = _YOU_ARE.match(text)
+        if you or text == "Game has started" or (text.startswith("[REPLAY] ") and " vs " in text):
+            # A new match or replay: forget the previous boards
+            self.boards = {1: None, 2: None}
+            self.score = ""
+            self.me = int(you.group(1)) if you else None
+            self.next_board = None
+        if text.startswith(("Turn:", "Waiting for player", "Wait for player", "Enter coordinate")):
+            self.status = text
+
+        # Spectators and replays get the target board right after each shot's result
+        shot = _SHOT_BY.search(text)
+        if shot and self.me is None:
+            self.next_board = 3 - int(shot.group(1))
+        self.messages.append(text)
+        self.message_count += 1
+
+    def grid(self, rows):
+        """
+        rows: the GRID block's lines after "GRID" (column header first).
+        """
+        cells = [row.split()[1:] for row in rows[1:] if row.strip()]
+        with self.lock:
+            number = self.next_board or self._closest_board(cells)
+            self.next_board = None
+            self.boards[number] = cells
+
+    def _closest_board(self, cells):
+        # Marks are only ever added, so a board can only have become 'cells' if every mark it
+        # already had is still there. Of those, pick the one needing the fewest new marks.
+        best, best_added = None, None
+        for number in self._preferred_order():
+            board = self.boards[number]
+            added = _marks_added(board, cells)
+            if added is not None and (best_added is None or added < best_added):
+                best, best_added = number, added
+        return best or self._preferred_order()[0]
+
+    def _preferred_order(self):
+        # A player mostly sees the opponent's board, so that one wins ties
+        if self.me:
+            return [3 - self.me, self.me]
+        return [1, 2]
+
+
+def _marks_added(board, cells):
+    if board is None:
+        return sum(cell != '.' for row in cells for cell in row)
+    if len(board) != len(cells):
+        return None
+    added = 0
+    for old_row, new_row in zip(board, cells):
+        if len(old_row) != len(new_row):
+            return None
+        for old, new in zip(old_row, new_row):
+            if old != new:
+                if old != '.':
+                    return None
+                added += 1
+    return added
+
+
+class AnsiScreen:
+    """
+    Fixed layout, top to bottom: status, score, the two boards side by side, recent messages,
+    and the input line, where the cursor is kept while the user types.
+    """
+
+    def __init__(self, state, out=None, interval=REFRESH_INTERVAL):
+        self.state = state
+        self.out = out or sys.stdout
+        self.interval = interval
+        self.previous = None        # lines of the last frame drawn, None forces a full redraw
+        self.size = None
+        self.shown = 0              # state.message_count when messages were last drawn
+        self.dirty = threading.Event()
+        self.running = True
+        if os.name == 'nt':
+            os.system('')           # switches the Windows console to ANSI mode
+        self.thread = threading.Thread(target=self._run, name="screen", daemon=True)
+        self.thread.start()
+
+    # Called by the receiver thread
+    def line(self, text):
+        self.state.line(text)
+        self.dirty.set()
+
+    def grid(self, rows):
+        self.state.grid(rows)
+        self.dirty.set()
+
+    def input_done(self):
+        """
+        Called after the user pressed Enter: the echoed newline scrolled the terminal, so the
+        next frame is drawn from scratch.
+        """
+        self.previous = None
+        self.dirty.set()
+
+    def close(self):
+        self.running = False
+        self.dirty.set()
+        self.thread.join(timeout=1)
+        rows = self.size[1] if self.size else 24
+        self.out.write(f"{ESC}r{ESC}{rows};1H\n")   # reset the scrolling region
+        self.out.flush()
+
+    def _run(self):
+        while self.running:
+            self.dirty.wait()
+            self.dirty.clear()
+            if not self.running:
+                return
+            self.render()
+            time.sleep(self.interval)  # anything arriving meanwhile is drawn in the next frame
+
+    def compose(self, width):
+        """
+        The lines above the message area. Returns (lines, messages, message_count).
+        """
+        state = self.state
+        with state.lock:
+            boards = [(n, state.boards[n]) for n in (1, 2)]
+            status, score = state.status, state.score
+            messages = list(state.messages)
+            count, me = state.message_count, state.me
+
+        lines = [f"Battleship | {status}", score, ""]
+        size = max((len(board) for _, board in boards if board), default=BOARD_ROWS)
+        columns = []
+        for number, board in boards:
+            column = [f"Player {number}'s board" + (" (you)" if number == me else "")]
+            if board:
+                column.append("  " + "".join(str(c + 1).rjust(3) for c in range(len(board[0]))))
+                for r, row in enumerate(board):
+                    column.append(f"{chr(ord('A') + r):2}" + "".join(cell.rjust(3) for cell in row))
+            else:
+                column.append("  (no board yet)")
+            columns.append(column + [""] * (size + 2 - len(column)))
+        left_width = max(len(text) for text in columns[0]) + BOARD_GAP
+        for left, right in zip(*columns):
+            lines.append(left.ljust(left_width) + right)
+        lines.append("-" * width)
+        return [text[:width].ljust(width) for text in lines], messages, count
+
+    def render(self):
+        columns, rows = shutil.get_terminal_size()
+        width, height = max(20, columns - 1), max(10, rows)
+        frame, messages, count = self.compose(width)
+        top, bottom = len(frame) + 1, height - 1   # rows of the message area
+
+        out = [SAVE_CURSOR]         # the cursor sits where the user is typing
+        if self.previous is None or self.size != (width, height) or len(self.previous) != len(frame):
+            # Messages scroll inside their own region; the input line is below it
+            out.append(f"{ESC}2J{ESC}{top};{bottom}r")
+            if bottom >= top:
+                for r, text in enumerate(messages[-(bottom - top + 1):]):
+                    out.append(f"{ESC}{top + r};1H{text[:width]}")
+            out.append(f"{ESC}{height};1H> {SAVE_CURSOR}")
+            self.previous = [" " * width] * len(frame)
+            self.size = (width, height)
+        elif bottom >= top:
+            # New messages: let the terminal scroll the region, then write just those lines
+            new = min(count - self.shown, bottom - top + 1)
+            for text in (messages[-new:] if new > 0 else []):
+                out.append(f"{ESC}{bottom};1H\n{text[:width]}")
+        self.shown = count
+
+        for r, (old, new) in enumerate(zip(self.previous, frame)):
+            if old == new:
+                continue
+            # Write each run of changed characters, not the whole line
+            c = 0
+            while c < width:
+                if old[c] == new[c]:
+                    c += 1
+                    continue
+                start = c
+                while c < width and old[c] != new[c]:
+                    c += 1
+                out.append(f"{ESC}{r + 1};{start + 1}H{new[start:c]}")
+        out.append(RESTORE_CURSOR)  # back to the input line
+        self.out.write("".join(out))
+        self.out.flush()
+        self.previous = frame
@@ -1,45 +1,196 @@
+import atexit
+import hmac
+import math
+import os
+import signal
 import socket
+import sys
 import threading
 from queue import Queue
-from battleship import run_two_player_game_online
+import config
+from battleship import run_two_player_game_online, parse_move, new_seed, DISCONNECTED
+import broadcast
+from broadcast import Broadcaster, NullFeed
+import chat as chat_service
+from chat import ChatService, LOBBY, MATCH, match_channel
+from ai import BotPlayer
+from records import ClientInfo
+import timers
+from timers import TimerWheel
+import handoff
+from replay import MatchRecorder, new_match_id, list_replays, open_replay
+import stats as stats_store
+from stats import StatsStore, MatchResult
+import leaderboard as leaderboard_ranking
+from leaderboard import Leaderboard
+import profiling
+import tournament
+from tournament import Tournament
+import transport
+from shard import run_sharded, EVENT_LEAVE, EVENT_GAME_START, EVENT_GAME_END
 import time
 
 HOST = '127.0.0.1'
 PORT = 50046
+WORKERS = 1  # worker processes, more than 1 shards games across processes (see shard.py)
+
+# Admission control
+LISTEN_BACKLOG = 128           # pending connections the kernel queues for accept()
+MAX_CONNECTIONS = 10000        # connected clients (each has a handler thread)
+MAX_PENDING_HANDSHAKES = 256   # connections that have not sent a username yet
+HANDSHAKE_TIMEOUT = 10         # seconds a new connection has to send its username
+OVERLOAD_MESSAGE = "SERVER BUSY: too many connections, please try again later.\n"
+
+# Socket options as (level, option, value)
+LISTEN_SOCKET_OPTIONS = [
+    (socket.SOL_SOCKET, socket.SO_REUSEADDR, 1),  # restart without waiting for TIME_WAIT
+]
+CLIENT_SOCKET_OPTIONS = [
+    (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),  # short line-based messages, don't batch them
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),  # let the kernel notice peers that vanished
+]
+# TCP keepalive timing (Linux names, not available everywhere)
+if hasattr(socket, 'TCP_KEEPIDLE'):
+    CLIENT_SOCKET_OPTIONS += [
+        (socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 60),   # idle seconds before the first probe
+        (socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 10),  # seconds between probes
+        (socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3),     # failed probes before the connection drops
+    ]
+
+# Optional TLS: set both to PEM files to accept only TLS connections (see transport.py)
+TLS_CERT = None
+TLS_KEY = None
+# Whether clients may switch their connection to zlib compression
+COMPRESSION = True
+
+# Shared secret for ADMIN commands (profiling), None disables them
+ADMIN_TOKEN = None
+# Where ADMIN SAMPLE STACKS writes collapsed stacks for flame graphs
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+
+# Application-level heartbeats: clients idle this long are sent "PING" and must answer "PONG"
+HEARTBEAT_INTERVAL = 15
+# Clients silent for this long (no PONG or any other line) are reaped
+DEAD_PEER_TIMEOUT = 45
+
+# Graceful shutdown and restart: seconds running matches get to finish before they are cut off
+DRAIN_TIMEOUT = 300
+DRAIN_POLL = 0.5    # seconds between checks while draining
+ACCEPT_POLL = 0.5   # seconds accept() waits before checking whether the server still accepts
 
 # Game state flags
 new_game = threading.Event()
 game_active = threading.Event()
 
+# Set whenever the lobby may have something to do: a client queued or left, or a lobby timer fired
+lobby_wakeup = threading.Event()
+
 # Input control flags: [spec, player1, player2]
 input_status_flags = [threading.Event(), threading.Event(), threading.Event()]
 
-# clients contains ditcs for each client coneccted containing
-        # client_id:    unique id
-        # username:     given username
-        # p:            0 is a spectator, 1 is player1, 2 is player2.
-        # input_queue:  queue of client inputs 
-        # rfile:        read socket connection
-        # wfile:        write socket connection
-        # conn:         connection object
-        # input_flag:   set when server expects and accepts input from clients
+# clients contains a ClientInfo record (see records.py) for each client connected
 clients = []
 
 # Queue containing clients 
 id_queue = Queue()
 
+# Spectator feed for the active game, delivered by a pool of broadcast worker threads
+spectators = None
+
+# Lobby and match chat channels, batched by the chat service's flusher thread and written by the broadcast workers
+chat = None
+
+# One timer thread for heartbeats and reaping
+timer_wheel = None
+
+# Per-player stats, written in batches by the store's writer thread
+stats = None
+
+# Ranking by wins, filled from the stats database and updated by the stats writer
+leaderboard = None
+
+# (the five above are created by start_services(), once the configuration has been applied)
+
+# TLS context when TLS_CERT is set, also created by start_services()
+tls_context = None
+
+# Wrapped (TLS or compressed) connections can't be pinged with a raw non-blocking send, so their
+# PINGs are written by one pinger thread instead of the timer thread
+pings = Queue()
+
+# Clients found dead during the current timer tick, reaped together at the end of the tick
+dead_peers = []
+
 # Player client information slots
 player1 = None
 player2 = None
 
+# When player 1 got their slot, used to decide when a bot should fill player 2
+player1_since = 0.0
+
 # Unqiue client identifier
 client_id_counter = 0
+client_id_lock = threading.Lock()
+
+# Admission slots, created by start_services() from the limits above
+connection_slots = None
+handshake_slots = None
+
+# Bots use negative ids so they never collide with real clients
+bot_id_counter = -1
+
+# Seconds player 1 waits alone before a bot takes the player 2 slot (negative disables bots)
+BOT_FILL_DELAY = 20
+
+# Seconds between "next game" announcements to spectators
+ANNOUNCE_INTERVAL = 15
+
+# Tournament sign-ups and the running tournament (one at a time per process)
+tournament_entrants = []
+tournament_lock = threading.Lock()
+active_tournament = None
+
+# Running flag (Event) of each tournament match -> its two players, used when one disconnects
+tournament_games = {}
+
+# Entrants of the running tournament that still have matches to play
+tournament_players = set()
+
+# Channel back to the acceptor process when running as a shard worker (see shard.py)
+shard_channel = None
+shard_lock = threading.Lock()
+
+# The listening socket; 'accepting' keeps its accept loop running, which sets 'accept_stopped' when it ends
+listener = None
+accepting = threading.Event()
+accept_stopped = threading.Event()
+
+# None while serving normally, 'draining' or 'restarting' once begin_shutdown() has been called
+drain_mode = None
+drain_lock = threading.Lock()
+
+# Channel to the new server process during a restart (see handoff.py)
+handoff_channel = None
+
+# Set when a drain or restart is over and the process can exit
+shutdown_complete = threading.Event()
+
+
+# Reports a lobby event to the acceptor so it can route new clients, no-op in single-process mode
+def shard_report(event):
+    if shard_channel is None:
+        return
+    try:
+        with shard_lock:
+            shard_channel.send(event)
+    except OSError:
+        pass
 
 
 # Continually announces who is next in line for a game
 def spectator_announcer():
     while True:
-        time.sleep(15)
+        time.sleep(ANNOUNCE_INTERVAL)
         while True:
             if not game_active.is_set():
                 break
@@ -47,7 +198,7 @@ def spectator_announcer():
             # Clean invalid IDs from queue
             while not id_queue.empty():
                 id_list = list(id_queue.queue)
-                valid_ids = [c['client_id'] for c in clients]
+                valid_ids = [c.client_id for c in clients]
                 if id_list[0] not in valid_ids:
                     id_queue.get()  # remove invalid client
                 else:
@@ -61,17 +212,17 @@ def spectator_announcer():
                 cid1, cid2 = id_list[0], id_list[1]
             elif len(id_list) == 1:
                 cid1 = id_list[0]
-                cid2 = player2['client_id'] if player2 else None
+                cid2 = player2.client_id if player2 else None
             else:
-                cid1 = player1['client_id'] if player1 else None
-                cid2 = player2['client_id'] if player2 else None
+                cid1 = player1.client_id if player1 else None
+                cid2 = player2.client_id if player2 else None
 
             # Get usernames
             for c in clients:
-                if c['client_id'] == cid1:
-                    next1 = c['username']
-                if c['client_id'] == cid2:
-                    next2 = c['username']
+                if c.client_id == cid1:
+                    next1 = c.username
+                if c.client_id == cid2:
+                    next2 = c.username
 
             # If still missing info, skip this cycle
             if not next1 or not next2:
@@ -79,64 +230,475 @@ def spectator_announcer():
 
             msg = f"[INFO] After actve game ends: Next game will be between: {next1} and {next2}\n"
 
-            # Send to all spectators
-            for c in clients:
-                try:
-                    c['wfile'].write(msg)
-                    c['wfile'].flush()
-                except:
-                    continue
+            # Send to all spectators, through their broadcast workers so a stalled one holds nobody up
+            for c in list(clients):
+                spectators.send(c, msg)
             break
 
 
-# Function for handling the "CHAT" Feature
-def send_all(username, message):
-    for c in clients:
-        # Don't send to self
-        if c['username'] == username:
-            continue
+# Handles the "CHAT" feature: "CHAT <message>" goes to the lobby, "CHAT #<channel> <message>" to a channel,
+# where '#match' is the channel of the match the client is playing
+def handle_chat(client_info, text):
+    channel = LOBBY
+    if text.startswith('#'):
+        channel, _, text = text[1:].partition(' ')
+    if channel == MATCH:
+        channel = client_info.match_chat
+    reason = chat.post(client_info, channel, text) if channel else "You are not playing a match."
+    if reason:
+        client_info.wfile.write(f"[CHAT] {reason}\n")
+        client_info.wfile.flush()
+
+
+# Opens the chat channel of a match that is starting and puts both players in it
+def open_match_chat(match_id, players):
+    channel = match_channel(match_id)
+    chat.open(channel, label=MATCH)
+    for player in players:
+        chat.join(channel, player)
+        player.match_chat = channel
+
+
+# Closes a finished match's chat channel
+def close_match_chat(match_id, players):
+    chat.close(match_channel(match_id))
+    for player in players:
+        player.match_chat = None
+
+# Replay streams currently running, client_id -> stop event
+replay_streams = {}
+
+# Handles "REPLAYS" (list saved matches) and "REPLAY <match_id> [speed] [from_move]" / "REPLAY STOP"
+def handle_replay(client_info, args):
+    wfile = client_info.wfile
+    client_id = client_info.client_id
+
+    if not args:
+        ids = list_replays()[:20]
+        wfile.write("[REPLAY] Saved matches: " + (", ".join(ids) if ids else "none") + "\n")
+        wfile.flush()
+        return
+
+    # Stop whatever this client is currently watching
+    stop = replay_streams.pop(client_id, None)
+    if stop:
+        stop.set()
+    if args[0].upper() == 'STOP':
+        return
+
+    if client_info.match is not None and client_info.match.is_set():
+        wfile.write("[REPLAY] You cannot watch a replay during your game.\n")
+        wfile.flush()
+        return
+
+    try:
+        speed = float(args[1]) if len(args) > 1 else None  # None: the configured REPLAY_SPEED
+        start = int(args[2]) if len(args) > 2 else 0
+    except ValueError:
+        speed, start = math.nan, -1
+    if (speed is not None and not (math.isfinite(speed) and speed > 0)) or start < 0:
+        wfile.write("[REPLAY] Usage: REPLAY <match_id> [speed] [from_move], where speed is a finite number of "
+                    "moves per second above 0 and from_move is 0 or more.\n")
+        wfile.flush()
+        return
+
+    try:
+        replay = open_replay(args[0])
+    except (OSError, ValueError) as e:
+        wfile.write(f"[REPLAY] Cannot open replay: {e}\n")
+        wfile.flush()
+        return
+
+    # Replays are streamed by their own thread, no game thread is involved
+    stop = threading.Event()
+    replay_streams[client_id] = stop
+
+    def run():
+        try:
+            replay.stream(wfile, speed, start, stop)
+        except Exception as e:
+            print(f"[ERROR] Replay stream to client {client_id} failed: {e}")
+        finally:
+            if replay_streams.get(client_id) is stop:
+                del replay_streams[client_id]
+
+    threading.Thread(target=run, daemon=True).start()
+
+# Handles "ADMIN <token> PROFILE ON|OFF|RESET|DUMP" (phase timers),
+# "ADMIN <token> SAMPLE START [interval_ms]|STOP|DUMP [top]|STACKS" (sampling profiler) and
+# "ADMIN <token> TOURNAMENT START [format] [matches]|STATUS" (tournaments, see tournament.py) and
+# "ADMIN <token> DRAIN|RESTART [seconds]" (graceful shutdown or restart, see begin_shutdown)
+def handle_admin(client_info, args):
+    wfile = client_info.wfile
+
+    def reply(text):
+        wfile.write("".join(f"[ADMIN] {line}\n" for line in text.rstrip('\n').split('\n')))
+        wfile.flush()
+
+    if not ADMIN_TOKEN or not args or not hmac.compare_digest(args[0].encode(), ADMIN_TOKEN.encode()):
+        print(f"[WARN] Rejected ADMIN command from client {client_info.client_id}")
+        reply("Not authorised.")
+        return
+
+    target = args[1].upper() if len(args) > 1 else ''
+    action = args[2].upper() if len(args) > 2 else ''
+    extra = args[3] if len(args) > 3 else None
+    try:
+        if target == 'PROFILE' and action in ('ON', 'OFF'):
+            profiling.enable(action == 'ON')
+            reply(f"Phase timing {action.lower()}.")
+        elif target == 'PROFILE' and action == 'RESET':
+            profiling.reset()
+            reply("Phase timings cleared.")
+        elif target == 'PROFILE' and action == 'DUMP':
+            report = profiling.report()
+            print(report, end='')
+            reply(report)
+        elif target == 'SAMPLE' and action == 'START':
+            interval = float(extra) / 1000 if extra else None  # start_sampling() rejects nan, inf and <= 0
+            reply("Sampling started." if profiling.start_sampling(interval) else "Sampling is already running.")
+        elif target == 'SAMPLE' and action == 'STOP':
+            reply("Sampling stopped." if profiling.stop_sampling() else "Sampling is not running.")
+        elif target == 'SAMPLE' and action == 'DUMP':
+            report = profiling.sampling_report(int(extra) if extra else 15)
+            print(report, end='')
+            reply(report)
+        elif target == 'TOURNAMENT' and action == 'START':
+            parallel = int(args[4]) if len(args) > 4 else None
+            reply(start_tournament(extra or 'single', parallel))
+        elif target == 'TOURNAMENT' and action == 'STATUS':
+            reply(tournament_status())
+        elif target in ('DRAIN', 'RESTART'):
+            try:
+                timeout = float(action) if action else None
+            except ValueError:
+                timeout = math.nan
+            if timeout is not None and not (math.isfinite(timeout) and timeout >= 0):
+                reply(f"Usage: ADMIN <token> {target} [seconds], where seconds is a finite number, 0 or more.")
+            else:
+                reply(begin_shutdown(target == 'RESTART', timeout))
+        elif target == 'SAMPLE' and action == 'STACKS':
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, f"stacks-{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}.folded")
+            reply(f"Stacks written to {path}" if profiling.dump_sampled_stacks(path) else "No samples yet.")
         else:
+            reply("Usage: ADMIN <token> PROFILE ON|OFF|RESET|DUMP, ADMIN <token> SAMPLE START [ms]|STOP|DUMP [top]|STACKS, "
+                  f"ADMIN <token> TOURNAMENT START [{'|'.join(tournament.FORMATS)}] [matches]|STATUS, "
+                  "or ADMIN <token> DRAIN|RESTART [seconds]")
+    except (OSError, ValueError) as e:
+        reply(f"Failed: {e}")
+
+# Handles "STATS [username]": wins, losses, hit rate and recent matches, from the stats cache
+def handle_stats(client_info, args):
+    username = args[0] if args else client_info.username
+    player = stats.get(username)
+    lines = [f"{username}: {player.matches} matches, {player.wins} wins, {player.losses} losses, "
+             f"{player.shots} shots, {player.hit_rate:.1%} hits"]
+    if player.recent:
+        lines.append("Recent: " + ", ".join(f"{outcome} vs {opponent} ({shots} shots)"
+                                            for outcome, opponent, shots, _ in player.recent))
+    client_info.wfile.write("".join(f"[STATS] {line}\n" for line in lines))
+    client_info.wfile.flush()
+
+
+# Handles "LEADERBOARD [rows]": the cached top rows, plus where the client stands
+def handle_leaderboard(client_info, args):
+    try:
+        rows = int(args[0]) if args else leaderboard_ranking.LEADERBOARD_SIZE
+    except ValueError:
+        rows = leaderboard_ranking.LEADERBOARD_SIZE
+    rank, total = leaderboard.rank(client_info.username)
+    mine = f"You are #{rank} of {total}." if rank else "You are not ranked yet, finish a match first."
+    client_info.wfile.write(leaderboard.top_text(rows) + f"[LEADERBOARD] {mine}\n")
+    client_info.wfile.flush()
+
+
+# Hands a finished match to the stats store without waiting for it to be written.
+# A match abandoned by one player counts as a win for the one who stayed.
+def record_stats(recorder, first, second):
+    present = [c.bot is not None or c in clients for c in (first, second)]
+    winner = recorder.winner
+    if not winner and present[0] != present[1]:
+        winner = 1 if present[0] else 2
+    shots, hits = recorder.totals()
+    stats.record(MatchResult(recorder.match_id, recorder.usernames, winner, shots, hits,
+                             rated=(first.bot is None, second.bot is None)))
+
+
+# Handles "TOURNAMENT JOIN" / "TOURNAMENT LEAVE" (sign up for the next tournament) and "TOURNAMENT" (status)
+def handle_tournament(client_info, args):
+    action = args[0].upper() if args else ''
+    with tournament_lock:
+        if action == 'JOIN':
+            if client_info not in tournament_entrants:
+                tournament_entrants.append(client_info)
+            text = f"You are signed up for the next tournament ({len(tournament_entrants)} signed up)."
+        elif action == 'LEAVE':
+            if client_info in tournament_entrants:
+                tournament_entrants.remove(client_info)
+            text = "You are no longer signed up for the next tournament."
+        else:
+            text = None
+    client_info.wfile.write(f"[TOURNAMENT] {text or tournament_status()}\n")
+    client_info.wfile.flush()
+
+
+# One line describing the running tournament, or the sign-ups for the next one
+def tournament_status():
+    running = active_tournament
+    if running is None:
+        return f"No tournament running, {len(tournament_entrants)} signed up. Send TOURNAMENT JOIN to sign up."
+    return (f"{running.name} tournament: {running.played} matches played, {running.running} in progress, "
+            f"{len(running.ready)} waiting for a free slot.")
+
+
+# Starts a tournament between everyone signed up who is not playing a lobby game right now
+def start_tournament(name, parallel=None):
+    global active_tournament
+    if name not in tournament.FORMATS:
+        return f"Unknown format '{name}', expected one of {', '.join(tournament.FORMATS)}."
+    if parallel is not None and parallel < 1:
+        return f"Parallel matches must be at least 1, not {parallel}."  # checked before entrants leave the queue
+    with tournament_lock:
+        if drain_mode is not None:
+            return "The server is shutting down, no new tournaments."
+        if active_tournament is not None:
+            return "A tournament is already running."
+        signed_up = {c.client_id for c in tournament_entrants}
+
+        # Entrants leave the lobby queue until the tournament is done with them. Whoever is not
+        # in the queue is playing a lobby game right now and stays in the lobby.
+        with id_queue.mutex:
+            taken = {cid for cid in id_queue.queue if cid in signed_up}
+            kept = [cid for cid in id_queue.queue if cid not in taken]
+            id_queue.queue.clear()
+            id_queue.queue.extend(kept)
+        entrants = [c for c in tournament_entrants if c.client_id in taken]
+        if len(entrants) < 2:
+            for c in entrants:
+                id_queue.put(c.client_id)
+            lobby_wakeup.set()
+            return f"Not enough players: {len(entrants)} signed up and free, at least 2 are needed."
+        for c in entrants:
+            tournament_entrants.remove(c)
+        tournament_players.update(entrants)
+        active_tournament = Tournament(name, entrants, play_tournament_match, parallel,
+                                       on_result=tournament_result)
+
+    threading.Thread(target=run_tournament, args=(active_tournament,), name="tournament", daemon=True).start()
+    return f"{name} tournament started with {len(entrants)} players."
+
+
+# Runs a tournament to the end, then announces the champion to everyone
+def run_tournament(running):
+    global active_tournament
+    print(f"[INFO] {running.name} tournament started with {len(running.entrants)} players")
+    try:
+        champion = running.run()
+        standings = ", ".join(f"{c.username} {wins}-{losses}" for c, wins, losses in running.standings())
+        message = f"[TOURNAMENT] {champion.username} won the {running.name} tournament! Standings: {standings}\n"
+        for c in list(clients):
+            spectators.send(c, message)
+        print(f"[INFO] Tournament over after {running.played} matches, won by {champion.username}")
+    except Exception as e:
+        print(f"[ERROR] Tournament failed: {e}")
+    finally:
+        with tournament_lock:
+            active_tournament = None
+            tournament_players.clear()
+
+
+# Tournament scheduler callback: report a result, and send players with nothing left to play back to the lobby
+def tournament_result(match, finished):
+    if match is not None:
+        text = f"[TOURNAMENT] {match.label}: {match.winner.username} beat {match.loser.username}.\n"
+        for c in match.slots:
+            spectators.send(c, text)
+    for c in finished:
+        tournament_players.discard(c)
+        if c not in clients:
+            continue
+        spectators.send(c, "[TOURNAMENT] You have no more tournament matches, back to the lobby queue.\n")
+        id_queue.put(c.client_id)
+    lobby_wakeup.set()
+
+
+# Plays one tournament match on the calling (scheduler) thread and returns the winner.
+# Tournament matches run alongside the lobby's game, each with its own flags and input queues.
+def play_tournament_match(match):
+    first, second = match.slots
+
+    # A player who has left forfeits without a game
+    if first not in clients or second not in clients:
+        return first if first in clients else second
+
+    game = threading.Event()
+    game.set()
+    for number, player in ((1, first), (2, second)):
+        player.p = number
+        player.input_flag = threading.Event()
+        player.input_queue = Queue()
+        player.match = game
+        try:
+            player.wfile.write(f"[TOURNAMENT] {match.label}: {first.username} vs {second.username}\n")
+            player.wfile.flush()
+        except:
+            pass
+    tournament_games[game] = (first, second)
+
+    recorder = MatchRecorder(new_match_id(), (first.username, second.username))
+    open_match_chat(recorder.match_id, (first, second))
+    try:
+        run_two_player_game_online(game, (first, first.wfile), (second, second.wfile), NullFeed(), recorder,
+                                   timer_wheel)
+    except (OSError, ValueError) as e:
+        print(f"[ERROR] Tournament match {match.label} ended early: {e}")
+    finally:
+        del tournament_games[game]
+        close_match_chat(recorder.match_id, (first, second))
+        for player in (first, second):
+            player.p = 0
+            player.input_flag = input_status_flags[0]
+            player.match = None
+        record_stats(recorder, first, second)
+        try:
+            recorder.save()
+        except OSError as e:
+            print(f"[ERROR] Could not save replay {recorder.match_id}: {e}")
+
+    # A disconnect ends the game without a result: whoever is still here wins
+    if first not in clients or second not in clients:
+        return first if first in clients else second
+    return {1: first, 2: second}.get(recorder.winner)
+
+
+# Timer callback: ping a client that has gone quiet, or mark it dead if it stayed quiet too long
+def heartbeat_check(client_info):
+    if client_info.conn.fileno() == -1:
+        return  # already cleaned up
+    idle = time.monotonic() - client_info.last_seen
+
+    if idle < HEARTBEAT_INTERVAL:
+        delay = HEARTBEAT_INTERVAL - idle
+    elif idle < DEAD_PEER_TIMEOUT:
+        # Sent straight on the socket without blocking: a peer that stopped reading must not stall the timer thread
+        if client_info.transport == 'tcp':
             try:
-                # Send the message along with the senders username to all clients
-                c['wfile'].write(f"{username}: {message}\n")
-                c['wfile'].flush()
-            except:
-                continue
+                client_info.conn.send(b"PING\n", socket.MSG_DONTWAIT)
+            except OSError:
+                pass
+        else:
+            pings.put(client_info)
+        delay = DEAD_PEER_TIMEOUT - idle
+    else:
+        dead_peers.append(client_info)
+        return
+    client_info.heartbeat = timer_wheel.schedule(delay, heartbeat_check, client_info)
+
+
+# Writes PINGs for TLS and compressed connections, which have to go through the client's wfile
+def pinger():
+    while True:
+        client_info = pings.get()
+        try:
+            client_info.wfile.write("PING\n")
+            client_info.wfile.flush()
+        except (OSError, ValueError):
+            pass  # closed meanwhile, the reaper or the handler thread cleans up
+
+
+# Timer hook: drop every dead peer found this tick in one pass
+def reap_dead_peers():
+    if not dead_peers:
+        return
+    batch = dead_peers[:]
+    del dead_peers[:]
+
+    dead_ids = set()
+    for client_info in batch:
+        print(f"[INFO] Reaping unresponsive client {client_info.client_id}")
+        dead_ids.add(client_info.client_id)
+        spectators.unsubscribe(client_info)
+        chat.remove(client_info)
+        # Wakes the client's handler thread, which then runs the normal cleanup
+        try:
+            client_info.conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    # Drop them from the match queue in one rebuild rather than one lookup per id
+    with id_queue.mutex:
+        kept = [cid for cid in id_queue.queue if cid not in dead_ids]
+        id_queue.queue.clear()
+        id_queue.queue.extend(kept)
+
+# Client commands by first word: (handler, whether it takes the rest of the line as it is
+# rather than split into words, profiling phase)
+COMMANDS = {
+    "CHAT": (handle_chat, True, "client.chat"),
+    "REPLAY": (handle_replay, False, "client.replay"),
+    "REPLAYS": (handle_replay, False, "client.replay"),
+    "ADMIN": (handle_admin, False, "client.admin"),
+    "STATS": (handle_stats, False, "client.stats"),
+    "LEADERBOARD": (handle_leaderboard, False, "client.leaderboard"),
+    "TOURNAMENT": (handle_tournament, False, "client.tournament"),
+}
 
 # Handles inputs from all client connections
 def handle_client(client_info):
-    rfile = client_info['rfile']
-    wfile = client_info['wfile']
-    client_id = client_info['client_id']
+    rfile = client_info.rfile
+    wfile = client_info.wfile
+    client_id = client_info.client_id
 
     print(f"[INFO] Handling client {client_id}")
 
+    handed_off = False
     try:
         while True:
+            # During a restart the client moves to the new server process between two lines
+            if client_info.handoff:
+                hand_off_client(client_info)
+                handed_off = True
+                return
+
             line = rfile.readline()
             if not line:
                 break
             line = line.strip()
-            
-            # Check if input is the "CHAT" command, call send_all if so
-            if line[0:5] == "CHAT ":
-                message = line[5:]
-                username = client_info['username']
-                send_all(username,message)
+            client_info.last_seen = time.monotonic()  # any line proves the client is alive
+
+            # Heartbeat replies need no further handling
+            if line == "PONG":
+                continue
+
+            # Commands anyone may send at any time, looked up by their first word
+            word, _, rest = line.partition(' ')
+            command = COMMANDS.get(word)
+            if command:
+                handler, raw, phase = command
+                with profiling.phase(phase):
+                    handler(client_info, rest if raw else rest.split())
 
             # If client is a spectator, notify them
-            elif client_info['p'] == 0:
+            elif client_info.p == 0:
                 wfile.write("You are spectating.\n")
                 wfile.flush()
 
             # If the game hasn't started yet, notify them
-            elif not game_active.is_set():
+            elif client_info.match is None or not client_info.match.is_set():
                 wfile.write("Waiting for players to join...\n")
                 wfile.flush()
 
-            # If server expects client's input then it is accepted
-            elif client_info['input_flag'].is_set():
-                client_info['input_queue'].put(line)
+            # If server expects client's input then it is parsed against what the prompt expects,
+            # so the game only ever receives valid moves. A bad answer is refused and the prompt stays open
+            elif client_info.input_flag.is_set():
+                with profiling.phase("client.input"):
+                    move, error = parse_move(client_info.expect, line)
+                    if error:
+                        wfile.write(error + "\n")
+                        wfile.flush()
+                    else:
+                        client_info.input_queue.put(move)
             # Unaccepted input means it's not the clients turn
             else:
                 wfile.write("You cannot input right now.\n")
@@ -148,20 +710,53 @@ def handle_client(client_info):
     except Exception as e:
         print(f"[ERROR] Unexpected error with client {client_id}: {e}")
     finally:
-        cleanup_disconnect(client_info) # Cleanup process called.
+        if not handed_off:
+            cleanup_disconnect(client_info) # Cleanup process called.
+
+# Removes a client from the clients list, the spectator feed, chat, timers and tournament sign-ups
+def forget_client(client_info):
+    if client_info in clients:
+        clients.remove(client_info)
+        connection_slots.release()
+        shard_report(EVENT_LEAVE)
+    spectators.unsubscribe(client_info)
+    chat.remove(client_info)
+    if client_info.heartbeat:
+        client_info.heartbeat.cancel()
+    stop = replay_streams.pop(client_info.client_id, None)
+    if stop:
+        stop.set()
+    with tournament_lock:
+        if client_info in tournament_entrants:
+            tournament_entrants.remove(client_info)
 
 # Handles disconnecting client cleanup
 def cleanup_disconnect(client_info):
     global player1, player2
 
-    print(f"[INFO] Cleaning up client {client_info['client_id']}")
+    print(f"[INFO] Cleaning up client {client_info.client_id}")
+    forget_client(client_info)
 
-    # Remove client from clients list
-    if client_info in clients:
-        clients.remove(client_info)
+    # A tournament match ends like a lobby game, but the lobby's own game carries on
+    pair = tournament_games.get(client_info.match)
+    if pair:
+        client_info.match.clear()
+        for player in pair:
+            player.input_queue.put(DISCONNECTED)
+            if player is not client_info:
+                try:
+                    player.wfile.write("Opponent has disconnected. You win!\n")
+                    player.wfile.flush()
+                except:
+                    pass
+        try:
+            client_info.conn.close()
+        except:
+            pass
+        return
 
     # If not a player, nothing more to do
-    if client_info['p'] not in [1, 2]:
+    if client_info.p not in [1, 2]:
         return
 
     print(f"[INFO] Client was a player")
@@ -178,29 +773,29 @@ def cleanup_disconnect(client_info):
             if player:
                 # Clear input queue
                 try:
-                    while not player['input_queue'].empty():
-                        player['input_queue'].get_nowait()
+                    while not player.input_queue.empty():
+                        player.input_queue.get_nowait()
                 except:
                     pass
 
                 # Queue dummy input to unblock .get()
                 try:
-                    player['input_queue'].put("__DISCONNECTED__")
+                    player.input_queue.put(DISCONNECTED)
                 except:
                     pass
 
                 # Force input flag so any .wait() is released
                 try:
-                    player['input_flag'].set()
+                    player.input_flag.set()
                 except:
                     pass
 
         # Notify the other player (if they exist and aren't the one disconnecting)
-        other = player1 if client_info['p'] == 2 else player2
+        other = player1 if client_info.p == 2 else player2
         if other and other != client_info:
             try:
-                other['wfile'].write("Opponent has disconnected. You win!\n")
-                other['wfile'].flush()
+                other.wfile.write("Opponent has disconnected. You win!\n")
+                other.wfile.flush()
             except:
                 pass
 
@@ -208,25 +803,26 @@ def cleanup_disconnect(client_info):
         # Game is not running, just clear disconnecting player's queue
         print(f"[INFO] No active game — clearing input queue only")
         try:
-            while not client_info['input_queue'].empty():
-                client_info['input_queue'].get_nowait()
+            while not client_info.input_queue.empty():
+                client_info.input_queue.get_nowait()
         except:
             pass
     # Always try to close connection
     try:
-        client_info['conn'].close()
+        client_info.conn.close()
     except:
         pass
 
     # Remove from player1/player2
-    if client_info['p'] == 1:
+    if client_info.p == 1:
         player1 = None
-    elif client_info['p'] == 2:
+    elif client_info.p == 2:
         player2 = None
+    lobby_wakeup.set()
 
 # Handles the current state of the lobby, assigning players and starting games.
 def lobby_manager():
-    global player1, player2
+    global player1, player2, player1_since, bot_id_counter
     while True:
 
         # Assign player 1 if available
@@ -239,16 +835,20 @@ def lobby_manager():
             print(f"{client_id}")
 
             # Find the corresponding client from that ID
-            client = next((c for c in clients if c['client_id'] == client_id), None)
+            client = next((c for c in clients if c.client_id == client_id), None)
             if client is None:
                 print(f"[WARN] Skipping missing client_id: {client_id}")
                 continue 
 
             # Assign client as Player 1 and set their input controls
-            client['p'] = 1
-            client['input_flag'] = input_status_flags[1]
-            client['input_queue'].empty() # Clear any leftover input
+            client.p = 1
+            client.input_flag = input_status_flags[1]
+            client.input_queue = Queue() # Fresh queue, so no leftover input
+            client.match = game_active
             player1 = client
+            player1_since = time.monotonic()
+            if BOT_FILL_DELAY >= 0:
+                timer_wheel.schedule(BOT_FILL_DELAY, lobby_wakeup.set)  # time to check for a bot
             continue
         
         # Assign player 2 if available
@@ -261,116 +861,533 @@ def lobby_manager():
             print(f"{client_id}")
 
             # Find the corresponding client from that ID
-            client = next((c for c in clients if c['client_id'] == client_id), None)
+            client = next((c for c in clients if c.client_id == client_id), None)
             if client is None:
                 print(f"[WARN] Skipping missing client_id: {client_id}")
                 continue 
 
             # Assign client as Player 2 and set their input controls
-            client['p'] = 2
-            client['input_flag'] = input_status_flags[2]
-            client['input_queue'].empty()
+            client.p = 2
+            client.input_flag = input_status_flags[2]
+            client.input_queue = Queue()
+            client.match = game_active
             player2 = client
             continue
 
+        # Nobody else is queueing, so let a bot take the empty player 2 slot
+        if (player1 and player2 is None and id_queue.empty() and new_game.is_set()
+                and BOT_FILL_DELAY >= 0 and time.monotonic() - player1_since >= BOT_FILL_DELAY):
+            print(f"[INFO] Player 2 added (bot)")
+            bot = BotPlayer(bot_id_counter).client_info  # seeded from the match seed when the game starts
+            bot_id_counter -= 1
+
+            # Bots are not in clients, so they are dropped rather than requeued after the game
+            bot.p = 2
+            bot.input_flag = input_status_flags[2]
+            player2 = bot
+            try:
+                player1.wfile.write("No opponent found, you will play against the computer.\n")
+                player1.wfile.flush()
+            except:
+                pass
+            continue
+
         # Start game when both players exist and server is ready
         if player1 and player2 and new_game.is_set():
             new_game.clear()
             game_active.set()
-            print(f"[INFO] Game started")
-            run_two_player_game_online(
-                game_active,
-                (player1, player1['wfile']),
-                (player2, player2['wfile']),
-                clients
-            )
+            seed = new_seed()
+            print(f"[INFO] Game started (seed {seed})")
+            shard_report(EVENT_GAME_START)
+            recorder = MatchRecorder(new_match_id(), (player1.username, player2.username))
+            players = (player1, player2)  # a disconnect clears player1/player2 during the game
+            open_match_chat(recorder.match_id, players)
+            try:
+                run_two_player_game_online(
+                    game_active,
+                    (player1, player1.wfile),
+                    (player2, player2.wfile),
+                    spectators,
+                    recorder,
+                    timer_wheel,
+                    seed=seed
+                )
+            finally:
+                record_stats(recorder, *players)
+                # Keep the finished match for replays
+                try:
+                    path = recorder.save()
+                    if path:
+                        print(f"[INFO] Replay saved as {recorder.match_id}")
+                except OSError as e:
+                    print(f"[ERROR] Could not save replay {recorder.match_id}: {e}")
             print(f"[INFO] Game ended")
+            shard_report(EVENT_GAME_END)
+            close_match_chat(recorder.match_id, players)
+            spectators.set_snapshot(None)  # nothing left for late joiners to catch up on
             # Reset input flags
             input_status_flags[1].clear()
             input_status_flags[2].clear()
 
-            for client in clients:
-                client['p'] = 0
+            # Only the two players: tournament matches may be running alongside
+            for client in (player1, player2):
+                if client is not None:
+                    client.p = 0
+                    client.match = None
 
             
             # Put players back into the client queue
             if player2 is not None:
                 if player2 in clients:
-                    id_queue.put(player2['client_id'])
+                    id_queue.put(player2.client_id)
                 player2 = None
             
             if player1 is not None:
                 if player1 in clients:
-                    id_queue.put(player1['client_id'])
+                    id_queue.put(player1.client_id)
                 player1 = None
 
-            new_game.set()
+            if drain_mode is None:
+                new_game.set()  # a draining server starts no more games
+            continue
+
+        # Nothing to do until a client queues or leaves, or a lobby timer fires
+        lobby_wakeup.wait()
+        lobby_wakeup.clear()
+
+
+# Tells a connection the server is overloaded and closes it, without ever blocking the caller
+def reject_client(conn, addr, reason):
+    print(f"[WARN] Rejecting client from {addr}: {reason}")
+    try:
+        conn.setblocking(False)
+        conn.send(OVERLOAD_MESSAGE.encode())
+    except OSError:
+        pass
+    try:
+        conn.close()
+    except OSError:
+        pass
+    shard_report(EVENT_LEAVE)  # the acceptor counted this connection already
+
+
+# Admission control for a freshly accepted connection: reject it if the server is full,
+# otherwise start the thread that asks for a username
+def admit_client(conn, addr):
+    if not connection_slots.acquire(blocking=False):
+        reject_client(conn, addr, "connection limit reached")
+        return
+    if not handshake_slots.acquire(blocking=False):
+        connection_slots.release()
+        reject_client(conn, addr, "too many pending handshakes")
+        return
+
+    try:
+        for level, option, value in CLIENT_SOCKET_OPTIONS:
+            conn.setsockopt(level, option, value)
+        threading.Thread(target=initialize_client, args=(conn, addr), daemon=True).start()
+    except Exception as e:
+        handshake_slots.release()
+        connection_slots.release()
+        reject_client(conn, addr, f"could not start handler: {e}")
 
 
 # Handles Incomming clients assinging their information
 def initialize_client(conn, addr):
-    global client_id_counter
     print(f"[INFO] Initializing client from {addr}")
 
     try:
-        # Retrieve client information and append to client list
-        rfile = conn.makefile('r')
-        wfile = conn.makefile('w')
-
-        wfile.write("Enter your username:\n")
-        wfile.flush()
-        username = rfile.readline().strip()
-        p = 0 # Start client as spectator
-
-        client_info = {
-            'client_id': client_id_counter,
-            'username': username,
-            'p': p,
-            'input_queue': Queue(),
-            'rfile': rfile,
-            'wfile': wfile,
-            'conn': conn,
-            'input_flag': input_status_flags[0],
-        }
-
-        clients.append(client_info)
-        id_queue.put(client_id_counter)  # Adds client to queue to join game
-
-        wfile.write(f"Welcome, {username}!\n")
-        wfile.flush()
+        # Clients that never finish the TLS handshake or send a username lose their slot after HANDSHAKE_TIMEOUT
+        conn.settimeout(HANDSHAKE_TIMEOUT)
+        try:
+            kind = 'tcp'
+            if tls_context:
+                conn = tls_context.wrap_socket(conn, server_side=True)
+                kind = 'tls'
+
+            # Retrieve client information and append to client list
+            rfile = conn.makefile('r')
+            wfile = conn.makefile('w')
+
+            wfile.write("Enter your username:\n")
+            wfile.flush()
+            username = rfile.readline().strip()
+
+            # The client may ask for compression before giving its username
+            if username == transport.COMPRESS_OFFER:
+                files = transport.accept_compression(conn, wfile, COMPRESSION)
+                if files:
+                    rfile, wfile = files
+                    kind += '+zlib'
+                wfile.write("Enter your username:\n")
+                wfile.flush()
+                username = rfile.readline().strip()
+        finally:
+            handshake_slots.release()
+        conn.settimeout(None)
+        if not username:
+            raise ConnectionError("no username received")
 
-        # Pass client informaiton to thread that handles all client inputs
-        threading.Thread(target=handle_client, args=(client_info,), daemon=True).start()
-        client_id_counter += 1
+        register_client(conn, rfile, wfile, username, kind, f"Welcome, {username}!\n")
 
     except Exception as e:
         print(f"[ERROR] Failed to initialize client from {addr}: {e}")
+        connection_slots.release()
+        shard_report(EVENT_LEAVE)  # the acceptor counted this connection already
+        try:
+            conn.close()
+        except:
+            pass
+
+
+# Gives a connection whose username is known its ClientInfo, puts it in the lobby queue and
+# starts its handler thread
+def register_client(conn, rfile, wfile, username, kind, greeting):
+    global client_id_counter
+    # Handshakes run concurrently, so ids are taken under a lock to keep them unique
+    with client_id_lock:
+        client_id = client_id_counter
+        client_id_counter += 1
+    p = 0 # Start client as spectator
+    wfile = transport.LockedWriter(wfile)  # written to by several threads from here on
+
+    client_info = ClientInfo(
+        client_id,
+        username,
+        None,  # spectators never queue input, players get a queue from the lobby
+        input_status_flags[0],
+        rfile=rfile,
+        wfile=wfile,
+        conn=conn,
+        p=p,
+        transport=kind,
+    )
+
+    wfile.write(greeting)
+    wfile.flush()
+
+    # Join the spectator feed (sends the current match snapshot) and the lobby chat
+    clients.append(client_info)
+    spectators.subscribe(client_info)
+    chat.join(LOBBY, client_info, replay_history=True)
+    id_queue.put(client_id)  # Adds client to queue to join game
+    lobby_wakeup.set()
+
+    # Start watching for a dead connection
+    client_info.last_seen = time.monotonic()
+    client_info.heartbeat = timer_wheel.schedule(HEARTBEAT_INTERVAL, heartbeat_check, client_info)
+
+    # Pass client informaiton to thread that handles all client inputs
+    threading.Thread(target=handle_client, args=(client_info,), daemon=True).start()
+    return client_info
+
+
+# Restart, new process: takes over a connection the old process handed on, without a new handshake
+def resume_client(conn, session):
+    username = session['username']
+    if not connection_slots.acquire(blocking=False):
+        reject_client(conn, username, "connection limit reached")
+        return
+    try:
+        rfile = conn.makefile('r')
+        if session.get('unread'):
+            rfile = handoff.UnreadInput(session['unread'], rfile)
+        client_info = register_client(conn, rfile, conn.makefile('w'), username, 'tcp',
+                                      f"[SERVER] Restart complete, welcome back {username}!\n")
+    except Exception as e:
+        print(f"[ERROR] Failed to take over client {username}: {e}")
+        connection_slots.release()
         try:
             conn.close()
         except:
             pass
+        return
+    if session.get('tournament'):
+        with tournament_lock:
+            tournament_entrants.append(client_info)
+
+
+# Restart, new process: resumes every client the old process hands on, until it is done
+def receive_handed_off_clients(channel):
+    count = 0
+    while True:
+        session, conn = handoff.receive(channel)
+        if session is None:
+            break
+        if conn is not None:
+            resume_client(conn, session)
+            count += 1
+    channel.close()
+
+    # The old process wrote its last results before it finished, so rank from the database again
+    stats.flush()
+    leaderboard.load(stats.all_players())
+    print(f"[INFO] Took over {count} clients from the old server process")
+
+
+# Restart, old process: passes a client's connection and session to the new server process.
+# Runs on the client's handler thread between two lines, right after the line that woke it
+# (the answer to move_client's PING). Input the reader had already buffered travels along.
+def hand_off_client(client_info):
+    global player1, player2
+    session = {'username': client_info.username, 'tournament': client_info in tournament_entrants,
+               'unread': handoff.take_unread(client_info.rfile, client_info.conn)}
+    forget_client(client_info)
+    if client_info is player1:
+        player1 = None
+    elif client_info is player2:
+        player2 = None
+    try:
+        client_info.wfile.flush()
+        handoff.send_client(handoff_channel, client_info.conn, session)
+        print(f"[INFO] Client {client_info.client_id} handed to the new server process")
+    except (OSError, ValueError) as e:
+        print(f"[ERROR] Could not hand client {client_info.client_id} to the new server process: {e}")
+
+    # Only this process's descriptors close, the connection itself lives on in the new process
+    for f in (client_info.rfile, client_info.wfile, client_info.conn):
+        try:
+            f.close()
+        except:
+            pass
+
+
+# Restart, old process: moves an idle client on, or asks it to reconnect if its connection can't move
+def move_client(client_info):
+    if client_info.transport == 'tcp':
+        # The reply to this PING wakes the client's handler thread, which hands the connection over
+        client_info.handoff = True
+        try:
+            client_info.conn.send(b"PING\n", socket.MSG_DONTWAIT)
+        except OSError:
+            pass
+        return
+
+    # TLS and compression state cannot move with the socket
+    ask_to_reconnect(client_info)
+
 
+# Restart: ends a client's connection with a request to reconnect, which reaches the new server
+def ask_to_reconnect(client_info):
+    try:
+        client_info.wfile.write("[SERVER] The server is restarting, please reconnect.\n")
+        client_info.wfile.flush()
+    except (OSError, ValueError):
+        pass
+    try:
+        client_info.conn.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+# Whether a client is in a match, or still has tournament matches to come
+def busy(client_info):
+    return (client_info.match is not None and client_info.match.is_set()) or client_info in tournament_players
+
+
+def matches_running():
+    return game_active.is_set() or bool(tournament_games) or active_tournament is not None
+
+
+# Sends a line to every connected client, through their broadcast workers so a stalled one holds nobody up
+def tell_everyone(text):
+    for c in list(clients):
+        spectators.send(c, text + "\n")
+
+
+# Starts a graceful shutdown, or with 'restart' a hand-over to a new server process, and returns a
+# line for the admin. Either way the server stops accepting, starts no new matches and gives
+# running ones 'timeout' seconds (DRAIN_TIMEOUT by default) to finish. Also the SIGTERM and SIGHUP handler.
+def begin_shutdown(restart, timeout=None):
+    if shard_channel is not None:
+        return "Not available in shard workers, signal the acceptor process (SIGTERM drains, SIGHUP restarts)."
+    return start_drain(restart, timeout)
+
+
+# Starts the drain thread for begin_shutdown(). Shard workers start here on the acceptor's command
+# (see shard.py); they have no listener, and on a restart ask their clients to reconnect.
+def start_drain(restart, timeout=None):
+    global drain_mode
+    with drain_lock:
+        if drain_mode is not None:
+            return f"Already {drain_mode}."
+        drain_mode = 'restarting' if restart else 'draining'
+    timeout = DRAIN_TIMEOUT if timeout is None else timeout
+    threading.Thread(target=drain, args=(restart, timeout), name="drain", daemon=True).start()
+    return f"Server {drain_mode}, running matches have {timeout:g}s to finish."
+
+
+# Runs a shutdown or restart started by begin_shutdown() to the end
+def drain(restart, timeout):
+    global drain_mode, handoff_channel
+    deadline = time.monotonic() + timeout
+    hand_on = restart and listener is not None  # a shard worker's acceptor starts the new server instead
+    if hand_on:
+        print("[INFO] Restart: starting the new server process")
+        handoff_channel = handoff.spawn_successor(os.path.abspath(__file__), sys.argv[1:])
+        if handoff_channel is None:
+            print("[ERROR] The new server process did not start, restart called off")
+            with drain_lock:
+                drain_mode = None
+            return
+
+    # Stop accepting. During a restart the new process accepts on the same socket from here on,
+    # so clients connecting meanwhile only wait in the backlog for a moment.
+    if listener is not None:
+        accepting.clear()
+        accept_stopped.wait()
+        if hand_on:
+            handoff.send_listener(handoff_channel, listener)
+        listener.close()  # only this process's descriptor: a shut down server refuses connections at once
+    new_game.clear()
+    lobby_wakeup.set()
+    print(f"[INFO] Server {drain_mode}, running matches have {timeout:g}s to finish")
+    if hand_on:
+        tell_everyone("[SERVER] The server is restarting. You stay connected; running matches finish first.")
+    elif restart:
+        tell_everyone("[SERVER] The server is restarting. Running matches finish first, then please reconnect.")
+    else:
+        tell_everyone(f"[SERVER] The server is shutting down: no new matches, running matches have "
+                      f"{timeout:g}s to finish.")
+
+    moved = set()
+    while time.monotonic() < deadline:
+        if restart:
+            # Clients move on as soon as they are free
+            idle = [c for c in list(clients) if c not in moved and not busy(c)]
+            if idle:
+                stats.flush()  # their results are in the database before the new process reads it
+            for c in idle:
+                moved.add(c)
+                if hand_on:
+                    move_client(c)
+                else:
+                    ask_to_reconnect(c)
+        if not matches_running() and not (restart and clients):
+            break
+        time.sleep(DRAIN_POLL)
+
+    # Whoever is left: matches past the deadline, and clients that could not move
+    farewell = ("[SERVER] The server has restarted, please reconnect.\n" if restart
+                else "[SERVER] The server is shutting down. Goodbye.\n")
+    for c in list(clients):
+        try:
+            c.wfile.write(farewell)
+            c.wfile.flush()
+        except:
+            pass
+        try:
+            c.conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    stats.flush()
+    if hand_on:
+        handoff.send_done(handoff_channel)
+    print(f"[INFO] {'Restart' if restart else 'Shutdown'} complete")
+    shutdown_complete.set()
+
+
+# Starts the lobby and announcer threads for this process
+def start_services():
+    global spectators, chat, timer_wheel, stats, leaderboard, tls_context, connection_slots, handshake_slots
+    spectators = Broadcaster(broadcast.BROADCAST_WORKERS, broadcast.BROADCAST_QUEUE_SIZE)
+    chat = ChatService(chat_service.CHAT_BATCH_WINDOW, chat_service.CHAT_RATE, chat_service.CHAT_BURST,
+                       chat_service.CHAT_HISTORY, spectators.send)
+    timer_wheel = TimerWheel(timers.TICK)
+    timer_wheel.after_tick.append(reap_dead_peers)
+    stats = StatsStore(stats_store.STATS_DB, stats_store.STATS_BATCH_WINDOW)
+    atexit.register(stats.close)  # write out the last batch on shutdown
+    leaderboard = Leaderboard()
+    leaderboard.load(stats.all_players())
+    stats.listeners.append(leaderboard.apply)
+    tls_context = transport.server_context(TLS_CERT, TLS_KEY) if TLS_CERT else None
+    connection_slots = threading.BoundedSemaphore(MAX_CONNECTIONS)
+    handshake_slots = threading.BoundedSemaphore(MAX_PENDING_HANDSHAKES)
+    new_game.set()
+    threading.Thread(target=lobby_manager, daemon=True).start() # Start lobby
+    threading.Thread(target=spectator_announcer, daemon=True).start() # Start lobby announcement loop
+    threading.Thread(target=pinger, daemon=True).start() # PINGs for TLS and compressed connections
+
+
+# Accepts new client connections and passes them through admission control until a shutdown or
+# restart stops it, then waits for that to finish
+def serve(server):
+    global listener
+    listener = server
+    server.settimeout(ACCEPT_POLL)  # so the loop notices when it has to stop
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda signum, frame: begin_shutdown(False))
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, lambda signum, frame: begin_shutdown(True))
+
+    accepting.set()
+    while accepting.is_set():
+        try:
+            conn, addr = server.accept()
+        except socket.timeout:
+            continue
+        except Exception as e:
+            print(f"[ERROR] Error accepting new connection: {e}")
+            time.sleep(0.1)  # e.g. out of file descriptors, back off instead of spinning
+            continue
+        admit_client(conn, addr)
+    accept_stopped.set()
+    shutdown_complete.wait()
+
+
+def main(workers=None):
+    workers = workers or WORKERS
+
+    # Started by a restarting server: take over its listening socket, then its clients
+    channel = handoff.inherited_channel()
+    if channel is not None:
+        if workers <= 1:
+            start_services()
+        handoff.announce_ready(channel)
+        _, server = handoff.receive(channel)
+        if server is None:
+            sys.exit("[ERROR] The old server process did not hand over its listening socket")
+        host, port = server.getsockname()[:2]
+        print(f"[INFO] Server taking over at {host}:{port}")
+        if workers > 1:
+            # The old acceptor's workers ask their clients to reconnect, nothing else comes across
+            channel.close()
+            with server:
+                run_sharded(server, workers, config.current())
+            return
+        threading.Thread(target=receive_handed_off_clients, args=(channel,), daemon=True).start()
+        with server:
+            serve(server)
+        return
 
-def main():
     # Create TCP/IP socket and then start listeing for new client connections
     print(f"[INFO] Server starting at {HOST}:{PORT}")
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+        for level, option, value in LISTEN_SOCKET_OPTIONS:
+            server.setsockopt(level, option, value)
         server.bind((HOST, PORT))
-        server.listen(8)
-        new_game.set()
-        threading.Thread(target=lobby_manager, daemon=True).start() # Start lobby
-        threading.Thread(target=spectator_announcer, daemon=True).start() # Start lobby announcement loop
+        server.listen(LISTEN_BACKLOG)
 
-        # Accept new client connections and start initilize thread
-        while True:
-            try:
-                conn, addr = server.accept()
-                threading.Thread(target=initialize_client, args=(conn, addr), daemon=True).start()
-            except Exception as e:
-                print(f"[ERROR] Error accepting new connection: {e}")
+        # Multi-process mode: this process only accepts, workers run the lobbies and games
+        if workers > 1:
+            run_sharded(server, workers, config.current())
+            return
+
+        start_services()
+        serve(server)
 
 
 if __name__ == '__main__':
+    # config.apply() sets constants on the 'server' module, so make that name refer to this one
+    sys.modules['server'] = sys.modules[__name__]
+
+    # Configuration is read once, here, from defaults, --profile, --config file, environment and flags
+    try:
+        settings = config.load()
+    except config.ConfigError as e:
+        sys.exit(f"[ERROR] Invalid configuration: {e}")
+    config.apply(settings)
+    print(f"[INFO] Using the {settings['profile']} profile")
     main()
 
 
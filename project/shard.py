@@ -0,0 +1,238 @@
+"""
+shard.py
+
+Multi-process mode for the server, including:
+ - run_sharded(): the front acceptor process, which owns the listening socket and hands each
+   accepted connection to a worker process by passing its file descriptor over a unix socketpair
+ - worker_main(): entry point of a worker process, which runs its own lobby and games exactly
+   like the single-process server does
+ - SIGTERM and SIGHUP in the acceptor: it stops accepting and tells every worker to drain. On a
+   restart it first hands the listening socket to a new acceptor (see handoff.py), and the
+   workers ask their clients to reconnect once they are free, so they land on the new workers
+
+Each worker is a separate interpreter, so Board work and socket handling scale across cores
+instead of sharing one GIL. Workers report lobby events back over the same socketpair, and the
+acceptor is the shared matchmaker. A new connection goes to a worker whose only client is
+waiting for an opponent. Failing that it waits in the acceptor for the next connection, and the
+two are handed to the same worker together (one message carrying both descriptors), so players
+never sit in different workers waiting for each other. A connection nobody turns up for within
+PAIR_WAIT goes to a worker alone, where the next arrival or a bot (BOT_FILL_DELAY) joins it.
+"""
+
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+import handoff
+
+PAIR_WAIT = 2.0    # seconds a new connection waits in the acceptor for an opponent
+ACCEPT_POLL = 0.5  # seconds between checks for a shutdown signal while accepting
+
+# Events reported from a worker to the acceptor (one byte each)
+EVENT_LEAVE = b'L'       # a client disconnected
+EVENT_GAME_START = b'G'  # the worker's lobby started a game
+EVENT_GAME_END = b'E'    # the worker's game finished
+
+# Commands from the acceptor to a worker (a message without descriptors)
+COMMAND_DRAIN = b'DRAIN'      # finish running matches, say goodbye and exit
+COMMAND_RESTART = b'RESTART'  # the same, but ask clients to reconnect
+
+
+class _WorkerSlot:
+    """
+    Acceptor-side view of one worker process: its channel and the load it has reported.
+    """
+
+    def __init__(self, index, process, channel):
+        self.index = index
+        self.process = process
+        self.channel = channel
+        self.connected = 0
+        self.game_active = False
+        self.lock = threading.Lock()
+
+    def lone(self):
+        # No game and a single client, who is therefore waiting for an opponent
+        return not self.game_active and self.connected == 1
+
+
+def _read_events(slot):
+    """
+    Track the load a worker reports until its channel closes.
+    """
+    while True:
+        try:
+            data = slot.channel.recv(64)
+        except OSError:
+            data = b''
+        if not data:
+            print(f"[WARN] Worker {slot.index} channel closed")
+            return
+        with slot.lock:
+            for event in data:
+                event = bytes([event])
+                if event == EVENT_LEAVE:
+                    slot.connected = max(0, slot.connected - 1)
+                elif event == EVENT_GAME_START:
+                    slot.game_active = True
+                elif event == EVENT_GAME_END:
+                    slot.game_active = False
+
+
+def _pick_worker(slots):
+    """
+    Where a pair, or a connection that waited in vain, starts a new game: a worker with no game
+    running, the least loaded one if every worker is busy.
+    """
+    idle = [s for s in slots if not s.game_active]
+    return min(idle or slots, key=lambda s: s.connected)
+
+
+def _hand_over(slot, batch):
+    """
+    Pass the (conn, addr) pairs in 'batch' to one worker in a single message, in arrival order.
+    """
+    addresses = " ".join(f"{addr[0]}:{addr[1]}" for _, addr in batch)
+    try:
+        with slot.lock:
+            socket.send_fds(slot.channel, [addresses.encode()], [conn.fileno() for conn, _ in batch])
+            slot.connected += len(batch)
+    except OSError as e:
+        print(f"[ERROR] Could not hand clients {addresses} to worker {slot.index}: {e}")
+    finally:
+        # The worker holds its own duplicates of the descriptors now
+        for conn, _ in batch:
+            conn.close()
+
+
+def worker_main(index, channel, settings):
+    """
+    Runs inside a worker process: start this process's lobby and receive connections forever.
+    """
+    import config
+    import server  # imported here so each spawned worker gets its own module state
+
+    config.apply(settings)  # spawned workers start from the defaults, not the acceptor's config
+    server.shard_channel = channel
+    server.start_services()
+    print(f"[INFO] Worker {index} ready")
+
+    while True:
+        try:
+            msg, fds, _flags, _addr = socket.recv_fds(channel, 256, 2)
+        except OSError as e:
+            print(f"[ERROR] Worker {index} lost acceptor channel: {e}")
+            return
+        if not fds:
+            if msg in (COMMAND_DRAIN, COMMAND_RESTART):
+                server.start_drain(msg == COMMAND_RESTART)
+                server.shutdown_complete.wait()
+            return  # drained, or the acceptor has gone away
+
+        # A matched pair arrives together, in the order they connected
+        for fd, address in zip(fds, msg.decode().split()):
+            conn = socket.socket(fileno=fd)
+            host, _, port = address.rpartition(':')
+            addr = (host, int(port))
+            server.admit_client(conn, addr)
+
+
+def _shut_down(server_sock, slots, waiting, restart):
+    """
+    Stop accepting and drain every worker, after handing the listening socket to a new acceptor if
+    'restart'. Returns once the workers have exited, or False at once if the new acceptor did not
+    start (the restart is then called off).
+    """
+    import server  # the running server module, whose script starts the new acceptor
+
+    if restart:
+        print("[INFO] Restart: starting the new server process")
+        channel = handoff.spawn_successor(os.path.abspath(server.__file__), sys.argv[1:])
+        if channel is None:
+            print("[ERROR] The new server process did not start, restart called off")
+            return False
+        handoff.send_listener(channel, server_sock)
+        channel.close()  # no clients come across, the workers ask theirs to reconnect
+    server_sock.close()
+
+    live = [s for s in slots if s.process.is_alive()]
+    if waiting and live:
+        _hand_over(_pick_worker(live), waiting)  # they get told like everyone else
+    for slot in live:
+        try:
+            with slot.lock:
+                slot.channel.send(COMMAND_RESTART if restart else COMMAND_DRAIN)
+        except OSError as e:
+            print(f"[ERROR] Could not tell worker {slot.index} to drain: {e}")
+    print(f"[INFO] Acceptor {'restarting' if restart else 'draining'}, waiting for {len(live)} workers")
+    for slot in live:
+        slot.process.join()
+    print(f"[INFO] {'Restart' if restart else 'Shutdown'} complete")
+    return True
+
+
+def run_sharded(server_sock, workers, settings):
+    """
+    Front acceptor: start 'workers' processes and pass every accepted socket to one of them.
+    'settings' (see config.py) is applied in every worker.
+    """
+    ctx = multiprocessing.get_context('spawn')
+    slots = []
+    for i in range(workers):
+        parent_end, child_end = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        process = ctx.Process(target=worker_main, args=(i, child_end, settings), daemon=True)
+        process.start()
+        child_end.close()
+        slot = _WorkerSlot(i, process, parent_end)
+        slots.append(slot)
+        threading.Thread(target=_read_events, args=(slot,), daemon=True).start()
+
+    # The handlers only record the request, the accept loop acts on it
+    shutdown = []  # True for a restart (SIGHUP), False for a drain (SIGTERM)
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda signum, frame: shutdown.append(False))
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, lambda signum, frame: shutdown.append(True))
+
+    print(f"[INFO] Acceptor handing connections to {workers} worker processes")
+    waiting = []  # (conn, addr) accepted but not matched yet, at most one
+    waiting_since = 0.0
+    while True:
+        if shutdown and _shut_down(server_sock, slots, waiting, shutdown.pop()):
+            return
+        timeout = ACCEPT_POLL
+        if waiting:
+            timeout = min(timeout, max(0.001, waiting_since + PAIR_WAIT - time.monotonic()))
+        server_sock.settimeout(timeout)
+        try:
+            conn, addr = server_sock.accept()
+            waiting.append((conn, addr))
+            if len(waiting) == 1:
+                waiting_since = time.monotonic()
+        except socket.timeout:
+            if not waiting:
+                continue
+        except Exception as e:
+            print(f"[ERROR] Error accepting new connection: {e}")
+            time.sleep(0.1)
+            continue
+
+        live = [s for s in slots if s.process.is_alive()]
+        if not live:
+            print("[ERROR] No worker processes left, shutting down acceptor")
+            for conn, _ in waiting:
+                conn.close()
+            return
+
+        # Someone already in a worker is waiting alone, the longest-waiting connection joins them
+        lone = [s for s in live if s.lone()]
+        if lone and waiting:
+            _hand_over(lone[0], [waiting.pop(0)])
+            waiting_since = time.monotonic()
+        if len(waiting) == 2 or (waiting and time.monotonic() - waiting_since >= PAIR_WAIT):
+            _hand_over(_pick_worker(live), waiting)
+            waiting = []
@@ -0,0 +1,269 @@
+"""
+stats.py
+
+Persistent per-player statistics, including:
+ - An SQLite database in WAL mode with one row per username (wins, losses, matches, shots, hits)
+   and one row per finished match
+ - StatsStore.record(): hands a finished match to a writer thread and returns at once. The writer
+   collects everything recorded during STATS_BATCH_WINDOW (up to STATS_BATCH_SIZE matches) and
+   writes it in a single transaction, so the game thread never waits for the disk
+ - listeners: callbacks run on the writer thread after each commit (the leaderboard uses this)
+ - A read-through cache: lookups (the STATS command, the lobby) load a player from the database
+   once and are answered from memory afterwards. The writer applies each committed batch to the
+   cached players, so the cache never drifts from the database
+
+WAL mode lets lookups read while the writer commits, and lets shard worker processes (see
+shard.py) share one database file. Each process caches only what it has read itself and applies
+its own results, so a player's numbers seen from another worker may lag until that worker reloads
+them (STATS_CACHE_SIZE least recently used players are kept).
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from queue import Queue, Empty
+
+STATS_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stats.db')
+STATS_BATCH_WINDOW = 0.5   # seconds of finished matches written per transaction
+STATS_BATCH_SIZE = 256     # most matches per transaction
+STATS_CACHE_SIZE = 10000   # players kept in memory
+RECENT_MATCHES = 5         # matches kept per cached player for "recent matches"
+
+_STOP = None  # sentinel that shuts the writer down
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    username TEXT PRIMARY KEY,
+    wins     INTEGER NOT NULL DEFAULT 0,
+    losses   INTEGER NOT NULL DEFAULT 0,
+    matches  INTEGER NOT NULL DEFAULT 0,
+    shots    INTEGER NOT NULL DEFAULT 0,
+    hits     INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS matches (
+    match_id TEXT PRIMARY KEY,
+    player1  TEXT NOT NULL,
+    player2  TEXT NOT NULL,
+    winner   INTEGER NOT NULL,   -- 0 unfinished, otherwise 1 or 2
+    shots1   INTEGER NOT NULL,
+    hits1    INTEGER NOT NULL,
+    shots2   INTEGER NOT NULL,
+    hits2    INTEGER NOT NULL,
+    ended    REAL NOT NULL       -- time.time()
+);
+CREATE INDEX IF NOT EXISTS matches_by_player1 ON matches (player1, ended);
+CREATE INDEX IF NOT EXISTS matches_by_player2 ON matches (player2, ended);
+"""
+
+UPSERT_PLAYER = """
+INSERT INTO players (username, wins, losses, matches, shots, hits) VALUES (?, ?, ?, 1, ?, ?)
+ON CONFLICT (username) DO UPDATE SET
+    wins = wins + excluded.wins, losses = losses + excluded.losses, matches = matches + 1,
+    shots = shots + excluded.shots, hits = hits + excluded.hits
+"""
+INSERT_MATCH = "INSERT OR IGNORE INTO matches VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+
+class MatchResult:
+    """
+    One finished match as the game left it.
+      - usernames: (player 1, player 2)
+      - winner:    0 if nobody won (e.g. abandoned during placement), otherwise 1 or 2
+      - shots/hits: per player, in player order
+      - rated:     per player, whether they get a players row (bots don't)
+    """
+    __slots__ = ('match_id', 'usernames', 'winner', 'shots', 'hits', 'rated', 'ended')
+
+    def __init__(self, match_id, usernames, winner, shots, hits, rated=(True, True), ended=None):
+        self.match_id = match_id
+        self.usernames = tuple(usernames)
+        self.winner = winner
+        self.shots = tuple(shots)
+        self.hits = tuple(hits)
+        self.rated = tuple(rated)
+        self.ended = time.time() if ended is None else ended
+
+    def outcome(self, index):
+        """
+        'W', 'L' or '-' for player index 0 or 1.
+        """
+        if not self.winner:
+            return '-'
+        return 'W' if self.winner == index + 1 else 'L'
+
+
+class PlayerStats:
+    __slots__ = ('username', 'wins', 'losses', 'matches', 'shots', 'hits', 'recent')
+
+    def __init__(self, username, wins=0, losses=0, matches=0, shots=0, hits=0):
+        self.username = username
+        self.wins = wins
+        self.losses = losses
+        self.matches = matches
+        self.shots = shots
+        self.hits = hits
+        self.recent = deque(maxlen=RECENT_MATCHES)   # (outcome, opponent, shots, ended), newest first
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.shots if self.shots else 0.0
+
+    def apply(self, result, index):
+        outcome = result.outcome(index)
+        self.wins += outcome == 'W'
+        self.losses += outcome == 'L'
+        self.matches += 1
+        self.shots += result.shots[index]
+        self.hits += result.hits[index]
+        self.recent.appendleft((outcome, result.usernames[1 - index], result.shots[index], result.ended))
+
+
+class _Flush:
+    """
+    Queued by flush(): the writer sets 'done' once everything queued before it is committed.
+    """
+    __slots__ = ('done',)
+
+    def __init__(self, done):
+        self.done = done
+
+
+class StatsStore:
+    def __init__(self, path=None, batch_window=None, batch_size=None, cache_size=None):
+        self.path = path or STATS_DB
+        self.batch_window = STATS_BATCH_WINDOW if batch_window is None else batch_window
+        self.batch_size = batch_size or STATS_BATCH_SIZE
+        self.cache_size = cache_size or STATS_CACHE_SIZE
+        self.cache = OrderedDict()   # username -> PlayerStats, least recently used first
+        self.lock = threading.Lock()  # guards the cache and the reader connection
+        self.queue = Queue()
+        self.written = 0             # matches committed so far
+        self.listeners = []          # called by the writer with each committed batch (e.g. the leaderboard)
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.reader = self._connect()
+        self.reader.executescript(SCHEMA)
+        self.thread = threading.Thread(target=self._run, name="stats-writer", daemon=True)
+        self.thread.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")  # in WAL mode a crash can lose the last commits, never corrupt
+        return conn
+
+    # --- Writes ---
+
+    def record(self, result):
+        """
+        Queue a finished match (MatchResult) for the writer. Never blocks.
+        """
+        self.queue.put(result)
+
+    def _run(self):
+        conn = self._connect()
+        running = True
+        while running:
+            result = self.queue.get()
+            if result is _STOP:
+                break
+            batch = [result]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.batch_size and not isinstance(batch[-1], _Flush):
+                try:
+                    result = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except Empty:
+                    break
+                if result is _STOP:
+                    running = False
+                    break
+                batch.append(result)
+            results = [item for item in batch if not isinstance(item, _Flush)]
+            try:
+                if results:
+                    self._write(conn, results)
+            except sqlite3.Error as e:
+                print(f"[ERROR] Could not save stats for {len(results)} matches: {e}")
+            for item in batch:
+                if isinstance(item, _Flush):
+                    item.done.set()
+        conn.close()
+
+    def _write(self, conn, batch):
+        players, matches = [], []
+        for result in batch:
+            for index in (0, 1):
+                if result.rated[index]:
+                    outcome = result.outcome(index)
+                    players.append((result.usernames[index], int(outcome == 'W'), int(outcome == 'L'),
+                                    result.shots[index], result.hits[index]))
+            matches.append((result.match_id, *result.usernames, result.winner,
+                            result.shots[0], result.hits[0], result.shots[1], result.hits[1], result.ended))
+
+        # Commit and update the cache together, so a lookup never loads a row that the cache
+        # is about to have the same batch applied to
+        with self.lock:
+            with conn:
+                conn.executemany(UPSERT_PLAYER, players)
+                conn.executemany(INSERT_MATCH, matches)
+            for result in batch:
+                for index in (0, 1):
+                    player = self.cache.get(result.usernames[index])
+                    if player is not None and result.rated[index]:
+                        player.apply(result, index)
+            self.written += len(batch)
+        for listener in self.listeners:
+            listener(batch)
+
+    def flush(self, timeout=5):
+        """
+        Wait until everything recorded so far is committed (for shutdown and benchmarks).
+        """
+        done = threading.Event()
+        self.queue.put(_Flush(done))
+        return done.wait(timeout)
+
+    def close(self):
+        self.queue.put(_STOP)
+        self.thread.join(timeout=5)
+
+    # --- Reads ---
+
+    def get(self, username):
+        """
+        A player's stats (all zero for unknown players), loaded from the database on first use.
+        """
+        with self.lock:
+            player = self.cache.get(username)
+            if player is None:
+                player = self._load(username)
+                self.cache[username] = player
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+            else:
+                self.cache.move_to_end(username)
+            return player
+
+    def all_players(self):
+        """
+        (username, wins, losses) for every player, straight from the database.
+        """
+        with self.lock:
+            return self.reader.execute("SELECT username, wins, losses FROM players").fetchall()
+
+    def _load(self, username):
+        row = self.reader.execute(
+            "SELECT wins, losses, matches, shots, hits FROM players WHERE username = ?", (username,)).fetchone()
+        player = PlayerStats(username, *(row or ()))
+        recent = self.reader.execute(
+            "SELECT player1, player2, winner, shots1, shots2, ended FROM matches WHERE player1 = ?1 OR player2 = ?1 "
+            "ORDER BY ended DESC LIMIT ?2", (username, RECENT_MATCHES)).fetchall()
+        for player1, player2, winner, shots1, shots2, ended in recent:
+            index = 0 if player1 == username else 1
+            outcome = '-' if not winner else ('W' if winner == index + 1 else 'L')
+            player.recent.append((outcome, (player2, player1)[index], (shots1, shots2)[index], ended))
+        return player
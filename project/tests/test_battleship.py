@@ -0,0 +1,53 @@
+import pytest
+
+from battleship import (EXPECT_CELL, EXPECT_CHOICE, EXPECT_ORIENTATION, EXPECT_SALVO, EXPECT_SHOT, QUIT,
+                        answers, parse_move, parse_salvo)
+
+
+@pytest.mark.parametrize("expect, text, value", [
+    (EXPECT_CHOICE, "m", 'M'),
+    (EXPECT_CHOICE, " R ", 'R'),
+    (EXPECT_ORIENTATION, "h", 0),
+    (EXPECT_ORIENTATION, "V", 1),
+    (EXPECT_SHOT, "b5", (1, 4)),
+    (EXPECT_SHOT, "J10", (9, 9)),
+    (EXPECT_SHOT, "A01", (0, 0)),  # not in the fast table, parsed the long way
+    (EXPECT_SHOT, " quit ", QUIT),
+    (EXPECT_CELL, "c3", (2, 2)),
+    ((EXPECT_SALVO, 3), "b5, c7 d1", ((1, 4), (2, 6), (3, 0))),
+    ((EXPECT_SALVO, 2), "quit", QUIT),
+])
+def test_parse_move_accepts(expect, text, value):
+    assert parse_move(expect, text) == (value, None)
+    assert answers(expect, value)
+
+
+@pytest.mark.parametrize("expect, text, error", [
+    (EXPECT_CHOICE, "x", "Invalid input"),
+    (EXPECT_ORIENTATION, "d", "  [!] Invalid orientation. Please enter 'H' or 'V'."),
+    (EXPECT_SHOT, "K1", "Invalid input: Invalid row letter: K"),
+    (EXPECT_SHOT, "A11", "Invalid input: Column out of bounds: 11"),
+    (EXPECT_SHOT, "A", "Invalid input: Coordinate too short."),
+    (EXPECT_SHOT, "AB", "Invalid input: Invalid column number: B"),
+    (EXPECT_CELL, "quit", "  [!] Invalid coordinate: Invalid row letter: Q"),
+])
+def test_parse_move_rejects(expect, text, error):
+    assert parse_move(expect, text) == (None, error)
+
+
+@pytest.mark.parametrize("count, text, error", [
+    (3, "B5 B5", "Invalid input: B5 is in the salvo twice"),
+    (2, "A1 A2 A3", "Invalid input: you have 2 shots this turn"),
+    (1, "A1 A2", "Invalid input: you have 1 shot this turn"),
+    (2, " , ", "Invalid input: enter at least one coordinate"),
+    (2, "A1 Z9", "Invalid input: Invalid row letter: Z"),
+])
+def test_parse_salvo_rejects(count, text, error):
+    assert parse_salvo(count, text) == (None, error)
+
+
+def test_answers_checks_the_kind_of_value():
+    assert not answers(EXPECT_CELL, QUIT)
+    assert not answers(EXPECT_ORIENTATION, 'H')
+    assert not answers(EXPECT_SHOT, ((0, 0),))
+    assert not answers((EXPECT_SALVO, 2), (0, 0))
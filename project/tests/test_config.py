@@ -0,0 +1,97 @@
+import json
+
+import pytest
+
+import config
+from config import ConfigError, _validate, parse_bool, parse_ships
+
+
+@pytest.fixture
+def settings():
+    # The defaults, as load() resolves them with no file, environment or flags
+    return config.load([], environ={})
+
+
+def test_defaults_are_valid(settings):
+    _validate(settings)
+    assert settings['profile'] == 'default'
+
+
+@pytest.mark.parametrize("changes, message", [
+    ({'dead_peer_timeout': 5, 'heartbeat_interval': 5}, "dead_peer_timeout must be longer"),
+    ({'tls_cert': 'cert.pem'}, "must be given together"),
+    ({'tls_cert': 'no-such-cert.pem', 'tls_key': 'no-such-key.pem'}, "no such file"),
+    ({'ships': []}, "at least one ship"),
+    ({'ships': [('Carrier', 11)]}, "does not fit a 10 board"),
+    ({'ships': [('Tug', 0)]}, "does not fit"),
+    ({'board_size': 5, 'ships': [('Carrier', 5)] * 3}, "more than half of the board"),
+    # armada brings its own fleet, whatever 'ships' says
+    ({'board_size': 5, 'ships': [('Tug', 2)], 'variant': 'armada'}, "more than half of the board"),
+    ({'board_size': 6, 'ships': [('Carrier', 5)] * 3 + [('Cruiser', 3)], 'variant': 'no-touch'},
+     "the no-touch fleet cannot be placed on a 6 board"),
+])
+def test_validate_rejects(settings, changes, message):
+    settings.update(changes)
+    with pytest.raises(ConfigError, match=message):
+        _validate(settings)
+
+
+def test_validate_accepts_tls_files(settings, tmp_path):
+    for name in ('tls_cert', 'tls_key'):
+        path = tmp_path / f"{name}.pem"
+        path.write_text("")
+        settings[name] = str(path)
+    _validate(settings)
+
+
+def test_sources_in_order_of_precedence(tmp_path):
+    path = tmp_path / 'battleship.json'
+    path.write_text(json.dumps({'profile': 'low-latency', 'port': 6000, 'turn_timeout': 20}))
+    settings = config.load(['--config', str(path), '--turn-timeout', '25'],
+                           environ={'BATTLESHIP_PORT': '7000', 'BATTLESHIP_TIME_BANK': '45'})
+    assert settings['profile'] == 'low-latency'
+    assert settings['chat_batch_window'] == 0.01   # from the profile
+    assert settings['port'] == 7000                # environment over file
+    assert settings['time_bank'] == 45.0           # environment over profile
+    assert settings['turn_timeout'] == 25.0        # command line over file
+
+
+@pytest.mark.parametrize("argv, environ, message", [
+    (['--port', '70000'], {}, "port must be at most 65535"),
+    (['--port', 'x'], {}, "invalid value for port"),
+    ([], {'BATTLESHIP_WORKERS': '0'}, "workers must be at least 1"),
+    (['--profile', 'turbo'], {}, None),  # argparse rejects it
+    ([], {'BATTLESHIP_PROFILE': 'turbo'}, "unknown profile 'turbo'"),
+    (['--variant', 'blitz'], {}, "unknown variant"),
+])
+def test_load_rejects(argv, environ, message):
+    if message is None:
+        with pytest.raises(SystemExit):
+            config.load(argv, environ)
+        return
+    with pytest.raises(ConfigError, match=message):
+        config.load(argv, environ)
+
+
+def test_unknown_option_in_file(tmp_path):
+    path = tmp_path / 'battleship.json'
+    path.write_text(json.dumps({'colour': 'blue'}))
+    with pytest.raises(ConfigError, match="unknown option 'colour'"):
+        config.load(['--config', str(path)], {})
+
+
+def test_parse_ships():
+    assert parse_ships("Carrier:5, Tug:2") == [('Carrier', 5), ('Tug', 2)]
+    assert parse_ships([["Carrier", "5"]]) == [('Carrier', 5)]
+    with pytest.raises(ConfigError):
+        parse_ships("Carrier")
+
+
+@pytest.mark.parametrize("text, value", [("yes", True), ("ON", True), ("0", False), (False, False)])
+def test_parse_bool(text, value):
+    assert parse_bool(text) is value
+
+
+def test_parse_bool_rejects():
+    with pytest.raises(ConfigError):
+        parse_bool("maybe")
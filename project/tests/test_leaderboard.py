@@ -0,0 +1,96 @@
+import bisect
+import random
+
+import pytest
+
+from leaderboard import IndexableSkipList, Leaderboard
+from stats import MatchResult
+
+
+def check_against(skiplist, reference):
+    assert len(skiplist) == len(reference)
+    assert [skiplist[i] for i in range(len(reference))] == reference
+    assert skiplist.first(len(reference) + 5) == reference
+
+
+def test_skiplist_matches_a_sorted_list():
+    rng = random.Random(7)
+    skiplist, reference = IndexableSkipList(seed=1), []
+    for _ in range(2000):
+        if reference and rng.random() < 0.4:
+            key = rng.choice(reference)
+            skiplist.remove(key)
+            reference.remove(key)
+        else:
+            key = rng.randrange(500)  # duplicates included
+            skiplist.insert(key)
+            bisect.insort(reference, key)
+    check_against(skiplist, reference)
+    for key in range(-1, 502):
+        assert skiplist.index(key) == bisect.bisect_left(reference, key)
+
+
+def test_skiplist_first_k():
+    skiplist = IndexableSkipList(seed=2)
+    for key in (5, 1, 4, 2, 3):
+        skiplist.insert(key)
+    assert skiplist.first(3) == [1, 2, 3]
+    assert skiplist.first(0) == []
+
+
+def test_skiplist_errors():
+    skiplist = IndexableSkipList(seed=3)
+    skiplist.insert(10)
+    with pytest.raises(KeyError):
+        skiplist.remove(11)
+    with pytest.raises(IndexError):
+        skiplist[1]
+    with pytest.raises(IndexError):
+        skiplist[-1]
+    skiplist.remove(10)
+    check_against(skiplist, [])
+
+
+def result(winner, first, second, rated=(True, True)):
+    return MatchResult('m', (first, second), winner, (0, 0), (0, 0), rated)
+
+
+def test_ranking_order_and_ties():
+    board = Leaderboard()
+    board.load([('carol', 3, 1), ('alice', 3, 1), ('bob', 3, 0), ('dave', 1, 5)])
+    # Most wins first, then fewest losses, then by name
+    assert board.top(10) == [(1, 'bob', 3, 0), (2, 'alice', 3, 1), (3, 'carol', 3, 1), (4, 'dave', 1, 5)]
+    assert board.rank('carol') == (3, 4)
+    assert board.rank('nobody') == (None, 4)
+
+
+def test_apply_moves_players():
+    board = Leaderboard()
+    board.load([('alice', 2, 0), ('bob', 1, 0)])
+    board.apply([result(2, 'alice', 'bob'), result(2, 'alice', 'bob')])
+    assert board.top(2) == [(1, 'bob', 3, 0), (2, 'alice', 2, 2)]
+
+    # Bots are not ranked; an unfinished match changes nobody's record
+    board.apply([result(1, 'erin', 'Computer', rated=(True, False)), result(0, 'alice', 'bob')])
+    assert board.rank('Computer') == (None, 3)
+    assert board.top(3)[2] == (3, 'erin', 1, 0)
+    assert board.top(2) == [(1, 'bob', 3, 0), (2, 'alice', 2, 2)]
+
+
+def test_top_text_cache():
+    board = Leaderboard()
+    board.load([(f"player{i:02}", 100 - i, 0) for i in range(20)])
+    text = board.top_text(3)
+    assert text.splitlines()[0] == "[LEADERBOARD]   1. player00  100 W / 0 L"
+
+    # A change below the cached rows keeps the rendered text
+    board.apply([result(1, 'player15', 'player16')])
+    assert board.top_text(3) is text
+
+    # A change inside them renders it again
+    board.load([('player19', 1000, 0)])
+    assert board.top_text(3).splitlines()[0] == "[LEADERBOARD]   1. player19  1000 W / 0 L"
+
+
+def test_top_text_empty():
+    assert Leaderboard().top_text() == "[LEADERBOARD] No finished matches yet.\n"
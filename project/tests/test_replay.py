@@ -0,0 +1,164 @@
+import io
+import random
+import struct
+import threading
+
+import pytest
+
+import replay
+from battleship import Board
+from replay import HEADER, MAGIC_NO_SEED, SEED, SNAPSHOT_INTERVAL, MatchRecorder, Replay
+
+
+def play_match(seed=1):
+    """
+    A random match between two random fleets. Returns the recorder and both hidden grids after
+    every shot (index n: after n shots).
+    """
+    rng = random.Random(seed)
+    boards = (Board(rng=rng), Board(rng=rng))
+    for board in boards:
+        board.place_ships_randomly()
+    recorder = MatchRecorder('test-match', ('alice', 'bob'))
+    recorder.seed = 2 ** 64 - 3
+    recorder.start(*boards)
+
+    def grids():
+        return tuple([bytes(row) for row in board.hidden_grid] for board in boards)
+
+    history = [grids()]
+    targets = [[(r, c) for r in range(10) for c in range(10)] for _ in boards]
+    for order in targets:
+        rng.shuffle(order)
+    shooter = 1
+    while not any(board.all_ships_sunk() for board in boards):
+        row, col = targets[shooter - 1].pop()
+        result, sunk_name = boards[2 - shooter].fire_at(row, col)
+        recorder.shot(shooter, row, col, result, sunk_name)
+        history.append(grids())
+        shooter = 3 - shooter
+    if boards[1].all_ships_sunk():
+        recorder.finish(1)
+    elif boards[0].all_ships_sunk():
+        recorder.finish(2)
+    return recorder, history
+
+
+def open_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture
+def saved(tmp_path):
+    recorder, history = play_match()
+    return recorder, history, recorder.save(str(tmp_path))
+
+
+def test_header_round_trip(saved):
+    recorder, history, path = saved
+    loaded = Replay(path)
+    assert loaded.usernames == ('alice', 'bob')
+    assert loaded.seed == recorder.seed
+    assert loaded.shot_count == recorder.shot_count == len(history) - 1
+    assert loaded.shot_count > SNAPSHOT_INTERVAL
+    assert loaded.winner == recorder.winner != 0
+    assert loaded.fleets == [[(name, tuple(cells)) for name, cells in fleet] for fleet in recorder.fleets]
+
+
+def test_shots_round_trip(saved):
+    recorder, _, path = saved
+    loaded = Replay(path)
+    packed = [struct.unpack_from('<BHB', recorder.shots, 4 * n) for n in range(recorder.shot_count)]
+    for n, (shooter, cell, code) in enumerate(packed):
+        assert loaded.shot(n) == (shooter, cell // 10, cell % 10, code)
+
+
+def test_boards_at_every_move(saved):
+    _, history, path = saved
+    loaded = Replay(path)
+    for move, grids in enumerate(history):
+        boards = loaded.boards_at(move)
+        for board, grid in zip(boards, grids):
+            assert [bytes(row) for row in board.hidden_grid] == grid
+            assert [bytes(row) for row in board.display_grid] == [row.replace(b'S', b'.') for row in grid]
+    # Moves past either end are clamped
+    assert [bytes(r) for r in loaded.boards_at(-5)[0].hidden_grid] == history[0][0]
+    assert [bytes(r) for r in loaded.boards_at(10 ** 6)[1].hidden_grid] == history[-1][1]
+
+
+def test_sinking_is_replayed(saved):
+    _, _, path = saved
+    loaded = Replay(path)
+    boards = loaded.boards_at(loaded.shot_count)
+    assert boards[2 - loaded.winner].all_ships_sunk()
+    assert not boards[loaded.winner - 1].all_ships_sunk()
+
+
+def test_unplaced_match_is_not_saved(tmp_path):
+    assert MatchRecorder('empty', ('a', 'b')).save(str(tmp_path)) is None
+
+
+def test_old_files_without_a_seed(saved, tmp_path):
+    _, history, path = saved
+    data = open_bytes(path)
+    # Rewrite as BSR1: same layout, minus the seed after the usernames
+    _, size, interval, shots, winner, shots_offset, snapshots_offset = HEADER.unpack_from(data, 0)
+    names_end = HEADER.size + 1 + len('alice') + 1 + len('bob')
+    old = (HEADER.pack(MAGIC_NO_SEED, size, interval, shots, winner, shots_offset - SEED.size,
+                       snapshots_offset - SEED.size)
+           + data[HEADER.size:names_end] + data[names_end + SEED.size:])
+    old_path = tmp_path / 'old.bsr'
+    old_path.write_bytes(old)
+
+    loaded = Replay(str(old_path))
+    assert loaded.seed is None
+    assert [bytes(r) for r in loaded.boards_at(len(history) - 1)[0].hidden_grid] == history[-1][0]
+
+
+@pytest.mark.parametrize("damage", [
+    lambda data: data[:HEADER.size - 1],           # no whole header
+    lambda data: b'XXXX' + data[4:],               # not a replay
+    lambda data: data[:-1],                        # last snapshot cut short
+    lambda data: data[:len(data) // 2],            # shots cut short
+])
+def test_corrupt_files_are_refused(saved, tmp_path, damage):
+    _, _, path = saved
+    data = open_bytes(path)
+    broken = tmp_path / 'broken.bsr'
+    broken.write_bytes(damage(data))
+    with pytest.raises(ValueError):
+        Replay(str(broken))
+
+
+def test_bad_shot_record_is_refused(saved, tmp_path):
+    _, _, path = saved
+    data = bytearray(open_bytes(path))
+    shots_offset = HEADER.unpack_from(data, 0)[5]
+    data[shots_offset] = 3  # shooter 3
+    broken = tmp_path / 'broken.bsr'
+    broken.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match="bad shot record 0"):
+        Replay(str(broken))
+
+
+def test_stream(saved, monkeypatch):
+    _, _, path = saved
+    monkeypatch.setattr(replay.time, 'sleep', lambda seconds: None)
+    loaded = Replay(path)
+    out = io.StringIO()
+    loaded.stream(out, speed=2.0, start=3)
+    lines = [line for line in out.getvalue().splitlines() if line.startswith('[REPLAY]')]
+    assert lines[0] == f"[REPLAY] alice vs bob, {loaded.shot_count} shots, seed {loaded.seed}, starting at move 3"
+    assert lines[1].startswith("[REPLAY] Move 4: Player 2 fires at ")
+    assert len(lines) == 1 + (loaded.shot_count - 3) + 2
+    assert lines[-1] == "[REPLAY] End of replay."
+
+
+def test_stream_stops(saved):
+    _, _, path = saved
+    stop = threading.Event()
+    stop.set()
+    out = io.StringIO()
+    Replay(path).stream(out, speed=2.0, stop_event=stop)
+    assert out.getvalue().count('\n') == 1  # the title line only
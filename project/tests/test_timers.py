@@ -0,0 +1,81 @@
+import random
+
+import pytest
+
+from timers import Timer, TimerWheel
+
+
+@pytest.fixture
+def wheel():
+    # Ticks this long keep the wheel's own thread asleep, so each test moves it on with _tick().
+    # Two bits per level: 4 ticks at level 0, 16 at level 1, 64 at level 2, then round again.
+    return TimerWheel(tick=3600, level_bits=(2, 2, 2))
+
+
+def add(wheel, due, fired, name=None):
+    timer = Timer(due, lambda: fired.append((name if name is not None else due, wheel.current)), ())
+    with wheel.lock:
+        wheel._insert(timer)
+    return timer
+
+
+def test_every_timer_fires_on_its_tick(wheel):
+    fired = []
+    dues = list(range(1, 200))  # past the top level's 64 ticks, so some go round more than once
+    for due in dues:
+        add(wheel, due, fired)
+    for _ in range(200):
+        wheel._tick()
+    assert fired == [(due, due) for due in dues]
+
+
+def test_timers_added_while_running(wheel):
+    rng = random.Random(5)
+    fired, expected = [], []
+    for _ in range(300):
+        for _ in range(rng.randrange(3)):
+            due = wheel.current + 1 + rng.randrange(150)
+            add(wheel, due, fired, name=len(expected))
+            expected.append((len(expected), due))
+        wheel._tick()
+    for _ in range(150):
+        wheel._tick()
+    assert sorted(fired, key=lambda item: item[0]) == expected
+
+
+def test_cancelled_timer_never_runs(wheel):
+    fired = []
+    add(wheel, 3, fired).cancel()
+    add(wheel, 40, fired).cancel()  # cancelled while waiting in a higher level
+    add(wheel, 41, fired)
+    for _ in range(50):
+        wheel._tick()
+    assert fired == [(41, 41)]
+
+
+def test_hooks_run_after_the_ticks_timers(wheel):
+    order = []
+    add(wheel, 1, order)
+    wheel.after_tick.append(lambda: order.append('hook'))
+    wheel._tick()
+    assert order == [(1, 1), 'hook']
+
+
+def test_failing_callback_does_not_stop_the_tick(wheel):
+    fired = []
+
+    def fail():
+        raise RuntimeError("boom")
+
+    with wheel.lock:
+        wheel._insert(Timer(2, fail, ()))
+    add(wheel, 2, fired)
+    wheel._tick()
+    wheel._tick()
+    assert fired == [(2, 2)]
+
+
+def test_schedule_never_early(wheel):
+    timer = wheel.schedule(2 * wheel.tick, lambda: None)
+    assert timer.due * wheel.tick >= 2 * wheel.tick
+    assert timer.due <= 3
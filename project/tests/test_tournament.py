@@ -0,0 +1,186 @@
+import itertools
+import threading
+import time
+
+import pytest
+
+from tournament import BYE, Elimination, RoundRobin, Tournament, _seed_order, make_format
+
+
+class Entrant:
+    """
+    A player with a seed; lower seeds are stronger.
+    """
+
+    def __init__(self, seed):
+        self.seed = seed
+
+    def __repr__(self):
+        return f"E{self.seed}"
+
+
+def entrants(n):
+    return [Entrant(i) for i in range(n)]
+
+
+def favourite(match):
+    return min(match.slots, key=lambda entrant: entrant.seed)
+
+
+def run(name, field, play=favourite, parallel=None):
+    """
+    Runs a whole tournament; returns it and every match in the order the results came in.
+    """
+    played, finished = [], []
+
+    def on_result(match, done):
+        if match is not None:
+            played.append(match)
+        finished.extend(done)
+
+    tournament = Tournament(name, field, play, parallel=parallel, on_result=on_result)
+    tournament.run()
+    assert sorted(finished, key=lambda e: e.seed) == field  # everyone is released exactly once
+    return tournament, played
+
+
+def test_make_format_checks_its_input():
+    with pytest.raises(ValueError, match="at least two"):
+        make_format('single', entrants(1))
+    with pytest.raises(ValueError, match="unknown tournament format"):
+        make_format('swiss', entrants(4))
+
+
+@pytest.mark.parametrize("parallel", [0, -3])
+def test_parallel_must_be_positive(parallel):
+    with pytest.raises(ValueError):
+        Tournament('single', entrants(4), favourite, parallel=parallel)
+
+
+def test_seed_order_keeps_top_seeds_apart():
+    order = _seed_order(16)
+    assert sorted(order) == list(range(16))
+    # First round pairs add up to 15: seed 0 meets seed 15, seed 1 meets seed 14, ...
+    assert all(order[i] + order[i + 1] == 15 for i in range(0, 16, 2))
+    # Seeds 0 and 1 are in different halves, so they can only meet in the final
+    assert (order.index(0) < 8) != (order.index(1) < 8)
+
+
+@pytest.mark.parametrize("n", [2, 3, 5, 8, 13])
+def test_single_elimination(n):
+    field = entrants(n)
+    tournament, played = run('single', field)
+    assert tournament.champion is field[0]
+    assert len(played) == n - 1  # byes are not played
+    assert all(BYE not in match.slots for match in played)
+    standings = tournament.standings()
+    assert standings[0] == (field[0], tournament.wins[field[0]], 0)
+    assert all(losses == 1 for _, _, losses in standings[1:])
+
+
+def test_byes_go_to_the_top_seeds():
+    bracket = Elimination(entrants(5))
+    ready, finished = bracket.start()
+    assert finished == []
+    # Seeds 0-2 move straight on to round 2, where 1 and 2 can already play each other
+    assert sorted(sorted(e.seed for e in match.slots) for match in ready) == [[1, 2], [3, 4]]
+    seated = {e.seed for match in bracket.rounds[1] for e in match.slots if e is not None}
+    assert seated == {0, 1, 2}
+
+
+@pytest.mark.parametrize("n", [2, 3, 4, 6, 8, 11, 16])
+def test_double_elimination(n):
+    field = entrants(n)
+    tournament, played = run('double', field)
+    assert tournament.champion is field[0]
+    assert len(played) == 2 * n - 2  # everyone but the champion loses twice, no reset needed
+    assert played[-1].label == "Grand final"
+    assert tournament.losses[field[0]] == 0
+    assert all(tournament.losses[e] == 2 for e in field[1:])
+
+
+def test_double_elimination_grand_final_reset():
+    field = entrants(8)
+
+    def play(match):
+        # The favourite wins everything but the first grand final
+        if match.label == "Grand final":
+            return max(match.slots, key=lambda entrant: entrant.seed)
+        return favourite(match)
+
+    tournament, played = run('double', field, play)
+    assert [match.label for match in played[-2:]] == ["Grand final", "Grand final reset"]
+    assert played[-2].slots == [field[0], field[1]]
+    assert tournament.champion is field[0]
+    assert len(played) == 2 * 8 - 1
+    assert tournament.losses[field[0]] == 1
+
+
+def test_losers_bracket_champion_can_win_the_reset():
+    field = entrants(4)
+
+    def play(match):
+        if match.label.startswith("Grand final"):
+            return field[1]
+        return favourite(match)
+
+    tournament, played = run('double', field, play)
+    assert tournament.champion is field[1]
+    assert tournament.losses[field[0]] == 2
+
+
+@pytest.mark.parametrize("n", [2, 5, 6, 9])
+def test_round_robin(n):
+    field = entrants(n)
+    tournament, played = run('round-robin', field)
+    pairs = [frozenset(match.slots) for match in played]
+    assert len(pairs) == len(set(pairs)) == n * (n - 1) // 2
+    assert set(pairs) == {frozenset(pair) for pair in itertools.combinations(field, 2)}
+    assert tournament.champion is field[0]
+    assert [tournament.wins[e] for e in field] == list(range(n - 1, -1, -1))
+
+
+def test_round_robin_rounds():
+    schedule = RoundRobin(entrants(6))
+    rounds = {}
+    for match in schedule.matches:
+        rounds.setdefault(match.label, []).extend(match.slots)
+    assert len(rounds) == 5
+    assert all(sorted(e.seed for e in players) == list(range(6)) for players in rounds.values())
+
+
+@pytest.mark.parametrize("name, parallel", [('single', 3), ('double', 4), ('round-robin', 2), ('double', 1)])
+def test_parallel_matches_never_share_a_player(name, parallel):
+    field = entrants(12)
+    lock = threading.Lock()
+    busy, clashes = set(), []
+    most = [0]
+
+    def play(match):
+        # Failures raised here would only count as a lost match, so they are collected instead
+        with lock:
+            clashes.extend(busy & set(match.slots))
+            busy.update(match.slots)
+            most[0] = max(most[0], len(busy) // 2)
+        time.sleep(0.002)  # let other matches start meanwhile
+        with lock:
+            busy.difference_update(match.slots)
+        return favourite(match)
+
+    tournament, _ = run(name, field, play, parallel=parallel)
+    assert clashes == []
+    assert tournament.champion is field[0]
+    assert 1 <= most[0] <= parallel
+    if parallel > 1:
+        assert most[0] > 1
+
+
+def test_failed_match_sends_the_higher_seed_through():
+    field = entrants(4)
+
+    def play(match):
+        raise RuntimeError("connection lost")
+
+    tournament, played = run('single', field, play)
+    assert tournament.champion is field[0]
+    assert all(match.winner is match.slots[0] for match in played)
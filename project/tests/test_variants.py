@@ -0,0 +1,84 @@
+import pytest
+
+import variants
+from battleship import Board, SHIPS
+from variants import ARMADA, Rules, parse, placement_table
+
+
+@pytest.mark.parametrize("spec, name", [
+    ('classic', 'classic'),
+    (' Salvo ', 'salvo'),
+    ('salvo+NO-TOUCH', 'salvo+no-touch'),
+    ('salvo + armada', 'salvo+armada'),
+    ('', 'classic'),
+    ('+', 'classic'),
+])
+def test_parse_normalises(spec, name):
+    assert parse(spec) == name
+
+
+def test_parse_rejects_unknown_names():
+    with pytest.raises(ValueError, match="unknown variant 'blitz'"):
+        parse('salvo+blitz')
+
+
+def test_load_combines_features():
+    rules = variants.load('salvo+no-touch+armada', 12, SHIPS)
+    assert (rules.name, rules.size, rules.salvo, rules.no_touch) == ('salvo+no-touch+armada', 12, True, True)
+    assert rules.ships == ARMADA
+    assert variants.fleet('classic', SHIPS) == list(SHIPS)
+
+
+@pytest.mark.parametrize("size, length", [(10, 5), (10, 1), (7, 7), (26, 3)])
+def test_placement_table_covers_the_board(size, length):
+    table = placement_table(size, length)
+    assert len(table.placements) == 2 * size * (size - length + 1)
+    for (row, col, orientation), placement in table.by_start.items():
+        dr, dc = (0, 1) if orientation == 0 else (1, 0)
+        assert placement.cells == tuple((row + dr * i, col + dc * i) for i in range(length))
+        assert placement.mask == sum(1 << (r * size + c) for r, c in placement.cells)
+        assert placement.block == placement.mask
+    assert placement_table(size, length) is table  # built once, then shared
+
+
+def test_no_touch_blocks_the_neighbours():
+    placement = placement_table(5, 2, no_touch=True).by_start[(1, 1, 0)]  # B2-B3
+    blocked = {(r, c) for r in range(5) for c in range(5) if placement.block >> (r * 5 + c) & 1}
+    assert blocked == {(r, c) for r in range(0, 3) for c in range(0, 4)}
+
+
+def test_placement_off_the_board():
+    rules = variants.classic(10)
+    assert rules.placement(5, 0, 6, 0) is None
+    assert rules.placement(5, 0, 5, 0).cells[-1] == (0, 9)
+    assert rules.placement(5, 6, 0, 1) is None
+
+
+@pytest.mark.parametrize("size, ships, no_touch, fits", [
+    (10, SHIPS, False, True),
+    (10, SHIPS, True, True),
+    (10, ARMADA, True, True),
+    (3, [('a', 3)] * 3, False, True),    # exactly fills the board
+    (3, [('a', 3)] * 4, False, False),
+    (3, [('a', 3)] * 2, True, True),     # rows 1 and 3
+    (3, [('a', 3)] * 3, True, False),
+    (6, [('a', 5)] * 3 + [('b', 2)] * 2, True, False),
+])
+def test_placeable(size, ships, no_touch, fits):
+    assert Rules('test', size, ships, no_touch=no_touch).placeable() is fits
+
+
+def test_placeable_gives_up_after_its_step_budget(monkeypatch):
+    monkeypatch.setattr(variants, 'PLACEABLE_STEPS', 1)
+    assert not Rules('test', 10, SHIPS).placeable()
+
+
+def test_salvo_shots_follow_the_fleet():
+    rules = variants.load('salvo', 10, SHIPS)
+    board = Board(rules=rules)
+    board.place_ships_randomly()
+    assert rules.shots(board) == len(SHIPS)
+    for r, c in list(board.placed_ships[0].positions):
+        board.fire_at(r, c)
+    assert rules.shots(board) == len(SHIPS) - 1
+    assert variants.classic(10).shots(board) == 1
@@ -0,0 +1,127 @@
+"""
+timers.py
+
+A hierarchical timer wheel: one thread that runs every timer in the process, including:
+ - TimerWheel.schedule(), which puts a callback in the bucket for its expiry tick in O(1)
+ - Timer handles that can be cancelled in O(1) (the entry is skipped when its bucket comes up)
+ - after_tick hooks, which run once per tick after that tick's timers, so work triggered by many
+   expiries at once (e.g. reaping dead connections) can be done as a single batch
+
+Heartbeats, turn clocks, placement deadlines and lobby timers all share the one wheel, so a
+thousand matches waiting on a move cost a thousand list entries rather than a thousand timed waits.
+
+The wheel has LEVEL_BITS levels. Level 0 has one bucket per tick; each bucket of level n covers a
+whole revolution of level n - 1. A timer goes into the coarsest level it needs and is moved
+(cascaded) one level down each time the level below wraps around, so every tick only touches the
+bucket that is due, however far ahead the timers are. Timers never fire before their deadline
+and at most one tick after it.
+"""
+
+import math
+import threading
+import time
+
+TICK = 0.1                   # seconds per tick
+LEVEL_BITS = (8, 6, 6, 6)    # 256 ticks at level 0, then 64 buckets per level: ~77 days at 0.1s
+
+
+class Timer:
+    __slots__ = ('due', 'callback', 'args', 'cancelled')
+
+    def __init__(self, due, callback, args):
+        self.due = due            # absolute tick number
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerWheel:
+    """
+    Buckets are indexed by the bits of the due tick that belong to their level, Linux-kernel style.
+    """
+
+    def __init__(self, tick=TICK, level_bits=LEVEL_BITS):
+        self.tick = tick
+        self.shifts = []          # bit offset of each level within a tick number
+        shift = 0
+        for bits in level_bits:
+            self.shifts.append(shift)
+            shift += bits
+        self.level_bits = level_bits
+        self.levels = [[[] for _ in range(1 << bits)] for bits in level_bits]
+        self.current = 0          # last tick processed
+        self.after_tick = []      # callables run after each tick's timers
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        threading.Thread(target=self._run, name="timer-wheel", daemon=True).start()
+
+    def schedule(self, delay, callback, *args):
+        """
+        Run callback(*args) on the wheel thread after 'delay' seconds. Returns a cancellable Timer.
+        Callbacks must be quick; anything slow should be handed to another thread.
+        """
+        with self.lock:
+            # Counted from the real time, not the last processed tick, so it never fires early
+            due = max(self.current + 1, math.ceil((time.monotonic() - self.started + delay) / self.tick))
+            timer = Timer(due, callback, args)
+            self._insert(timer)
+        return timer
+
+    def _insert(self, timer):
+        # Caller holds the lock
+        delta = timer.due - self.current
+        last = len(self.levels) - 1
+        for level, (shift, bits) in enumerate(zip(self.shifts, self.level_bits)):
+            if delta < (1 << (shift + bits)) or level == last:
+                # Beyond the top level's range the timer just goes round again when cascaded
+                index = (timer.due >> shift) & ((1 << bits) - 1)
+                self.levels[level][index].append(timer)
+                return
+
+    def _cascade(self):
+        # Caller holds the lock. When level n - 1 wraps around, level n's current bucket is now
+        # within reach, so spread its timers over the finer levels.
+        for level in range(1, len(self.levels)):
+            shift = self.shifts[level]
+            if self.current & ((1 << shift) - 1):
+                return  # level below did not wrap
+            index = (self.current >> shift) & ((1 << self.level_bits[level]) - 1)
+            bucket = self.levels[level][index]
+            self.levels[level][index] = []
+            for timer in bucket:
+                if not timer.cancelled:
+                    self._insert(timer)
+
+    def _run(self):
+        while True:
+            next_tick = self.started + (self.current + 1) * self.tick
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._tick()
+
+    def _tick(self):
+        # Move on one tick: run the timers due in it, then the after_tick hooks
+        with self.lock:
+            self.current += 1
+            self._cascade()
+            index = self.current & ((1 << self.level_bits[0]) - 1)
+            due = self.levels[0][index]
+            self.levels[0][index] = []
+
+        for timer in due:
+            if timer.cancelled:
+                continue
+            try:
+                timer.callback(*timer.args)
+            except Exception as e:
+                print(f"[ERROR] Timer callback {getattr(timer.callback, '__name__', timer.callback)} failed: {e}")
+
+        for hook in self.after_tick:
+            try:
+                hook()
+            except Exception as e:
+                print(f"[ERROR] Timer hook {hook.__name__} failed: {e}")
@@ -0,0 +1,418 @@
+"""
+tournament.py
+
+Tournaments on top of the lobby, including:
+ - Formats: round robin (circle method), single elimination, and double elimination (winners and
+   losers brackets, then a grand final that is replayed once if the losers-bracket champion wins
+   it). Entrant counts that are not a power of two get byes, top seeds first
+ - Match: one pairing, whose seats are filled in as earlier results come in
+ - Tournament: a ready queue and scheduler that starts every match whose two entrants are known,
+   up to MAX_PARALLEL_MATCHES at once, records results and advances players automatically
+
+There are no round barriers: a match is ready as soon as both of its entrants have finished their
+previous match, so a quick first-round match lets its winner's next match start while the rest of
+the round is still being played. When more matches are ready than there are match slots, the one
+with the longest chain of matches still waiting on it goes first (critical path first), so the
+slowest path through the bracket sets the finishing time rather than the slowest match of every
+round added up.
+
+The scheduler only sees entrants as opaque objects and matches through the play(match) callback,
+so it can be driven by real games (see server.py) or by the simulation below:
+
+    python tournament.py --entrants 1024 --format double --parallel 128
+"""
+
+import heapq
+import threading
+from collections import deque
+
+MAX_PARALLEL_MATCHES = 64   # matches a tournament may run at the same time
+FORMATS = ('round-robin', 'single', 'double')
+
+
+class _Bye:
+    """
+    The empty seat opposite an entrant who has no opponent in a round.
+    """
+    __slots__ = ()
+
+    def __repr__(self):
+        return "BYE"
+
+
+BYE = _Bye()
+
+
+class Match:
+    __slots__ = ('number', 'label', 'slots', 'winner_to', 'loser_to', 'height', 'winner', 'loser')
+
+    def __init__(self, number, label):
+        self.number = number
+        self.label = label          # e.g. 'W2.3' (winners round 2, match 3), 'L1.1', 'Round 4'
+        self.slots = [None, None]   # entrants, None until known, BYE for an empty seat
+        self.winner_to = None       # (match, slot) the winner moves on to, None after the final
+        self.loser_to = None        # (match, slot) the loser drops to, None if the loser is out
+        self.height = 0             # matches still to come after this one on its longest path
+        self.winner = None
+        self.loser = None
+
+    def __repr__(self):
+        return f"Match({self.label}, {self.slots[0]!r} vs {self.slots[1]!r})"
+
+
+def _seed_order(size):
+    """
+    Bracket positions for seeds 0..size-1 (size a power of two), so that seed 0 meets seed 1 in
+    the final at the earliest and the top seeds are the ones facing the byes.
+    """
+    order = [0]
+    while len(order) < size:
+        count = len(order) * 2
+        order = [seat for seed in order for seat in (seed, count - 1 - seed)]
+    return order
+
+
+class Elimination:
+    """
+    Single elimination, or double elimination with double=True.
+    """
+
+    def __init__(self, entrants, double=False):
+        self.entrants = list(entrants)
+        self.matches = []
+        self.champion = None
+        self.grand_final = None
+
+        size = 1
+        while size < len(self.entrants):
+            size *= 2
+        self.size = size
+
+        # Winners bracket: round r has size / 2^r matches, winners pair off into the next round
+        self.rounds = []
+        count, previous = size // 2, None
+        while count >= 1:
+            matches = [self._new(f"W{len(self.rounds) + 1}.{i + 1}") for i in range(count)]
+            for i, match in enumerate(previous or ()):
+                match.winner_to = (matches[i // 2], i % 2)
+            self.rounds.append(matches)
+            previous, count = matches, count // 2
+
+        if double:
+            self._build_losers_bracket()
+        self._compute_heights()
+
+    def _new(self, label):
+        match = Match(len(self.matches) + 1, label)
+        self.matches.append(match)
+        return match
+
+    def _build_losers_bracket(self):
+        # Losers of winners round 1 pair off; after that, every second losers round takes in the
+        # losers of the next winners round (in reverse order, to put off rematches), and the
+        # rounds between them halve the field
+        final = self.rounds[-1][0]
+        if len(self.rounds) == 1:
+            losers_champion = final
+            self.grand_final = self._new("Grand final")
+            final.loser_to = (self.grand_final, 1)
+        else:
+            number = 1
+            previous = [self._new(f"L1.{i + 1}") for i in range(self.size // 4)]
+            for i, match in enumerate(self.rounds[0]):
+                match.loser_to = (previous[i // 2], i % 2)
+            for dropping in self.rounds[1:]:
+                number += 1
+                matches = [self._new(f"L{number}.{i + 1}") for i in range(len(previous))]
+                for i, match in enumerate(previous):
+                    match.winner_to = (matches[i], 0)
+                for i, match in enumerate(dropping):
+                    match.loser_to = (matches[len(matches) - 1 - i], 1)
+                previous = matches
+                if len(matches) > 1:
+                    number += 1
+                    matches = [self._new(f"L{number}.{i + 1}") for i in range(len(previous) // 2)]
+                    for i, match in enumerate(previous):
+                        match.winner_to = (matches[i // 2], i % 2)
+                    previous = matches
+            losers_champion = previous[0]
+            self.grand_final = self._new("Grand final")
+            losers_champion.winner_to = (self.grand_final, 1)
+        final.winner_to = (self.grand_final, 0)
+
+    def _compute_heights(self):
+        # Matches are created before every match they feed, so one pass backwards is enough
+        for match in reversed(self.matches):
+            targets = [target for target, _ in filter(None, (match.winner_to, match.loser_to))]
+            match.height = max((target.height + 1 for target in targets), default=0)
+
+    def start(self):
+        """
+        Seat the entrants. Returns (matches ready to play, entrants already finished).
+        """
+        ready, finished = [], []
+        for position, seed in enumerate(_seed_order(self.size)):
+            entrant = self.entrants[seed] if seed < len(self.entrants) else BYE
+            self._seat((self.rounds[0][position // 2], position % 2), entrant, ready, finished)
+        return ready, finished
+
+    def record(self, match, winner):
+        """
+        Report a played match. Returns (matches that became ready, entrants with nothing left to play).
+        """
+        ready, finished = [], []
+        self._decide(match, winner, ready, finished)
+        return ready, finished
+
+    def _decide(self, match, winner, ready, finished):
+        first, second = match.slots
+        loser = second if winner is first else first
+        match.winner, match.loser = winner, loser
+
+        # Losing the grand final from the winners bracket is a first loss: play it again
+        if match is self.grand_final and winner is second and loser is not BYE:
+            reset = self._new("Grand final reset")
+            reset.slots = [first, second]
+            ready.append(reset)
+            return
+
+        if match.winner_to:
+            self._seat(match.winner_to, winner, ready, finished)
+        elif winner is not BYE:
+            self.champion = winner
+            finished.append(winner)
+        if match.loser_to:
+            self._seat(match.loser_to, loser, ready, finished)
+        elif loser is not BYE:
+            finished.append(loser)
+
+    def _seat(self, target, entrant, ready, finished):
+        match, slot = target
+        match.slots[slot] = entrant
+        if None in match.slots:
+            return
+        first, second = match.slots
+        if first is BYE or second is BYE:
+            # Nothing to play: the entrant (or the bye, if both seats are empty) moves straight on
+            self._decide(match, second if first is BYE else first, ready, finished)
+        else:
+            ready.append(match)
+
+
+class RoundRobin:
+    """
+    Everyone plays everyone once. Each entrant plays their matches in round order, and a match is
+    ready when it is next for both of its entrants.
+    """
+
+    def __init__(self, entrants):
+        self.entrants = list(entrants)
+        self.matches = []
+        self.champion = None
+        self.upcoming = {entrant: deque() for entrant in self.entrants}
+        self.wins = dict.fromkeys(self.entrants, 0)
+
+        # Circle method: the first seat stays put and everyone else rotates one seat per round
+        seats = self.entrants + ([BYE] if len(self.entrants) % 2 else [])
+        rounds = len(seats) - 1
+        for number in range(rounds):
+            for i in range(len(seats) // 2):
+                first, second = seats[i], seats[len(seats) - 1 - i]
+                if first is BYE or second is BYE:
+                    continue
+                match = Match(len(self.matches) + 1, f"Round {number + 1}")
+                match.slots = [first, second]
+                match.height = rounds - 1 - number
+                self.matches.append(match)
+                self.upcoming[first].append(match)
+                self.upcoming[second].append(match)
+            seats = [seats[0], seats[-1]] + seats[1:-1]
+
+    def _next_if_ready(self, entrant, ready):
+        queue = self.upcoming[entrant]
+        if not queue:
+            return False
+        match = queue[0]
+        first, second = match.slots
+        opponent = second if entrant is first else first
+        if self.upcoming[opponent][0] is match:
+            ready.append(match)
+        return True
+
+    def start(self):
+        ready, finished = [], []
+        for entrant in self.entrants:
+            queue = self.upcoming[entrant]
+            if not queue:
+                finished.append(entrant)
+            elif queue[0].slots[0] is entrant:  # each match is checked once, from its first seat
+                self._next_if_ready(entrant, ready)
+        if not self.matches:
+            self.champion = self.entrants[0] if self.entrants else None
+        return ready, finished
+
+    def record(self, match, winner):
+        ready, finished = [], []
+        match.winner = winner
+        match.loser = match.slots[1] if winner is match.slots[0] else match.slots[0]
+        self.wins[winner] += 1
+        for entrant in match.slots:
+            self.upcoming[entrant].popleft()
+            if not self._next_if_ready(entrant, ready):
+                finished.append(entrant)
+        if all(not queue for queue in self.upcoming.values()):
+            self.champion = max(self.entrants, key=lambda entrant: self.wins[entrant])
+        return ready, finished
+
+
+def make_format(name, entrants):
+    if len(entrants) < 2:
+        raise ValueError("a tournament needs at least two entrants")
+    if name == 'round-robin':
+        return RoundRobin(entrants)
+    if name in ('single', 'double'):
+        return Elimination(entrants, double=(name == 'double'))
+    raise ValueError(f"unknown tournament format '{name}' (expected one of {', '.join(FORMATS)})")
+
+
+class Tournament:
+    """
+    Runs a tournament to completion: run() blocks until every match has been played.
+
+    play(match) plays match.slots[0] against match.slots[1] and returns the winner. It is called
+    on its own thread for each match, up to 'parallel' at a time.
+    on_result(match, finished), if given, is called after each result with the entrants that have
+    nothing left to play (so the caller can release them, e.g. back to the lobby).
+    """
+
+    def __init__(self, name, entrants, play, parallel=None, on_result=None):
+        self.name = name
+        self.format = make_format(name, entrants)
+        self.entrants = list(entrants)
+        self.play = play
+        self.parallel = MAX_PARALLEL_MATCHES if parallel is None else parallel
+        if self.parallel < 1:
+            raise ValueError(f"parallel matches must be at least 1, not {self.parallel}")
+        self.on_result = on_result
+        self.wins = dict.fromkeys(self.entrants, 0)
+        self.losses = dict.fromkeys(self.entrants, 0)
+        self.played = 0
+        self.running = 0
+        self.ready = []             # heap of (-height, number, match)
+        self.condition = threading.Condition()
+
+    @property
+    def champion(self):
+        return self.format.champion
+
+    def _push(self, matches):
+        for match in matches:
+            heapq.heappush(self.ready, (-match.height, match.number, match))
+
+    def run(self):
+        ready, finished = self.format.start()
+        if finished and self.on_result:
+            self.on_result(None, finished)
+        with self.condition:
+            self._push(ready)
+            while self.ready or self.running:
+                # Start everything that is ready, longest remaining path first
+                while self.ready and self.running < self.parallel:
+                    match = heapq.heappop(self.ready)[2]
+                    self.running += 1
+                    threading.Thread(target=self._play, args=(match,), name=f"match-{match.label}",
+                                     daemon=True).start()
+                self.condition.wait()
+        return self.champion
+
+    def _play(self, match):
+        try:
+            winner = self.play(match)
+        except Exception as e:
+            print(f"[ERROR] Tournament match {match.label} failed: {e}")
+            winner = None
+        if winner not in match.slots:
+            winner = match.slots[0]  # no result: the higher seed goes through
+
+        with self.condition:
+            ready, finished = self.format.record(match, winner)
+            loser = match.slots[1] if winner is match.slots[0] else match.slots[0]
+            self.wins[winner] += 1
+            self.losses[loser] += 1
+            self.played += 1
+        try:
+            if self.on_result:
+                self.on_result(match, finished)
+        finally:
+            with self.condition:
+                self._push(ready)
+                self.running -= 1
+                self.condition.notify()
+
+    def standings(self):
+        """
+        (entrant, wins, losses) for every entrant, champion first, then by wins.
+        """
+        def key(entrant):
+            return (entrant is not self.champion, -self.wins[entrant], self.losses[entrant])
+        with self.condition:
+            return [(entrant, self.wins[entrant], self.losses[entrant]) for entrant in sorted(self.entrants, key=key)]
+
+
+def main():
+    import argparse
+    import random
+    import time
+
+    def positive_int(text):
+        value = int(text)
+        if value < 1:
+            raise argparse.ArgumentTypeError(f"must be at least 1, not {value}")
+        return value
+
+    parser = argparse.ArgumentParser(description="Simulate a tournament with random match lengths")
+    parser.add_argument('--entrants', type=int, default=1024)
+    parser.add_argument('--format', choices=FORMATS, default='single')
+    parser.add_argument('--parallel', type=positive_int, default=MAX_PARALLEL_MATCHES)
+    parser.add_argument('--min-ms', type=float, default=5, help="shortest simulated match")
+    parser.add_argument('--max-ms', type=float, default=50, help="longest simulated match")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    lengths = {}
+
+    def play(match):
+        with lock:
+            length = lengths[match.number] = rng.uniform(args.min_ms, args.max_ms) / 1000
+            first = rng.random() < 0.5
+        time.sleep(length)
+        return match.slots[0] if first else match.slots[1]
+
+    lock = threading.Lock()
+    tournament = Tournament(args.format, range(args.entrants), play, args.parallel)
+    start = time.perf_counter()
+    champion = tournament.run()
+    elapsed = time.perf_counter() - start
+
+    # What the same matches would take if each round had to finish before the next one started
+    # (each round packed onto the same number of match slots)
+    rounds = {}
+    for match in tournament.format.matches:
+        if match.number in lengths:
+            rounds.setdefault(match.label.split('.')[0], []).append(lengths[match.number])
+    round_by_round = 0.0
+    for round_lengths in rounds.values():
+        slots = [0.0] * min(tournament.parallel, len(round_lengths))
+        for length in round_lengths:
+            heapq.heapreplace(slots, slots[0] + length)
+        round_by_round += max(slots)
+    mean = sum(lengths.values()) / max(1, len(lengths))
+    print(f"{args.format}, {args.entrants} entrants, up to {tournament.parallel} matches at once: "
+          f"{tournament.played} matches, champion {champion}")
+    print(f"wall clock {elapsed:.3f} s = {elapsed / mean:.1f} mean match lengths "
+          f"(round by round: {round_by_round:.3f} s over {len(rounds)} rounds)")
+
+
+if __name__ == '__main__':
+    main()
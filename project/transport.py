@@ -0,0 +1,183 @@
+"""
+transport.py
+
+Optional TLS and stream compression for client connections, including:
+ - server_context()/client_context(): TLS contexts. The server hands out session tickets, so a
+   client that reconnects with its previous session (connect(..., session=...)) resumes instead of
+   doing a full handshake
+ - ZlibSocketIO: a raw stream that deflates everything written and inflates everything read. Each
+   write ends with a sync flush, so a line is never held back waiting for more data, while the
+   compressor keeps its window across writes (consecutive GRID frames mostly repeat each other)
+ - The optional 'COMPRESS zlib' exchange that switches a connection to compressed text files
+ - LockedWriter: the text wfile every connected client gets, whatever its transport, so the
+   several threads that write to one client never interleave inside a write
+
+Negotiation: before sending its username the client may send COMPRESS_OFFER. The server answers
+COMPRESS_ACCEPT (everything after that line is compressed in both directions) or COMPRESS_REFUSE
+(the connection stays plain), then asks for the username again. Clients that never offer are
+unaffected.
+
+Session tickets are per process, so with shard workers (see shard.py) a reconnect only resumes
+when it lands on the same worker.
+"""
+
+import io
+import socket
+import ssl
+import threading
+import zlib
+
+COMPRESS_OFFER = "COMPRESS zlib"
+COMPRESS_ACCEPT = "COMPRESS zlib OK"
+COMPRESS_REFUSE = "COMPRESS NO"
+COMPRESSION_LEVEL = 6
+SESSION_TICKETS = 2   # TLS 1.3 tickets issued after each full handshake
+RECV_SIZE = 16384
+
+
+def server_context(certfile, keyfile):
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.load_cert_chain(certfile, keyfile)
+    context.num_tickets = SESSION_TICKETS
+    return context
+
+
+def client_context(cafile=None, verify=True):
+    """
+    cafile: certificate(s) to trust, e.g. the server's own self-signed certificate.
+    verify=False accepts any certificate (testing only).
+    """
+    context = ssl.create_default_context(cafile=cafile)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    if not verify:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def connect(host, port, context=None, session=None):
+    """
+    Open a client connection, over TLS if 'context' is given. Pass the previous connection's
+    sock.session as 'session' to resume it; sock.session_reused tells whether that worked.
+    """
+    sock = socket.create_connection((host, port))
+    if context is not None:
+        sock = context.wrap_socket(sock, server_hostname=host, session=session)
+    return sock
+
+
+class ZlibSocketIO(io.RawIOBase):
+    """
+    Compressed byte stream over a (possibly TLS) socket. Writes are serialised with a lock, since
+    the game, broadcast and chat threads all write to the same client.
+    """
+
+    def __init__(self, sock, level=COMPRESSION_LEVEL):
+        self.sock = sock
+        self.compressor = zlib.compressobj(level)
+        self.decompressor = zlib.decompressobj()
+        self.pending = b''      # inflated bytes not read yet
+        self.write_lock = threading.Lock()
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending:
+            data = self.sock.recv(RECV_SIZE)
+            if not data:
+                return 0  # peer closed the connection
+            self.pending = self.decompressor.decompress(data)
+        n = min(len(buffer), len(self.pending))
+        buffer[:n] = self.pending[:n]
+        self.pending = self.pending[n:]
+        return n
+
+    def write(self, data):
+        with self.write_lock:
+            self.sock.sendall(self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH))
+        return len(data)
+
+
+class LockedWriter:
+    """
+    Wraps a client's text wfile so each write() and flush() runs alone. The game thread, the
+    client's own handler (command replies, replay streams) and a broadcast worker may all write to
+    the same client, and a TextIOWrapper is not safe to share between threads.
+    """
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.lock = threading.Lock()
+
+    def write(self, text):
+        with self.lock:
+            return self.wfile.write(text)
+
+    def flush(self):
+        with self.lock:
+            self.wfile.flush()
+
+    def close(self):
+        with self.lock:
+            self.wfile.close()
+
+
+def compressed_files(sock, level=COMPRESSION_LEVEL):
+    """
+    Text rfile/wfile over a compressed stream, used like sock.makefile('r') and sock.makefile('w').
+    """
+    raw = ZlibSocketIO(sock, level)
+    rfile = io.TextIOWrapper(io.BufferedReader(raw), encoding='utf-8')
+    wfile = io.TextIOWrapper(io.BufferedWriter(raw), encoding='utf-8')
+    return rfile, wfile
+
+
+def accept_compression(sock, wfile, allowed):
+    """
+    Server side, after reading COMPRESS_OFFER. Returns the (rfile, wfile) to use from now on,
+    or None if compression was refused and the existing files stay in use.
+    """
+    if not allowed:
+        wfile.write(COMPRESS_REFUSE + '\n')
+        wfile.flush()
+        return None
+    wfile.write(COMPRESS_ACCEPT + '\n')
+    wfile.flush()
+    return compressed_files(sock)
+
+
+def _read_line(sock):
+    """
+    One line read straight off the socket, a byte at a time, so nothing after it is consumed.
+    """
+    line = bytearray()
+    while not line.endswith(b'\n'):
+        byte = sock.recv(1)
+        if not byte:
+            raise ConnectionError("server closed the connection during negotiation")
+        line += byte
+    return line.decode('utf-8').strip()
+
+
+def offer_compression(sock):
+    """
+    Client side, straight after connecting and before any file is made from 'sock'. Returns
+    (rfile, wfile, compressed). Lines the server sent before its answer (the first username
+    prompt) are skipped, as it prompts again.
+
+    The answer is read unbuffered: the server starts compressing right after COMPRESS_ACCEPT, and
+    a buffered reader would swallow the first compressed bytes along with that line.
+    """
+    sock.sendall((COMPRESS_OFFER + '\n').encode())
+    while True:
+        line = _read_line(sock)
+        if line == COMPRESS_ACCEPT:
+            rfile, wfile = compressed_files(sock)
+            return rfile, wfile, True
+        if line == COMPRESS_REFUSE:
+            return sock.makefile('r'), sock.makefile('w'), False
@@ -0,0 +1,227 @@
+"""
+variants.py
+
+Game variants, including:
+ - VARIANTS: named rule changes, which can be combined with '+' (e.g. --variant salvo+no-touch)
+     classic    one shot per turn, ships may touch, the configured fleet
+     salvo      every turn fires one shot per ship the player still has afloat, resolved as one batch
+     no-touch   ships may not touch each other, not even diagonally
+     armada     a larger fleet (ARMADA)
+ - placement_table(): every in-bounds placement of one ship length on one board size, as Placements
+   holding the cells, the bit mask of those cells and the mask of cells it rules out for later ships
+   (the cells themselves, plus their neighbours under no-touch). Built once per (board size, ship
+   length, no-touch) and shared by the whole process: placement checks, random placement, the
+   bot's heat map and every match's Rules all read the same tables
+ - Rules: a variant for one board size and fleet, put together when a match is created from the
+   cached tables. Checking a placement is then one dict lookup and one AND of two ints whatever
+   the variant, and firing is the same code for every variant.
+
+This module only knows sizes and fleets it is given, so battleship.py can use it without a
+circular import.
+"""
+
+import threading
+
+VARIANT = 'classic'  # variant of every new match, see load()
+PLACEABLE_STEPS = 200000  # search steps Rules.placeable() may take before it gives up
+
+# Classic fleet plus three more ships
+ARMADA = [
+    ("Carrier", 5),
+    ("Battleship", 4),
+    ("Cruiser", 3),
+    ("Submarine", 3),
+    ("Frigate", 3),
+    ("Destroyer", 2),
+    ("Corvette", 2),
+    ("Patrol Boat", 2),
+]
+
+VARIANTS = {
+    'classic': {},
+    'salvo': {'salvo': True},
+    'no-touch': {'no_touch': True},
+    'armada': {'ships': ARMADA},
+}
+
+DESCRIPTIONS = {
+    'classic': "one shot per turn",
+    'salvo': "one shot per ship you have afloat each turn",
+    'no-touch': "ships may not touch, not even diagonally",
+    'armada': f"a fleet of {len(ARMADA)} ships",
+}
+
+
+class Placement:
+    """
+    One way to place a ship: its cells, their bit mask (bit r * size + c) and the mask of cells
+    no other ship may then use.
+    """
+    __slots__ = ('cells', 'mask', 'block')
+
+    def __init__(self, cells, mask, block):
+        self.cells = cells
+        self.mask = mask
+        self.block = block
+
+
+class PlacementTable:
+    """
+    All placements of one ship length on one board size: 'placements' in a fixed order (for
+    random picks and heat maps) and 'by_start' keyed by (row, col, orientation) (for checks).
+    """
+    __slots__ = ('placements', 'by_start')
+
+    def __init__(self, placements, by_start):
+        self.placements = placements
+        self.by_start = by_start
+
+
+def _build_table(size, length, no_touch):
+    placements, by_start = [], {}
+    for orientation, (dr, dc) in enumerate(((0, 1), (1, 0))):  # 0 => horizontal, 1 => vertical
+        for row in range(size - dr * (length - 1)):
+            for col in range(size - dc * (length - 1)):
+                cells = tuple((row + dr * i, col + dc * i) for i in range(length))
+                mask = 0
+                for r, c in cells:
+                    mask |= 1 << (r * size + c)
+                block = mask
+                if no_touch:
+                    for r, c in cells:
+                        for nr in range(max(0, r - 1), min(size, r + 2)):
+                            for nc in range(max(0, c - 1), min(size, c + 2)):
+                                block |= 1 << (nr * size + nc)
+                placement = Placement(cells, mask, block)
+                placements.append(placement)
+                by_start[(row, col, orientation)] = placement
+    return PlacementTable(tuple(placements), by_start)
+
+
+# (size, length, no_touch) -> PlacementTable, built on first use and never changed afterwards
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def placement_table(size, length, no_touch=False):
+    key = (size, length, no_touch)
+    table = _tables.get(key)
+    if table is None:
+        with _tables_lock:
+            table = _tables.get(key)
+            if table is None:
+                table = _tables[key] = _build_table(size, length, no_touch)
+    return table
+
+
+class Rules:
+    def __init__(self, name, size, ships, salvo=False, no_touch=False):
+        self.name = name
+        self.size = size
+        self.ships = list(ships)
+        self.salvo = salvo
+        self.no_touch = no_touch
+        self.tables = {}  # ship length -> PlacementTable, shared with every other match on these rules
+        for _, length in self.ships:
+            self.table(length)
+
+    def table(self, length):
+        table = self.tables.get(length)
+        if table is None:
+            table = self.tables[length] = placement_table(self.size, length, self.no_touch)
+        return table
+
+    def placement(self, length, row, col, orientation):
+        """
+        The Placement for a ship of 'length' starting at (row, col), None if it leaves the board.
+        """
+        return self.table(length).by_start.get((row, col, orientation))
+
+    def shots(self, board):
+        """
+        Shots the owner of 'board' fires this turn.
+        """
+        if not self.salvo:
+            return 1
+        return sum(1 for ship in board.placed_ships if ship.positions) or 1
+
+    def placeable(self):
+        """
+        Whether the whole fleet fits on the board under these rules, by a depth-first search over
+        the placement tables (longest ships first). Ships of the same length are only tried in
+        increasing table order, dead ends are remembered, and a search that takes more than
+        PLACEABLE_STEPS steps counts as "does not fit". Checked once at startup, so random
+        placement can never search for room that does not exist.
+        """
+        lengths = sorted((length for _, length in self.ships), reverse=True)
+        tables = [self.table(length).placements for length in lengths]
+        dead_ends = set()
+        steps = 0
+
+        def place(i, blocked, first):
+            nonlocal steps
+            if i == len(tables):
+                return True
+            key = (i, blocked, first)
+            if key in dead_ends:
+                return False
+            steps += 1
+            if steps > PLACEABLE_STEPS:
+                return False
+            same_length = i + 1 < len(lengths) and lengths[i + 1] == lengths[i]
+            for j in range(first, len(tables[i])):
+                p = tables[i][j]
+                if not p.mask & blocked and place(i + 1, blocked | p.block, j + 1 if same_length else 0):
+                    return True
+            dead_ends.add(key)
+            return False
+
+        return place(0, 0, 0)
+
+    def describe(self):
+        return "; ".join(DESCRIPTIONS[name] for name in self.name.split('+'))
+
+
+def parse(spec):
+    """
+    Check a variant name such as 'salvo' or 'salvo+no-touch'. Returns it normalised, raises ValueError.
+    """
+    names = [name.strip().lower() for name in str(spec).split('+') if name.strip()]
+    for name in names:
+        if name not in VARIANTS:
+            raise ValueError(f"unknown variant '{name}', choose from {', '.join(VARIANTS)}")
+    return '+'.join(names) or 'classic'
+
+
+def fleet(spec, ships):
+    """
+    The fleet a variant plays with, given the configured one.
+    """
+    for name in parse(spec).split('+'):
+        ships = VARIANTS[name].get('ships', ships)
+    return list(ships)
+
+
+def load(spec, size, ships):
+    """
+    Compile variant 'spec' for a match on a 'size' board with the configured fleet 'ships'.
+    """
+    spec = parse(spec)
+    features = {}
+    for name in spec.split('+'):
+        features.update(VARIANTS[name])
+    features.pop('ships', None)
+    return Rules(spec, size, fleet(spec, ships), **features)
+
+
+# Classic rules per board size, shared by boards that are not part of a match (replays, the bot's view, tools)
+_classic = {}
+_classic_lock = threading.Lock()
+
+
+def classic(size):
+    with _classic_lock:
+        rules = _classic.get(size)
+        if rules is None:
+            rules = _classic[size] = Rules('classic', size, ())
+        return rules